@@ -1,6 +1,9 @@
 
 import tkinter as tk
 from tkinter import ttk, messagebox
+import datetime
+from backend import db, services, reports
+from frontend.workers import Worker
 
 # ---------- Styling ----------
 PRIMARY = "#4C6EF5"
@@ -11,6 +14,8 @@ TEXT = "#0F172A"
 SIDEBAR_BG = "#0F172A"
 SIDEBAR_FG = "#FFFFFF"
 
+SEARCH_DEBOUNCE_MS = 250  # pause in typing before the top-bar search runs
+
 def setup_styles():
     style = ttk.Style()
     style.theme_use("default")
@@ -33,11 +38,20 @@ class AdminUI(tk.Tk):
         self.geometry("1280x800")
         self.configure(bg=BG)
         setup_styles()
+        # database reads run here and land back on the Tk thread through callbacks
+        self.worker = Worker(self)
         self.create_topbar()
         self.create_sidebar()
         self.create_main_area()
         self.load_demo_data()
 
+    def destroy(self):
+        self.worker.shutdown(drain=True)
+        super().destroy()
+
+    def show_error(self, e):
+        messagebox.showerror("Error", str(e))
+
     def create_topbar(self):
         top = ttk.Frame(self, style="Topbar.TFrame", height=60)
         top.pack(side="top", fill="x")
@@ -50,9 +64,13 @@ class AdminUI(tk.Tk):
         # Center: Search
         center = ttk.Frame(top, style="Topbar.TFrame")
         center.pack(side="left", expand=True)
-        search = ttk.Entry(center, width=50)
+        self.search_var = tk.StringVar()
+        self._search_after = None
+        self._search_tree = None
+        search = ttk.Entry(center, width=50, textvariable=self.search_var)
         search.pack(pady=12)
-        search.insert(0, "")
+        self.search_var.trace_add("write", lambda *_: self.schedule_search())
+        search.bind("<Return>", lambda e: self.run_search())
 
         # Right: profile & actions
         right = ttk.Frame(top, style="Topbar.TFrame")
@@ -100,10 +118,49 @@ class AdminUI(tk.Tk):
         # Start with dashboard
         self.show_dashboard()
 
+    # -------------------- Search --------------------
+    def schedule_search(self):
+        # restart the timer on every keystroke so only the final text is queried
+        if self._search_after is not None:
+            self.after_cancel(self._search_after)
+        self._search_after = self.after(SEARCH_DEBOUNCE_MS, self.run_search)
+
+    def run_search(self):
+        if self._search_after is not None:
+            self.after_cancel(self._search_after)
+            self._search_after = None
+        query = self.search_var.get().strip()
+        if not query:
+            if self._search_tree is not None:
+                self.show_dashboard()
+            return
+        def done(rows):
+            # drop results for text the user has since typed past
+            if query == self.search_var.get().strip():
+                self.show_search_results(query, rows)
+        self.worker.submit(services.search_accounts, query, on_done=done, on_error=self.show_error)
+
+    def show_search_results(self, query, rows):
+        if self._search_tree is None or not self._search_tree.winfo_exists():
+            self.clear_view()
+            self._search_label = ttk.Label(self.view_container, font=("Inter", 14, "bold"))
+            self._search_label.pack(anchor="w")
+            cols = ("account_no", "name", "balance")
+            self._search_tree = ttk.Treeview(self.view_container, columns=cols, show="headings")
+            for c in cols:
+                self._search_tree.heading(c, text=c.replace("_", " ").capitalize())
+                self._search_tree.column(c, anchor="center")
+            self._search_tree.pack(fill="both", expand=True, pady=12)
+        self._search_label.configure(text=f"Search: \"{query}\" ({len(rows)} shown)")
+        self._search_tree.delete(*self._search_tree.get_children())
+        for r in rows:
+            self._search_tree.insert("", "end", values=(r["account_no"], r["name"], f"₱{r['balance']:,.2f}"))
+
     # -------------------- Views --------------------
     def clear_view(self):
         for widget in self.view_container.winfo_children():
             widget.destroy()
+        self._search_tree = None
 
     def show_dashboard(self):
         self.clear_view()
@@ -111,17 +168,25 @@ class AdminUI(tk.Tk):
         cards_row = ttk.Frame(self.view_container, style="TFrame")
         cards_row.pack(fill="x", pady=6)
         stats = [
-            ("Total Customers", "1,234", "👥"),
-            ("Total Balance", "₱ 12,345,678", "💰"),
-            ("Loans Outstanding", "₱ 2,345,600", "📄"),
-            ("Suspicious Tx (24h)", "2", "⚠️")
+            ("Total Customers", "customers", "{:,}", "👥"),
+            ("Total Balance", "total_balance", "₱ {:,.2f}", "💰"),
+            ("Loans Outstanding", "loans_outstanding", "₱ {:,.2f}", "📄"),
+            ("Suspicious Tx (24h)", "suspicious_24h", "{:,}", "⚠️")
         ]
-        for i, (title, value, icon) in enumerate(stats):
+        values = []
+        for i, (title, key, fmt, icon) in enumerate(stats):
             card = ttk.Frame(cards_row, style="Card.TFrame", width=230, height=90)
             card.pack_propagate(False)
             card.pack(side="left", padx=10)
             ttk.Label(card, text=icon + "  " + title, font=("Inter", 10)).pack(anchor="w", pady=(12,0), padx=12)
-            ttk.Label(card, text=value, font=("Inter", 16, "bold")).pack(anchor="w", padx=12, pady=(6,0))
+            value = ttk.Label(card, text="...", font=("Inter", 16, "bold"))
+            value.pack(anchor="w", padx=12, pady=(6,0))
+            values.append((value, key, fmt))
+        def show_stats(summary):
+            for value, key, fmt in values:
+                if value.winfo_exists():
+                    value.configure(text=fmt.format(summary.get(key, 0)))
+        self.worker.submit(services.dashboard_stats, on_done=show_stats, on_error=self.show_error)
 
         # Recent transactions table
         table_frame = ttk.Frame(self.view_container, style="TFrame")
@@ -135,6 +200,13 @@ class AdminUI(tk.Tk):
             self.tx_table.heading(col, text=col.capitalize())
             self.tx_table.column(col, anchor="center")
         self.tx_table.pack(fill="both", expand=True, pady=8)
+        tx_table = self.tx_table
+        def show_recent(txs):
+            if not tx_table.winfo_exists():
+                return
+            for tx in txs:
+                tx_table.insert("", "end", values=(tx["id"], tx["to_acc"] or tx["from_acc"], tx["tx_type"], f"₱{tx['amount']:,.2f}", tx["timestamp"]))
+        self.worker.submit(services.get_transactions, limit=20, on_done=show_recent, on_error=self.show_error)
 
         # Action buttons
         actions = ttk.Frame(self.view_container, style="TFrame")
@@ -194,7 +266,23 @@ class AdminUI(tk.Tk):
     def show_reports(self):
         self.clear_view()
         ttk.Label(self.view_container, text="Reports", font=("Inter", 14, "bold")).pack(anchor="w")
-        ttk.Label(self.view_container, text="(Reports area - integrate your backend functions here)", font=("Inter", 10)).pack(anchor="w", pady=8)
+        since = (datetime.date.today() - datetime.timedelta(days=30)).isoformat()
+        for title, fetch, cols in (
+            ("Daily volume (last 30 days)", lambda: reports.daily_volume(start=since), ("day", "tx_type", "tx_count", "volume")),
+            ("Monthly volume", reports.monthly_volume, ("month", "tx_type", "tx_count", "volume")),
+        ):
+            ttk.Label(self.view_container, text=title, font=("Inter", 12, "bold")).pack(anchor="w", pady=(10, 0))
+            tree = ttk.Treeview(self.view_container, columns=cols, show="headings", height=8)
+            for c in cols:
+                tree.heading(c, text=c.replace("_", " ").capitalize())
+                tree.column(c, anchor="center")
+            tree.pack(fill="both", expand=True, pady=6)
+            def fill(rows, tree=tree, cols=cols):
+                if not tree.winfo_exists():
+                    return
+                for r in reversed(rows):
+                    tree.insert("", "end", values=(r[cols[0]], r["tx_type"], f"{r['tx_count']:,}", f"₱{r['volume']:,.2f}"))
+            self.worker.submit(fetch, on_done=fill, on_error=self.show_error)
 
     def show_settings(self):
         self.clear_view()
@@ -265,7 +353,8 @@ class AdminUI(tk.Tk):
         ttk.Label(dlgg, text="Are you sure you want to Log-out?").pack(pady=(12,4))
         
         def yes():
-            dlgg.quit()
+            # the flush can wait on the write lock, so it runs on the worker
+            self.worker.submit(services.flush_audit, on_done=lambda _: dlgg.quit(), on_error=self.show_error)
         def no():
             dlgg.destroy()
         ttk.Button(dlgg, text="yes", command=yes).pack(pady=12,padx=2)
@@ -290,5 +379,6 @@ def gen_short_id(prefix="X"):
 
 # ---------- Run ----------
 if __name__ == "__main__":
+    db.initialize()
     app = AdminUI()
-    app.mainloop()
\ No newline at end of file
+    app.mainloop()
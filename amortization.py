@@ -0,0 +1,85 @@
+# backend/amortization.py
+# Level-payment (annuity) amortization in closed form.  Every figure for a
+# loan after k payments comes from a formula rather than by stepping through
+# its schedule, so a whole portfolio is a handful of array operations.
+# numpy is used when installed; the fallback computes the same formulas with
+# plain floats.
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+
+def payment(principal: float, annual_rate: float, term_months: int) -> float:
+    """Monthly payment that clears ``principal`` in ``term_months``."""
+    r = annual_rate / 12
+    if r == 0:
+        return principal / term_months
+    return principal * r / (1 - (1 + r) ** -term_months)
+
+
+def _balance(principal, r, pmt, k):
+    if r == 0:
+        return principal - pmt * k
+    g = (1 + r) ** k
+    return principal * g - pmt * (g - 1) / r
+
+
+def schedule(principal: float, annual_rate: float, term_months: int):
+    """Full repayment schedule for one loan as a list of dicts.
+
+    The last payment absorbs rounding so the closing balance is exactly 0.
+    A term below one month is treated as one, as in portfolio().
+    """
+    term_months = max(int(term_months), 1)
+    r = annual_rate / 12
+    pmt = payment(principal, annual_rate, term_months)
+    rows, prev = [], principal
+    for k in range(1, term_months + 1):
+        bal = 0.0 if k == term_months else _balance(principal, r, pmt, k)
+        interest = prev * r
+        rows.append({"period": k, "payment": interest + prev - bal, "interest": interest,
+                     "principal": prev - bal, "balance": bal})
+        prev = bal
+    return rows
+
+
+def portfolio(principal, annual_rate, term_months, elapsed):
+    """Payment, outstanding principal and interest paid for many loans at once.
+
+    Arguments are equal-length sequences; ``elapsed`` is the number of
+    payments due so far and is clamped to [0, term].  Returns a dict of
+    sequences (numpy arrays when numpy is available, lists otherwise) with
+    keys ``payment``, ``outstanding``, ``principal_paid`` and ``interest_paid``.
+    """
+    if np is not None:
+        return _portfolio_np(principal, annual_rate, term_months, elapsed)
+    out = {"payment": [], "outstanding": [], "principal_paid": [], "interest_paid": []}
+    for p, rate, n, k in zip(principal, annual_rate, term_months, elapsed):
+        n = max(int(n), 1)
+        k = min(max(int(k), 0), n)
+        r = rate / 12
+        pmt = payment(p, rate, n)
+        bal = 0.0 if k == n else max(_balance(p, r, pmt, k), 0.0)
+        out["payment"].append(pmt)
+        out["outstanding"].append(bal)
+        out["principal_paid"].append(p - bal)
+        out["interest_paid"].append(pmt * k - (p - bal))
+    return out
+
+
+def _portfolio_np(principal, annual_rate, term_months, elapsed):
+    p = np.asarray(principal, dtype=float)
+    r = np.asarray(annual_rate, dtype=float) / 12
+    n = np.maximum(np.asarray(term_months, dtype=float), 1)
+    k = np.clip(np.asarray(elapsed, dtype=float), 0, n)
+    zero = r == 0
+    safe_r = np.where(zero, 1.0, r)  # keeps the annuity formula finite; zero-rate rows are overwritten
+    growth_n = (1 + r) ** n
+    pmt = np.where(zero, p / n, p * safe_r * growth_n / (growth_n - 1 + zero))
+    growth_k = (1 + r) ** k
+    bal = np.where(zero, p - pmt * k, p * growth_k - pmt * (growth_k - 1) / safe_r)
+    bal = np.where(k >= n, 0.0, np.maximum(bal, 0.0))
+    return {"payment": pmt, "outstanding": bal, "principal_paid": p - bal,
+            "interest_paid": pmt * k - (p - bal)}
+
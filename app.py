@@ -1,8 +1,17 @@
 # app.py
-from backend import db
+import logging
+import os
+from backend import db, instrument, services
+if os.environ.get("BANK_INSTRUMENT"):
+    logging.basicConfig(level=logging.WARNING)
+    instrument.enable(float(os.environ.get("BANK_SLOW_MS", instrument.slow_ms)))
+if os.environ.get("BANK_SHARED"):
+    # several teller stations on one bank_system.db (see db.enable_shared_mode)
+    db.enable_shared_mode()
 db.initialize()
+services.rebuild_detection()
 from frontend.gui import App
 
 if __name__ == "__main__":
     app = App()
-    app.mainloop()
\ No newline at end of file
+    app.mainloop()
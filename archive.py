@@ -0,0 +1,251 @@
+# backend/archive.py
+# Hot/cold tiering of the ledger.  archive_before() moves transactions and
+# audit rows older than a cutoff into one SQLite file per period (year or
+# month) under an "archive" directory next to the database, recording each
+# file's time span in archive_catalog.  Readers go through sources(), which
+# yields the hot schema first and ATTACHes an archive only when the caller
+# actually needs rows from the span it covers.
+#   python -m backend.archive run --keep-days 365 --vacuum
+#   python -m backend.archive list
+import argparse
+import datetime
+import sqlite3
+import time
+from pathlib import Path
+
+from . import db
+from .auditlog import sink as audit_sink
+from .db import pool
+
+ARCHIVE_DIRNAME = "archive"
+ARCHIVE_CHUNK = 20_000
+ARCHIVE_KEEP_DAYS = 365
+ATTACH_MAX = 8  # SQLite allows 10 attached databases by default
+
+# archived tables and their columns; ids are kept, so keyset cursors stay valid
+COLUMNS = {
+    "transactions": ("id", "tx_type", "from_acc", "to_acc", "amount", "performed_by", "timestamp"),
+    "audit": ("id", "actor", "action", "details", "timestamp"),
+}
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS {s}.transactions (
+        id INTEGER PRIMARY KEY, tx_type TEXT, from_acc TEXT, to_acc TEXT, amount MONEY, performed_by TEXT, timestamp TEXT)""",
+    "CREATE INDEX IF NOT EXISTS {s}.idx_tx_ts ON transactions (timestamp, id)",
+    "CREATE INDEX IF NOT EXISTS {s}.idx_tx_from ON transactions (from_acc, timestamp, id)",
+    "CREATE INDEX IF NOT EXISTS {s}.idx_tx_to ON transactions (to_acc, timestamp, id)",
+    "CREATE TABLE IF NOT EXISTS {s}.audit (id INTEGER PRIMARY KEY, actor TEXT, action TEXT, details TEXT, timestamp TEXT)",
+    "CREATE INDEX IF NOT EXISTS {s}.idx_audit_ts ON audit (timestamp, id)",
+)
+
+
+def archive_dir() -> Path:
+    return Path(pool.path or db.DB_PATH).parent / ARCHIVE_DIRNAME
+
+
+def _file_name(period: str) -> str:
+    return f"{Path(pool.path or db.DB_PATH).stem}-{period}.db"
+
+
+def _schema_name(period: str) -> str:
+    return "arc_" + period.replace("-", "_")
+
+
+def _attach(conn, period: str, file: str, create: bool = False) -> str:
+    """Attach the archive for ``period`` to ``conn`` (if it is not already)
+    and return its schema name.  Must run outside a transaction."""
+    name = _schema_name(period)
+    attached = [r[1] for r in conn.execute("PRAGMA database_list")]
+    if name in attached:
+        return name
+    archives = [a for a in attached if a.startswith("arc_")]
+    if len(archives) >= ATTACH_MAX:
+        conn.execute(f"DETACH DATABASE {archives[0]}")
+    path = archive_dir() / file
+    if not create and not path.exists():
+        raise FileNotFoundError(f"Archive file missing: {path}")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn.execute(f"ATTACH DATABASE ? AS {name}", (str(path),))
+    # archive_before deletes from main only after the copy has committed; make
+    # that commit durable even under WAL's synchronous=NORMAL
+    conn.execute(f"PRAGMA {name}.synchronous=FULL")
+    if create:
+        for sql in SCHEMA:
+            conn.execute(sql.format(s=name))
+    return name
+
+
+def sources(table: str, start=None, end=None, before=None, newest_first: bool = True):
+    """Schema names holding ``table`` rows in ``start <= timestamp < end``.
+
+    Yields "main" first when ``newest_first`` (last otherwise), then each
+    archive whose span overlaps the range, in time order, attaching it as it
+    is reached; a caller that stops early never opens the older files.
+    ``before`` is a (timestamp, id) keyset cursor bounding the range above.
+    """
+    if newest_first:
+        yield "main"
+    conn = pool.get()
+    clauses, params = ["tbl = ?"], [table]
+    if start is not None:
+        clauses.append("last_ts >= ?"); params.append(start)
+    if end is not None:
+        clauses.append("first_ts < ?"); params.append(end)
+    if before is not None:
+        clauses.append("first_ts <= ?"); params.append(before[0])
+    catalog = conn.execute(f"SELECT period, file FROM archive_catalog WHERE {' AND '.join(clauses)} "
+                           f"ORDER BY period {'DESC' if newest_first else 'ASC'}", params).fetchall()
+    for period, file in catalog:
+        yield _attach(conn, period, file)
+    if not newest_first:
+        yield "main"
+
+
+def _periods(first: str, cutoff: str, period: str):
+    # (label, start, end) for each year or month from ``first`` up to ``cutoff``
+    year, month = int(first[:4]), int(first[5:7])
+    while True:
+        if period == "year":
+            label, start, nxt = f"{year:04d}", f"{year:04d}", (year + 1, month)
+            end = f"{year + 1:04d}"
+        else:
+            label = start = f"{year:04d}-{month:02d}"
+            nxt = (year + month // 12, month % 12 + 1)
+            end = f"{nxt[0]:04d}-{nxt[1]:02d}"
+        if start >= cutoff:
+            return
+        yield label, start, min(end, cutoff)
+        year, month = nxt
+
+
+def archive_before(cutoff, period: str = "year", chunk: int = ARCHIVE_CHUNK, tables=tuple(COLUMNS),
+                   vacuum: bool = False, progress=None):
+    """Move rows of ``tables`` with timestamp < ``cutoff`` into archive files.
+
+    Each chunk is copied into the archive and committed, then deleted from
+    main in a second transaction that only removes rows the archive already
+    holds.  A transaction spanning ATTACHed files is not atomic across them
+    under WAL, so the two steps are kept apart: a crash in between leaves
+    rows in both files (listings may show them twice until the next run),
+    never in neither.  The copy ignores ids already present, so an
+    interrupted run can simply be repeated.  ``vacuum`` then compacts the
+    hot file (and rebuilds the search index, see db.rebuild_search_index).
+    Returns the number of rows moved per table.
+    """
+    if period not in ("year", "month"):
+        raise ValueError(f"Unknown archive period: {period}")
+    cutoff = cutoff.isoformat() if hasattr(cutoff, "isoformat") else str(cutoff)
+    conn = pool.get()
+    if "audit" in tables:
+        audit_sink.flush()
+    moved = {}
+    for table in tables:
+        cols = ", ".join(COLUMNS[table])
+        moved[table] = 0
+        first = conn.execute(f"SELECT MIN(timestamp) FROM main.{table}").fetchone()[0]
+        if first is None or first >= cutoff:
+            continue
+        for label, start, end in _periods(first, cutoff, period):
+            span = "timestamp >= ? AND timestamp < ?"
+            if not conn.execute(f"SELECT 1 FROM main.{table} WHERE {span} LIMIT 1", (start, end)).fetchone():
+                continue
+            schema = _attach(conn, label, _file_name(label), create=True)
+            while True:
+                with pool.transaction(immediate=True):
+                    # the chunk is every row up to the chunk-th in (timestamp, id) order
+                    last = conn.execute(f"SELECT timestamp, id FROM main.{table} WHERE {span} "
+                                        "ORDER BY timestamp, id LIMIT 1 OFFSET ?", (start, end, chunk - 1)).fetchone()
+                    where = span + ("" if last is None else " AND (timestamp, id) <= (?, ?)")
+                    params = (start, end) + (() if last is None else tuple(last))
+                    lo, hi = conn.execute(f"SELECT MIN(timestamp), MAX(timestamp) FROM main.{table} WHERE {where}",
+                                          params).fetchone()
+                    conn.execute(f"INSERT OR IGNORE INTO {schema}.{table} ({cols}) SELECT {cols} FROM main.{table} WHERE {where}",
+                                 params)
+                with pool.transaction(immediate=True):
+                    n = conn.execute(f"DELETE FROM main.{table} WHERE {where} AND id IN (SELECT id FROM {schema}.{table})",
+                                     params).rowcount
+                    if n:
+                        conn.execute("""INSERT INTO archive_catalog (tbl, period, file, first_ts, last_ts, row_count, archived_at)
+                            VALUES (?,?,?,?,?,?,?) ON CONFLICT (tbl, period) DO UPDATE SET
+                            first_ts = min(first_ts, excluded.first_ts), last_ts = max(last_ts, excluded.last_ts),
+                            row_count = row_count + excluded.row_count, archived_at = excluded.archived_at""",
+                                     (table, label, _file_name(label), lo, hi, n, datetime.datetime.utcnow().isoformat()))
+                moved[table] += n
+                if progress: progress(table, moved[table], None)
+                if last is None:
+                    break
+    if vacuum:
+        conn.execute("VACUUM main")
+        db.rebuild_search_index(conn)
+    return moved
+
+
+# archived transactions grouped as the rollup tables want them, and the upserts
+# adding them in (the insert-time equivalent is db.rollup_transactions)
+ROLLUP_FOLDS = (
+    ("SELECT substr(timestamp, 1, 10), tx_type, COUNT(*), SUM(amount) FROM transactions GROUP BY 1, 2",
+     """INSERT INTO rollup_daily (day, tx_type, tx_count, volume) VALUES (?,?,?,?)
+        ON CONFLICT (day, tx_type) DO UPDATE SET tx_count = tx_count + excluded.tx_count, volume = volume + excluded.volume"""),
+) + tuple(
+    (f"SELECT {side}, substr(timestamp, 1, 7), tx_type, SUM(amount), COUNT(*) FROM transactions "
+     f"WHERE {side} IS NOT NULL GROUP BY 1, 2, 3",
+     f"""INSERT INTO rollup_account_monthly (account_no, month, tx_type, {column}, tx_count) VALUES (?,?,?,?,?)
+        ON CONFLICT (account_no, month, tx_type) DO UPDATE SET
+            {column} = {column} + excluded.{column}, tx_count = tx_count + excluded.tx_count""")
+    for column, side in (("inflow", "to_acc"), ("outflow", "from_acc"))
+)
+
+
+def fold_rollups(conn):
+    """Add every archived transaction to the rollup tables, through ``conn``
+    and inside its transaction; db.rebuild_derived and reports.backfill call
+    this after clearing the rollups.  The files are read on connections of
+    their own, since ATTACH cannot run inside a transaction.  Returns the
+    number of archives folded in.
+    """
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'archive_catalog'").fetchone():
+        return 0  # before migration 10
+    files = conn.execute("SELECT file FROM archive_catalog WHERE tbl = 'transactions' ORDER BY period").fetchall()
+    for (file,) in files:
+        path = archive_dir() / file
+        if not path.exists():
+            # refuse rather than silently drop the archived periods from the rollups
+            raise FileNotFoundError(f"Archive file missing: {path}")
+        src = sqlite3.connect(f"{path.as_uri()}?mode=ro", uri=True)
+        try:
+            for select, upsert in ROLLUP_FOLDS:
+                conn.executemany(upsert, src.execute(select))
+        finally:
+            src.close()
+    return len(files)
+
+
+def catalog():
+    return [dict(r) for r in pool.get().execute("SELECT * FROM archive_catalog ORDER BY tbl, period").fetchall()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ledger archival")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("run", help="move old transactions and audit rows into archive files")
+    group = p.add_mutually_exclusive_group()
+    group.add_argument("--before", help="cutoff timestamp (YYYY-MM-DD[THH:MM:SS])")
+    group.add_argument("--keep-days", type=int, default=ARCHIVE_KEEP_DAYS, help="keep this many days hot")
+    p.add_argument("--period", choices=("year", "month"), default="year")
+    p.add_argument("--chunk", type=int, default=ARCHIVE_CHUNK)
+    p.add_argument("--vacuum", action="store_true", help="compact the hot file afterwards")
+    sub.add_parser("list", help="show the archive catalog")
+    args = parser.parse_args(argv)
+    db.initialize()
+    if args.cmd == "run":
+        cutoff = args.before or (datetime.datetime.utcnow() - datetime.timedelta(days=args.keep_days)).isoformat()
+        started = time.perf_counter()
+        moved = archive_before(cutoff, args.period, args.chunk, vacuum=args.vacuum,
+                               progress=lambda table, n, _: print(f"\r{table}: {n:,} rows", end="", flush=True))
+        print(f"\n{moved} before {cutoff} in {time.perf_counter() - started:.1f}s")
+    elif args.cmd == "list":
+        for r in catalog():
+            print(f"{r['tbl']:<13} {r['period']:<8} {r['row_count']:>12,}  {r['first_ts']} .. {r['last_ts']}  {r['file']}")
+
+
+if __name__ == "__main__":
+    main()
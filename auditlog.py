@@ -0,0 +1,105 @@
+# backend/auditlog.py
+import atexit
+import logging
+import sqlite3
+import threading
+
+from .db import pool
+
+log = logging.getLogger(__name__)
+
+INSERT_AUDIT = "INSERT INTO audit (actor, action, details, timestamp) VALUES (?,?,?,?)"
+
+
+class AuditSink:
+    """Buffers audit rows and writes them in batched transactions.
+
+    Rows are flushed by a background thread once ``batch_size`` rows are
+    queued or ``flush_interval`` seconds have passed.  A write made while the
+    calling thread has a pool transaction open goes straight into that
+    transaction instead, since it shares the caller's commit for free.
+    ``durable=True`` (per sink or per call) makes a write outside a
+    transaction synchronous: the queue is flushed and the row committed
+    before ``write`` returns.  Inside a transaction the row is durable once
+    the caller commits.
+    """
+
+    def __init__(self, batch_size: int = 500, flush_interval: float = 0.5, durable: bool = False):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.durable = durable
+        self._buf = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None
+
+    def write(self, row, durable: bool = None):
+        durable = self.durable if durable is None else durable
+        if pool.in_transaction():
+            # durable or not, the row commits (or rolls back) with the caller;
+            # the shared queue stays out of it, since flushing here would pull
+            # other threads' rows into a transaction that may yet roll back
+            pool.get().execute(INSERT_AUDIT, row)
+            return
+        if durable:
+            with self._lock:
+                self._buf.append(row)
+            self.flush()
+            return
+        with self._lock:
+            self._buf.append(row)
+            queued = len(self._buf)
+            if self._thread is None:
+                self._start()
+        if queued >= self.batch_size:
+            self._wake.set()
+
+    def _start(self):
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="audit-flusher", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopping:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.OperationalError as e:  # busy/locked: rows are requeued
+                log.warning("audit flush failed (%s); will retry", e)
+            except Exception:
+                log.exception("audit flush failed; will retry")
+
+    def flush(self):
+        # serialized so a synchronous flush cannot commit ahead of rows that an
+        # earlier flush already took off the queue
+        with self._flush_lock:
+            with self._lock:
+                rows, self._buf = self._buf, []
+            if not rows:
+                return
+            try:
+                with pool.transaction(immediate=True) as conn:
+                    conn.executemany(INSERT_AUDIT, rows)
+            except BaseException:
+                with self._lock:
+                    self._buf[:0] = rows
+                raise
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._buf)
+
+    def close(self):
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stopping = True
+            self._wake.set()
+            thread.join()
+        self.flush()
+
+
+sink = AuditSink()
+atexit.register(sink.close)
@@ -0,0 +1,841 @@
+# backend/bench.py
+# Micro-benchmarks for the services layer.  Run against a scratch database:
+#   python -m backend.bench pool --ops 2000
+#   python -m backend.bench generate --scale 1m --db /tmp/bank-1m.db
+#   python -m backend.bench suite --db /tmp/bank-1m.db --out before.json
+#   python -m backend.bench compare before.json after.json
+#   python -m backend.bench plans|rejects    (correctness checks; exit 1 on failure)
+import argparse
+import concurrent.futures
+import datetime
+import inspect
+import itertools
+import json
+import multiprocessing
+import platform
+import random
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from . import amortization, archive, db, detection, passwords, reports, services
+from .writequeue import WriteQueue
+from .money import Money
+
+
+def scratch_db(directory: str) -> Path:
+    path = Path(directory) / "bench.db"
+    db.DB_PATH = path
+    db.pool.close_all(path)
+    # seeding thousands of accounts should not be dominated by the KDF
+    passwords.set_hasher(passwords.ScryptHasher(n=2 ** 8))
+    db.initialize()
+    return path
+
+
+def ops_per_sec(fn, ops: int) -> float:
+    start = time.perf_counter()
+    for i in range(ops):
+        fn(i)
+    return ops / (time.perf_counter() - start)
+
+
+# ---------------- connection pool ----------------
+def _legacy_deposit(account_no: str, amount: float, performed_by: str):
+    # the pre-pool code path: one connect()/commit()/close() per statement
+    ts = datetime.datetime.utcnow().isoformat()
+    amount = Money.of(amount)
+    for sql, params in (
+        ("UPDATE accounts SET balance = balance + ? WHERE account_no=?", (amount, account_no)),
+        ("INSERT INTO transactions (tx_type, from_acc, to_acc, amount, performed_by, timestamp) VALUES (?,?,?,?,?,?)",
+         ("deposit", None, account_no, amount, performed_by, ts)),
+        ("INSERT INTO audit (actor, action, details, timestamp) VALUES (?,?,?,?)",
+         (performed_by, "tx_deposit", f"None->{account_no}|{amount}", ts)),
+    ):
+        conn = db.connect()
+        conn.execute(sql, params)
+        conn.commit()
+        conn.close()
+
+
+def _legacy_get_account(account_no: str):
+    conn = db.connect()
+    row = conn.execute("SELECT * FROM accounts WHERE account_no=?", (account_no,)).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+
+def bench_pool(ops: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        scratch_db(tmp)
+        services.create_account("BENCH0001", "Bench", "pw", 0.0)
+        results = {
+            "get_account/legacy": ops_per_sec(lambda i: _legacy_get_account("BENCH0001"), ops),
+            "get_account/pooled": ops_per_sec(lambda i: (services.account_cache.clear(), services.get_account("BENCH0001")), ops),
+            "get_account/cached": ops_per_sec(lambda i: services.get_account("BENCH0001"), ops),
+            "deposit/legacy": ops_per_sec(lambda i: _legacy_deposit("BENCH0001", 1.0, "bench"), ops),
+            "deposit/pooled": ops_per_sec(lambda i: services.deposit("BENCH0001", 1.0, "bench"), ops),
+        }
+        db.pool.close_all()
+    for name, rate in results.items():
+        print(f"{name:<24} {rate:>12,.0f} ops/sec")
+    return results
+
+
+# ---------------- batch posting ----------------
+def _postings(n: int, accounts: int):
+    for i in range(n):
+        if i % 3 == 2:
+            yield {"tx_type": "transfer", "from_acc": f"BENCH{i % accounts:04d}",
+                   "to_acc": f"BENCH{(i + 1) % accounts:04d}", "amount": 1.0}
+        else:
+            yield {"tx_type": "deposit", "to_acc": f"BENCH{i % accounts:04d}", "amount": 2.0}
+
+
+def bench_batch(rows: int, loop_rows: int, accounts: int = 100):
+    with tempfile.TemporaryDirectory() as tmp:
+        scratch_db(tmp)
+        for a in range(accounts):
+            services.create_account(f"BENCH{a:04d}", "Bench", "pw", 1000.0)
+        looped = list(_postings(loop_rows, accounts))
+        start = time.perf_counter()
+        for p in looped:
+            if p["tx_type"] == "deposit":
+                services.deposit(p["to_acc"], p["amount"], "bench")
+            else:
+                services.transfer(p["from_acc"], p["to_acc"], p["amount"], "bench")
+        loop_rate = loop_rows / (time.perf_counter() - start)
+        start = time.perf_counter()
+        results = services.post_batch(_postings(rows, accounts), "bench")
+        batch_rate = rows / (time.perf_counter() - start)
+        failed = sum(not r["ok"] for r in results)
+        db.pool.close_all()
+    print(f"{'loop':<24} {loop_rate:>12,.0f} postings/sec")
+    print(f"{'post_batch':<24} {batch_rate:>12,.0f} postings/sec  ({failed} rejected)")
+    print(f"{'speedup':<24} {batch_rate / loop_rate:>12,.1f}x")
+    return {"loop": loop_rate, "post_batch": batch_rate}
+
+
+# ---------------- multi-station writes ----------------
+STATION_ACCOUNTS = 200
+
+
+def _station_transfers(n: int, seed: int):
+    rnd = random.Random(seed)
+    for _ in range(n):
+        src, dst = rnd.sample(range(STATION_ACCOUNTS), 2)
+        yield f"BENCH{src:04d}", f"BENCH{dst:04d}"
+
+
+def _station(path: str, shared: bool, postings: int, seed: int):
+    # one teller station in its own process: a transfer at a time, as the GUI does
+    db.DB_PATH = Path(path)
+    db.pool.close_all(db.DB_PATH)
+    if shared:
+        db.enable_shared_mode()
+    services.get_account("BENCH0000")  # connect before the clock starts
+    failed = 0
+    start = time.time()
+    for src, dst in _station_transfers(postings, seed):
+        try:
+            services.transfer(src, dst, 1, "bench")
+        except sqlite3.OperationalError:
+            failed += 1
+    end = time.time()
+    db.pool.close_all()
+    return failed, start, end
+
+
+def _run_stations(label: str, path: Path, stations: int, postings: int, processes: bool, shared: bool, queue=None):
+    if processes:
+        # timed from the first station starting to the last finishing, not counting process startup
+        ctx = multiprocessing.get_context("spawn")
+        with concurrent.futures.ProcessPoolExecutor(stations, mp_context=ctx) as ex:
+            runs = list(ex.map(_station, [str(path)] * stations, [shared] * stations, [postings] * stations,
+                               range(stations)))
+        failed = sum(r[0] for r in runs)
+        seconds = max(r[2] for r in runs) - min(r[1] for r in runs)
+    else:
+        def teller(seed):
+            failed = 0
+            for src, dst in _station_transfers(postings, seed):
+                try:
+                    if queue is None:
+                        services.transfer(src, dst, 1, "bench")
+                    else:
+                        queue.call(services.transfer, src, dst, 1, "bench")
+                except sqlite3.OperationalError:
+                    failed += 1
+            return failed
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(stations) as ex:
+            failed = sum(ex.map(teller, range(stations)))
+        seconds = time.perf_counter() - start
+    rate = (stations * postings - failed) / seconds
+    extra = f", avg batch {queue.stats()['avg_batch']:.1f}" if queue is not None else ""
+    print(f"{label:<32} {stations:>3} stations {rate:>10,.0f} postings/sec  ({failed} failed{extra})")
+    return rate
+
+
+def bench_stations(stations=(1, 2, 4, 8), postings: int = 500):
+    """Transfers/sec from N concurrent stations on one database file: separate
+    processes on the rollback journal and on WAL (db.enable_shared_mode), and
+    threads in one process calling directly or through a WriteQueue."""
+    results = {}
+    for n in stations:
+        for label, processes, shared, queued in (("processes, rollback journal", True, False, False),
+                                                 ("processes, WAL", True, True, False),
+                                                 ("threads, WAL", False, True, False),
+                                                 ("threads, WAL + write queue", False, True, True)):
+            with tempfile.TemporaryDirectory() as tmp:
+                path = scratch_db(tmp)
+                for a in range(STATION_ACCOUNTS):
+                    services.create_account(f"BENCH{a:04d}", "Bench", "pw", 1_000_000)
+                if shared:
+                    db.enable_shared_mode()
+                # the bench process holds no connection while the stations run
+                db.pool.close_all()
+                queue = WriteQueue() if queued else None
+                results[f"{label}/{n}"] = _run_stations(label, path, n, postings, processes, shared, queue)
+                if queue is not None:
+                    queue.close()
+                db.pool.close_all()
+                db.pool.shared, db.pool.pragmas = False, db.PRAGMAS
+    return results
+
+
+# ---------------- password hashing ----------------
+HASH_SETTINGS = [
+    passwords.ScryptHasher(n=2 ** 12), passwords.ScryptHasher(n=2 ** 13),
+    passwords.ScryptHasher(n=2 ** 14), passwords.ScryptHasher(n=2 ** 15),
+    passwords.Pbkdf2Hasher(100_000), passwords.Pbkdf2Hasher(300_000), passwords.Pbkdf2Hasher(600_000),
+]
+
+
+def _logins_per_sec(accounts, logins: int, threads: int) -> float:
+    with concurrent.futures.ThreadPoolExecutor(threads) as ex:
+        start = time.perf_counter()
+        ok = all(ex.map(lambda i: services.authenticate_user(accounts[i % len(accounts)], "pw%d" % (i % len(accounts))),
+                        range(logins)))
+        rate = logins / (time.perf_counter() - start)
+    assert ok, "login failed"
+    return rate
+
+
+def bench_hashing(logins: int, threads: int, settings=HASH_SETTINGS):
+    """Logins/sec through authenticate_user at each cost setting.
+
+    "cold" disables the verified-credential cache so every login runs the
+    KDF; "cached" is a repeat login within the cache TTL.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        scratch_db(tmp)
+        ttl = passwords.cache.ttl
+        for hasher in settings:
+            passwords.set_hasher(hasher)
+            accounts = [f"H{i:04d}" for i in range(threads * 2)]
+            start = time.perf_counter()
+            for i, acc in enumerate(accounts):
+                services.create_account(acc, "Bench", "pw%d" % i, 0.0)
+            hash_ms = (time.perf_counter() - start) * 1000 / len(accounts)
+            passwords.cache.ttl = 0
+            cold = _logins_per_sec(accounts, logins, threads)
+            passwords.cache.ttl = ttl
+            _logins_per_sec(accounts, len(accounts), threads)  # prime the cache
+            cached = _logins_per_sec(accounts, logins, threads)
+            name = hasher.hash("x").rsplit("$", 2)[0]
+            results[name] = {"hash_ms": hash_ms, "cold": cold, "cached": cached}
+            print(f"{name:<24} {hash_ms:>8.1f} ms/hash {cold:>10,.1f} logins/sec {cached:>12,.0f} cached")
+            with db.pool as conn:
+                conn.execute("DELETE FROM accounts WHERE account_no LIKE 'H%'")
+        db.pool.close_all()
+    return results
+
+
+# ---------------- amortization ----------------
+def bench_amortization(loans: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        scratch_db(tmp)
+        rnd = random.Random(7)
+        with db.pool as conn:
+            conn.executemany(
+                "INSERT INTO loans (account_no, amount, term_months, status, created_at, annual_rate) VALUES (?,?,?,?,?,?)",
+                ((f"BENCH{i % 1000:04d}", Money.of(rnd.randrange(5_000, 2_000_000)), rnd.choice((6, 12, 24, 36, 60, 120)), "disbursed",
+                  f"{rnd.randrange(2015, 2026)}-{rnd.randrange(1, 13):02d}-{rnd.randrange(1, 29):02d}T00:00:00",
+                  rnd.choice((0.0, 0.06, 0.12, 0.18, 0.24))) for i in range(loans)))
+            conn.execute("UPDATE loans SET disbursed_at = created_at")
+        start = time.perf_counter()
+        n = services.recompute_loan_balances("2026-01-15")
+        seconds = time.perf_counter() - start
+        db.pool.close_all()
+    engine = "numpy" if amortization.np is not None else "pure python"
+    print(f"{'recompute_loan_balances':<24} {n:>10,} loans in {seconds:.2f}s ({n / seconds:,.0f} loans/sec, {engine})")
+    return {"loans": n, "seconds": seconds, "engine": engine}
+
+
+# ---------------- detection ----------------
+def _detection_postings(n: int, accounts: int, rnd):
+    start = datetime.datetime(2026, 1, 1)
+    for i in range(n):
+        src, dst = f"BENCH{rnd.randrange(accounts):04d}", f"BENCH{rnd.randrange(accounts):04d}"
+        kind = rnd.choice(("deposit", "withdraw", "transfer"))
+        yield (i + 1, kind, None if kind == "deposit" else src, None if kind == "withdraw" else dst,
+               Money.of(rnd.choice((10, 2_500, 75_000, 600_000))), (start + datetime.timedelta(seconds=i / 10)).isoformat())
+
+
+def bench_detection(postings: int, accounts: int = 1000):
+    """Rule-engine cost per posting, alert inserts included, one at a time
+    (record_tx) and in post_batch-sized chunks."""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        scratch_db(tmp)
+        rows = list(_detection_postings(postings, accounts, random.Random(7)))
+        for label, size in (("per posting", 1), ("chunks of 1000", services.BATCH_CHUNK)):
+            engine = detection.Engine()
+            with db.pool.transaction(immediate=True) as conn:
+                engine.rebuild(conn)
+                start = time.perf_counter()
+                alerts = sum(len(engine.evaluate(conn, rows[i:i + size])) for i in range(0, postings, size))
+                seconds = time.perf_counter() - start
+                conn.execute("DELETE FROM alerts")
+            results[label] = seconds / postings * 1e6
+            print(f"{label:<24} {results[label]:>8.1f} us/posting  ({postings / seconds:,.0f} postings/sec, {alerts:,} alerts)")
+        db.pool.close_all()
+    return results
+
+
+def _page_ms(calls: int = 200, **kwargs) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        services.get_transactions(**kwargs)
+    return (time.perf_counter() - start) * 1000 / calls
+
+
+def _rollups():
+    conn = db.pool.get()
+    return (conn.execute("SELECT * FROM rollup_daily ORDER BY day, tx_type").fetchall(),
+            conn.execute("SELECT * FROM rollup_account_monthly ORDER BY account_no, month, tx_type").fetchall())
+
+
+def bench_archive(transactions: int, keep_days: int = archive.ARCHIVE_KEEP_DAYS):
+    """Archive everything but the last ``keep_days`` of a generated ledger;
+    reports rows moved/sec, hot file size and page latency before and after.
+    Also checks that the rollups survive the move and a rebuild from all
+    stores (reports.backfill, db.rebuild_derived) unchanged."""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = scratch_db(tmp)
+        generate_dataset(max(1, transactions // 10), transactions, loans=0)
+        conn = db.pool.get()
+        last = conn.execute("SELECT MAX(timestamp) FROM transactions").fetchone()[0]
+        cutoff = (datetime.datetime.fromisoformat(last) - datetime.timedelta(days=keep_days)).isoformat()
+        old = conn.execute("SELECT timestamp, id FROM transactions WHERE timestamp < ? ORDER BY timestamp DESC, id DESC "
+                           "LIMIT 1 OFFSET 1000", (cutoff,)).fetchone()
+        rollups = _rollups()
+        results["newest page before (ms)"] = _page_ms()
+        results["hot file before (MiB)"] = path.stat().st_size / 2**20
+        start = time.perf_counter()
+        moved = archive.archive_before(cutoff, vacuum=True)
+        seconds = time.perf_counter() - start
+        results["rows moved/sec"] = sum(moved.values()) / seconds
+        results["hot file after (MiB)"] = path.stat().st_size / 2**20
+        results["newest page after (ms)"] = _page_ms()
+        results["archived page (ms)"] = _page_ms(before=tuple(old))
+        checks = {"after archiving": _rollups()}
+        reports.backfill()
+        checks["after backfill"] = _rollups()
+        with db.pool.transaction(immediate=True) as conn:
+            db.rebuild_derived(conn)
+        checks["after rebuild_derived"] = _rollups()
+        print(f"moved {moved} in {seconds:.1f}s")
+        for label, check in checks.items():
+            print(f"{'ok' if check == rollups else 'FAIL':<5} rollups {label} ({len(check[0]):,} daily, {len(check[1]):,} monthly rows)")
+        for label, value in results.items():
+            print(f"{label:<26} {value:>12,.2f}")
+        results["rollups unchanged"] = all(c == rollups for c in checks.values())
+        db.pool.close_all()
+    return results
+
+
+# ---------------- synthetic data ----------------
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+FIRST_NAMES = ("Maria", "Jose", "Juan", "Ana", "Pedro", "Rosa", "Carlos", "Elena", "Miguel", "Luz", "Ramon",
+               "Teresa", "Antonio", "Carmen", "Roberto", "Liza", "Paolo", "Grace", "Mark", "Joy")
+LAST_NAMES = ("Santos", "Reyes", "Cruz", "Bautista", "Ocampo", "Garcia", "Mendoza", "Torres", "Flores",
+              "Villanueva", "Ramos", "Aquino", "Castillo", "Rivera", "Dela Cruz", "Gonzales", "Navarro", "Lim")
+GEN_START = datetime.datetime(2021, 1, 1)
+GEN_SPAN = 5 * 365 * 86400  # seconds of history the data is spread over
+GEN_CHUNK = 50_000
+
+
+def account_no(i: int) -> str:
+    return f"AC{i:08d}"
+
+
+def _ts(fraction: float) -> str:
+    return (GEN_START + datetime.timedelta(seconds=GEN_SPAN * fraction)).isoformat()
+
+
+def _insert(conn, sql: str, rows, total: int, label: str, progress):
+    done = 0
+    while True:
+        chunk = list(itertools.islice(rows, GEN_CHUNK))
+        if not chunk:
+            return
+        conn.executemany(sql, chunk)
+        done += len(chunk)
+        if progress: progress(label, done, total)
+
+
+def generate_dataset(accounts: int, transactions: int = None, loans: int = None, audit: bool = True,
+                     seed: int = 42, progress=None):
+    """Fill the current database with a synthetic bank.
+
+    Rows go straight into the tables db.initialize() creates, inside one
+    transaction with the triggers suspended (db.bulk_load), and the
+    aggregates are rebuilt at the end.  Creation times and timestamps rise
+    with the ids; 20% of postings hit the busiest 1% of accounts; amounts
+    are log-normal.  Every account shares one password hash ("pw"), since
+    hashing millions of passwords would dominate the load.
+    """
+    rnd = random.Random(seed)
+    transactions = accounts if transactions is None else transactions
+    loans = accounts // 10 if loans is None else loans
+    pw_hash = passwords.hash_password("pw")
+    hot = max(1, accounts // 100)
+    pick = lambda: account_no(rnd.randrange(hot) if rnd.random() < 0.2 else rnd.randrange(accounts))
+
+    def account_rows():
+        for i in range(accounts):
+            ts = _ts(0.5 * i / accounts)  # accounts open over the first half of the span
+            yield (account_no(i), f"{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}", pw_hash,
+                   Money.round(rnd.lognormvariate(9, 1.5)), "active" if rnd.random() < 0.97 else "frozen",
+                   int(rnd.random() < 0.6), ts, ts)
+
+    def tx_rows():
+        for i in range(transactions):
+            kind = rnd.random()
+            tx_type, src, dst = (("deposit", None, pick()) if kind < 0.4 else
+                                 ("withdraw", pick(), None) if kind < 0.7 else ("transfer", pick(), pick()))
+            yield (tx_type, src, dst, Money.round(rnd.lognormvariate(7, 1.3)), f"admin{i % 7}", _ts(i / transactions))
+
+    def audit_rows():
+        # mirrors what record_tx writes, read back from the generated ledger
+        for r in conn.execute("SELECT performed_by, tx_type, from_acc, to_acc, amount, timestamp FROM transactions ORDER BY id"):
+            yield (r[0], f"tx_{r[1]}", f"{r[2]}->{r[3]}|{r[4]}", r[5])
+
+    def loan_rows():
+        for i in range(loans):
+            ts = _ts(rnd.random())
+            status = rnd.choices(("pending", "approved", "disbursed", "repaid", "rejected"), (15, 10, 50, 20, 5))[0]
+            yield (pick(), Money.of(rnd.randrange(5_000, 2_000_000, 500)), rnd.choice((6, 12, 24, 36, 60)), status, ts, ts,
+                   rnd.choice((0.06, 0.12, 0.18, 0.24)), ts if status in ("disbursed", "repaid") else None)
+
+    conn = db.pool.get()
+    with db.pool.transaction(immediate=True), db.bulk_load(conn):
+        _insert(conn, "INSERT INTO accounts (account_no, name, password_hash, balance, status, kyc, created_at, updated_at) "
+                      "VALUES (?,?,?,?,?,?,?,?)", account_rows(), accounts, "accounts", progress)
+        _insert(conn, "INSERT INTO transactions (tx_type, from_acc, to_acc, amount, performed_by, timestamp) VALUES (?,?,?,?,?,?)",
+                tx_rows(), transactions, "transactions", progress)
+        if audit:
+            _insert(conn, "INSERT INTO audit (actor, action, details, timestamp) VALUES (?,?,?,?)",
+                    audit_rows(), transactions, "audit", progress)
+        _insert(conn, "INSERT INTO loans (account_no, amount, term_months, status, created_at, updated_at, annual_rate, disbursed_at) "
+                      "VALUES (?,?,?,?,?,?,?,?)", loan_rows(), loans, "loans", progress)
+    conn.execute("ANALYZE")
+    return {"accounts": accounts, "transactions": transactions, "loans": loans, "audit": transactions if audit else 0}
+
+
+# ---------------- services suite ----------------
+class SuiteContext:
+    """Fixed inputs for the suite, sampled once from the generated data."""
+
+    def __init__(self, accounts: int, workdir: str, seed: int = 7):
+        self.rnd = random.Random(seed)
+        self.accounts = accounts
+        self.workdir = workdir
+        conn = db.pool.get()
+        self.account_pages = [tuple(r) for r in conn.execute(
+            "SELECT created_at, account_no FROM accounts ORDER BY random() LIMIT 50")]
+        self.tx_pages = [tuple(r) for r in conn.execute("SELECT timestamp, id FROM transactions ORDER BY random() LIMIT 50")]
+        self.pending = []
+        self.loan_ids = [r[0] for r in conn.execute("SELECT id FROM loans ORDER BY random() LIMIT 500")] or [0]
+        # a full month from the middle of the generated history
+        mid = conn.execute("SELECT timestamp FROM transactions WHERE id >= (SELECT MAX(id) / 2 FROM transactions) "
+                           "ORDER BY id LIMIT 1").fetchone()
+        month = (mid[0] if mid else GEN_START.isoformat())[:7]
+        self.month = (month + "-01", month + "-32")
+
+    def account(self):
+        return account_no(self.rnd.randrange(self.accounts))
+
+    def seed_pending(self, n: int):
+        # untimed setup: enough fresh pending loans for every call of a transition bench
+        with db.pool as conn:
+            first = conn.execute("SELECT COALESCE(MAX(id), 0) FROM loans").fetchone()[0] + 1
+            conn.executemany("INSERT INTO loans (account_no, amount, term_months, status, created_at, annual_rate) "
+                             "VALUES (?, ?, 12, 'pending', ?, 0.12)",
+                             ((self.account(), Money.of(10_000), services.now_ts()) for _ in range(n)))
+        self.pending.extend(range(first, first + n))
+
+    def take_pending(self, n: int):
+        ids, self.pending = self.pending[:n], self.pending[n:]
+        return ids
+
+    def latest(self, table: str, back: int = 10) -> int:
+        # a mark ``back`` rows behind the newest, taken when the bench starts
+        services.flush_audit()
+        return max(0, db.pool.get().execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0] - back)
+
+    def path(self, name: str) -> str:
+        return str(Path(self.workdir) / name)
+
+
+def _quietly(fn):
+    # business-rule rejections (e.g. insufficient funds) still cost a full call
+    def call(i):
+        try:
+            fn(i)
+        except ValueError:
+            pass
+    return call
+
+
+SEARCH_TERMS = ("maria", "dela cruz", "santos", "ana", "AC0000", "ma", "rey", "lim", "gonz", "zzz")
+_POSTING = ({"tx_type": "deposit", "amount": 5.0}, {"tx_type": "withdraw", "amount": 1.0}, {"tx_type": "transfer", "amount": 1.0})
+
+# name -> (ops, factory(ctx) -> call(i)); every public services function must appear
+SUITE = [
+    ("hash_pw", 10, lambda c: lambda i: services.hash_pw("pw")),
+    ("now_ts", 10_000, lambda c: lambda i: services.now_ts()),
+    ("validate_admin", 10, lambda c: lambda i: (passwords.cache.clear(), services.validate_admin("Admin", "Admin123"))),
+    ("validate_admin(cached)", 1000, lambda c: lambda i: services.validate_admin("Admin", "Admin123")),
+    ("authenticate_user", 10, lambda c: lambda i: (passwords.cache.clear(), services.authenticate_user(c.account(), "pw"))),
+    ("create_account", 20, lambda c: lambda i: services.create_account(f"BN{i:06d}", "Bench Newcomer", "pw", 100.0)),
+    ("get_account", 5000, lambda c: lambda i: services.get_account(c.account())),
+    ("get_account(hot)", 5000, lambda c: lambda i: services.get_account(account_no(i % 50))),
+    ("account_cache_stats", 1000, lambda c: lambda i: services.account_cache_stats()),
+    ("page_cursor", 10_000, lambda c: (lambda rows: lambda i: services.page_cursor(rows))(services.get_transactions(limit=50))),
+    ("list_accounts", 200, lambda c: lambda i: services.list_accounts(200, c.rnd.choice(c.account_pages) if i % 2 else None)),
+    ("accounts_changed_since", 200, lambda c: (lambda m: lambda i: services.accounts_changed_since(m))(services.accounts_changed_since()[1])),
+    ("search_accounts", 300, lambda c: lambda i: services.search_accounts(SEARCH_TERMS[i % len(SEARCH_TERMS)])),
+    ("delete_account", 20, lambda c: lambda i: services.delete_account(f"BN{i:06d}", "bench")),
+    ("verify_kyc", 500, lambda c: lambda i: services.verify_kyc(c.account(), "bench")),
+    ("record_tx", 1000, lambda c: lambda i: services.record_tx("deposit", None, c.account(), 1.0, "bench")),
+    ("deposit", 1000, lambda c: lambda i: services.deposit(c.account(), 5.0, "bench")),
+    ("withdraw", 1000, lambda c: _quietly(lambda i: services.withdraw(c.account(), 1.0, "bench"))),
+    ("transfer", 1000, lambda c: _quietly(lambda i: services.transfer(c.account(), c.account(), 1.0, "bench"))),
+    ("post_batch(1000)", 10, lambda c: lambda i: services.post_batch(
+        [dict(_POSTING[n % 3], from_acc=c.account(), to_acc=c.account()) for n in range(1000)], "bench")),
+    ("get_transactions", 300, lambda c: lambda i: services.get_transactions(before=c.rnd.choice(c.tx_pages) if i % 2 else None)),
+    ("get_transactions(account)", 300, lambda c: lambda i: services.get_transactions(c.account())),
+    ("transactions_since", 300, lambda c: (lambda m: lambda i: services.transactions_since(m))(c.latest("transactions"))),
+    ("transactions_since(account)", 300, lambda c: (lambda m: lambda i: services.transactions_since(m, c.account()))(
+        c.latest("transactions"))),
+    ("request_loan", 300, lambda c: lambda i: services.request_loan(c.account(), 50_000.0, 12)),
+    ("list_loans", 200, lambda c: lambda i: services.list_loans(limit=200)),
+    ("list_loans(status)", 200, lambda c: lambda i: services.list_loans("pending", 200)),
+    ("loans_changed_since", 200, lambda c: (lambda m: lambda i: services.loans_changed_since(m))(services.loans_changed_since()[1])),
+    ("get_loan", 2000, lambda c: lambda i: services.get_loan(c.rnd.choice(c.loan_ids))),
+    ("loan_schedule", 500, lambda c: _quietly(lambda i: services.loan_schedule(c.rnd.choice(c.loan_ids)))),
+    ("transition_loans(500)", 5, lambda c: (c.seed_pending(500 * 8), lambda i: services.transition_loans(
+        c.take_pending(500), "approved", "bench"))[1]),
+    ("update_loan_status", 200, lambda c: (c.seed_pending(210), lambda i: services.update_loan_status(
+        c.take_pending(1)[0], "approved", "bench"))[1]),
+    ("recompute_loan_balances", 2, lambda c: lambda i: services.recompute_loan_balances()),
+    ("loan_balance", 1000, lambda c: lambda i: services.loan_balance(c.rnd.choice(c.loan_ids))),
+    ("audit", 5000, lambda c: lambda i: services.audit("bench", "bench_op", str(i))),
+    ("flush_audit", 100, lambda c: lambda i: (services.audit("bench", "bench_op", str(i)), services.flush_audit())),
+    ("list_audit", 300, lambda c: lambda i: services.list_audit()),
+    ("audit_since", 300, lambda c: (lambda m: lambda i: services.audit_since(m))(c.latest("audit"))),
+    ("dashboard_stats", 2000, lambda c: lambda i: services.dashboard_stats()),
+    ("list_alerts", 300, lambda c: lambda i: services.list_alerts()),
+    ("list_alerts(account)", 300, lambda c: lambda i: services.list_alerts(c.account())),
+    ("rebuild_detection", 2, lambda c: lambda i: services.rebuild_detection()),
+    ("export_accounts_csv", 1, lambda c: lambda i: services.export_accounts_csv(c.path(f"accounts{i}.csv"))),
+    ("export_transactions_csv(month)", 2, lambda c: lambda i: services.export_transactions_csv(
+        c.path(f"tx{i}.csv"), *c.month)),
+    ("export_audit_csv(month)", 2, lambda c: lambda i: services.export_audit_csv(c.path(f"audit{i}.csv"), *c.month)),
+    ("export_transactions_pdf(month)", 1, lambda c: lambda i: services.export_transactions_pdf(
+        c.path(f"tx{i}.pdf"), *c.month)),
+]
+
+
+def _percentile(sorted_ns, q: float) -> float:
+    return sorted_ns[min(len(sorted_ns) - 1, int(q * len(sorted_ns)))] / 1e6
+
+
+def measure(call, ops: int, mem_ops: int = 3) -> dict:
+    """Latency percentiles (ms) and throughput over ``ops`` calls, then the
+    Python-heap peak (tracemalloc) over a few extra calls; SQLite's own page
+    cache is not included in the peak."""
+    samples = []
+    started = time.perf_counter()
+    for i in range(ops):
+        t0 = time.perf_counter_ns()
+        call(i)
+        samples.append(time.perf_counter_ns() - t0)
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    for i in range(ops, ops + min(mem_ops, ops)):
+        call(i)
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    samples.sort()
+    return {"ops": ops, "ops_per_sec": ops / elapsed, "p50_ms": _percentile(samples, 0.50),
+            "p99_ms": _percentile(samples, 0.99), "max_ms": samples[-1] / 1e6, "peak_kib": peak / 1024}
+
+
+def uncovered_functions():
+    covered = {name.split("(")[0] for name, _, _ in SUITE}
+    return sorted(name for name, fn in inspect.getmembers(services, inspect.isfunction)
+                  if fn.__module__ == services.__name__ and not name.startswith("_") and name not in covered)
+
+
+def run_suite(accounts: int, scale_ops: float = 1.0, only=None, workdir: str = None):
+    ctx = SuiteContext(accounts, workdir)
+    results = {}
+    for name, ops, factory in SUITE:
+        if only and not any(o in name for o in only):
+            continue
+        ops = max(1, int(ops * scale_ops))
+        results[name] = r = measure(factory(ctx), ops)
+        print(f"{name:<32} {r['ops_per_sec']:>12,.1f} ops/s  p50 {r['p50_ms']:>9.3f} ms  "
+              f"p99 {r['p99_ms']:>9.3f} ms  peak {r['peak_kib']:>9,.0f} KiB", flush=True)
+    services.flush_audit()
+    return results
+
+
+def bench_suite(scale: str, db_path: str = None, out: str = None, scale_ops: float = 1.0, only=None):
+    """Generate (or reuse, with ``db_path``) a dataset, run the suite and save JSON."""
+    missing = uncovered_functions()
+    if missing:
+        print("warning: not benchmarked:", ", ".join(missing))
+    with tempfile.TemporaryDirectory() as tmp:
+        if db_path:
+            db.DB_PATH = Path(db_path)
+            db.pool.close_all(db.DB_PATH)
+            db.initialize()
+            conn = db.pool.get()
+            counts = {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in ("accounts", "transactions", "loans", "audit")}
+        else:
+            db.DB_PATH = Path(tmp) / "bench.db"
+            db.pool.close_all(db.DB_PATH)
+            db.initialize()
+            started = time.perf_counter()
+            counts = generate_dataset(SCALES[scale], progress=_print_progress)
+            print(f"\ngenerated in {time.perf_counter() - started:.1f}s")
+        results = run_suite(counts["accounts"], scale_ops, only, tmp)
+        db.pool.close_all()
+    report = {
+        "meta": {"scale": scale, "dataset": counts, "started": datetime.datetime.now().isoformat(timespec="seconds"),
+                 "python": platform.python_version(), "sqlite": sqlite3.sqlite_version, "platform": platform.platform(),
+                 "numpy": amortization.np is not None, "scale_ops": scale_ops, "not_benchmarked": missing},
+        "results": results,
+    }
+    out = Path(out or f"bench-{scale}-{datetime.datetime.now():%Y%m%d-%H%M%S}.json")
+    out.write_text(json.dumps(report, indent=2))
+    print(f"wrote {out}")
+    return report
+
+
+def compare_reports(old_path: str, new_path: str, tolerance: float = 0.2):
+    """Print per-function changes; returns names whose p50 or throughput got
+    worse by more than ``tolerance`` (0.2 = 20%)."""
+    old, new = (json.loads(Path(p).read_text())["results"] for p in (old_path, new_path))
+    regressed = []
+    for name in sorted(set(old) & set(new)):
+        o, n = old[name], new[name]
+        slower = n["p50_ms"] / o["p50_ms"] - 1 if o["p50_ms"] else 0.0
+        fewer = 1 - n["ops_per_sec"] / o["ops_per_sec"] if o["ops_per_sec"] else 0.0
+        flag = max(slower, fewer) > tolerance
+        if flag:
+            regressed.append(name)
+        print(f"{'REGRESSED' if flag else 'ok':<10} {name:<32} p50 {o['p50_ms']:.3f} -> {n['p50_ms']:.3f} ms  "
+              f"{o['ops_per_sec']:,.0f} -> {n['ops_per_sec']:,.0f} ops/s")
+    return regressed
+
+
+def _print_progress(label, done, total):
+    print(f"\r{label}: {done:,}/{total:,}", end="", flush=True)
+
+
+# ---------------- query plans ----------------
+# services functions whose queries must be served by an index
+HOT_QUERIES = [
+    ("get_account", lambda: services.get_account("BENCH0001")),
+    ("list_accounts", lambda: services.list_accounts()),
+    ("get_transactions", lambda: services.get_transactions()),
+    ("get_transactions(account)", lambda: services.get_transactions("BENCH0001")),
+    ("list_loans", lambda: services.list_loans()),
+    ("list_loans(status)", lambda: services.list_loans("pending")),
+    ("list_audit", lambda: services.list_audit()),
+    ("list_accounts(page)", lambda: services.list_accounts(50, before=("9999", "ZZZZ"))),
+    ("get_transactions(page)", lambda: services.get_transactions(before=("9999", 1 << 62))),
+    ("get_transactions(account, page)", lambda: services.get_transactions("BENCH0001", before=("9999", 1 << 62))),
+    ("transactions_since(account)", lambda: services.transactions_since(0, "BENCH0001")),
+    ("list_loans(page)", lambda: services.list_loans(limit=50, before=("9999", 1 << 62))),
+    ("list_loans(status, page)", lambda: services.list_loans("pending", 50, ("9999", 1 << 62))),
+    ("list_audit(page)", lambda: services.list_audit(before=("9999", 1 << 62))),
+    ("list_alerts", lambda: services.list_alerts()),
+    ("list_alerts(account)", lambda: services.list_alerts("BENCH0001")),
+]
+
+_PLAN_OK = ("USING INDEX", "USING COVERING INDEX", "USING INTEGER PRIMARY KEY", "USING PRIMARY KEY")
+_PLAN_STRUCTURAL = ("MERGE", "LEFT", "RIGHT", "COMPOUND", "SCALAR SUBQUERY", "CORRELATED")
+
+
+def _plan_problems(conn, sql: str):
+    problems = []
+    for row in conn.execute("EXPLAIN QUERY PLAN " + sql):
+        detail = row[3]
+        if "TEMP B-TREE" in detail:
+            problems.append(detail)
+        elif detail.startswith(("SCAN", "SEARCH")) and not any(k in detail for k in _PLAN_OK):
+            problems.append(detail)
+    return problems
+
+
+def check_query_plans():
+    """Run each hot services call and EXPLAIN every SELECT it issued.
+
+    Returns a list of (name, sql, problems); an empty problems list means the
+    statement is fully index-driven.
+    """
+    report = []
+    with tempfile.TemporaryDirectory() as tmp:
+        scratch_db(tmp)
+        services.create_account("BENCH0001", "Bench", "pw", 100.0)
+        services.deposit("BENCH0001", 1.0, "bench")
+        services.request_loan("BENCH0001", 100.0, 12)
+        conn = db.pool.get()
+        for name, call in HOT_QUERIES:
+            issued = []
+            conn.set_trace_callback(issued.append)
+            try:
+                call()
+            finally:
+                conn.set_trace_callback(None)
+            for sql in issued:
+                if sql.lstrip().upper().startswith("SELECT"):
+                    report.append((name, sql, _plan_problems(conn, sql)))
+        db.pool.close_all()
+    return report
+
+
+# inputs services must refuse with ValueError before anything is written
+BAD_INPUTS = [
+    ("request_loan(rate=nan)", lambda: services.request_loan("BENCH0001", 100.0, 12, float("nan"))),
+    ("request_loan(rate=inf)", lambda: services.request_loan("BENCH0001", 100.0, 12, float("inf"))),
+    ("request_loan(rate=-0.1)", lambda: services.request_loan("BENCH0001", 100.0, 12, -0.1)),
+    ("request_loan(term=0)", lambda: services.request_loan("BENCH0001", 100.0, 0)),
+]
+
+
+def check_rejections():
+    """Call each BAD_INPUTS case; returns (name, problem) with problem None when it was rejected."""
+    report = []
+    with tempfile.TemporaryDirectory() as tmp:
+        scratch_db(tmp)
+        services.create_account("BENCH0001", "Bench", "pw", 100.0)
+        conn = db.pool.get()
+        for name, call in BAD_INPUTS:
+            loans = conn.execute("SELECT COUNT(*) FROM loans").fetchone()[0]
+            try:
+                call()
+                problem = "accepted"
+            except ValueError:
+                problem = None
+            except Exception as e:
+                problem = f"raised {type(e).__name__}: {e}"
+            if problem is None and conn.execute("SELECT COUNT(*) FROM loans").fetchone()[0] != loans:
+                problem = "rejected but a loan was written"
+            report.append((name, problem))
+        services.flush_audit()  # an accepted case may have queued a row
+        db.pool.close_all()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="services layer benchmarks")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("pool", help="per-call connect() vs pooled connections")
+    p.add_argument("--ops", type=int, default=2000)
+    p = sub.add_parser("batch", help="post_batch vs looping over deposit/transfer")
+    p.add_argument("--rows", type=int, default=100_000)
+    p.add_argument("--loop-rows", type=int, default=2000)
+    sub.add_parser("plans", help="fail if a hot query is not index-driven")
+    sub.add_parser("rejects", help="fail if services accepts a known-bad input")
+    p = sub.add_parser("stations", help="write throughput from concurrent stations on one file")
+    p.add_argument("--stations", type=int, nargs="+", default=[1, 2, 4, 8])
+    p.add_argument("--postings", type=int, default=500, help="transfers per station")
+    p = sub.add_parser("amortization", help="portfolio-wide loan balance recomputation")
+    p.add_argument("--loans", type=int, default=300_000)
+    p = sub.add_parser("detection", help="rule-engine overhead per posting")
+    p.add_argument("--postings", type=int, default=200_000)
+    p = sub.add_parser("archive", help="archival throughput and hot vs archived page latency")
+    p.add_argument("--transactions", type=int, default=200_000)
+    p.add_argument("--keep-days", type=int, default=archive.ARCHIVE_KEEP_DAYS)
+    p = sub.add_parser("hashing", help="logins/sec at each password hashing cost setting")
+    p.add_argument("--logins", type=int, default=64)
+    p.add_argument("--threads", type=int, default=4)
+    p = sub.add_parser("generate", help="write a synthetic dataset into a database file")
+    p.add_argument("--scale", choices=SCALES, default="100k")
+    p.add_argument("--db", required=True)
+    p.add_argument("--transactions", type=int, help="default: same as the number of accounts")
+    p.add_argument("--no-audit", action="store_true")
+    p = sub.add_parser("suite", help="time every public services function; writes JSON")
+    p.add_argument("--scale", choices=SCALES, default="10k")
+    p.add_argument("--db", help="reuse a generated database instead of generating one")
+    p.add_argument("--out")
+    p.add_argument("--ops-scale", type=float, default=1.0, help="multiply every function's call count")
+    p.add_argument("--only", nargs="*", help="substrings of function names to run")
+    p = sub.add_parser("compare", help="diff two suite JSON files; exit 1 on regressions")
+    p.add_argument("old")
+    p.add_argument("new")
+    p.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+    if args.cmd == "generate":
+        db.DB_PATH = Path(args.db)
+        db.pool.close_all(db.DB_PATH)
+        db.initialize()
+        started = time.perf_counter()
+        counts = generate_dataset(SCALES[args.scale], args.transactions, audit=not args.no_audit, progress=_print_progress)
+        print(f"\n{counts} in {time.perf_counter() - started:.1f}s")
+    elif args.cmd == "suite":
+        bench_suite(args.scale, args.db, args.out, args.ops_scale, args.only)
+    elif args.cmd == "compare":
+        raise SystemExit(1 if compare_reports(args.old, args.new, args.tolerance) else 0)
+    elif args.cmd == "plans":
+        failed = False
+        for name, sql, problems in check_query_plans():
+            print(f"{'FAIL' if problems else 'ok':<5} {name}: {'; '.join(problems) or sql}")
+            failed = failed or bool(problems)
+        raise SystemExit(1 if failed else 0)
+    elif args.cmd == "rejects":
+        report = check_rejections()
+        for name, problem in report:
+            print(f"{'FAIL' if problem else 'ok':<5} {name}{': ' + problem if problem else ''}")
+        raise SystemExit(1 if any(problem for _, problem in report) else 0)
+    elif args.cmd == "pool":
+        bench_pool(args.ops)
+    elif args.cmd == "batch":
+        bench_batch(args.rows, args.loop_rows)
+    elif args.cmd == "stations":
+        bench_stations(args.stations, args.postings)
+    elif args.cmd == "amortization":
+        bench_amortization(args.loans)
+    elif args.cmd == "detection":
+        bench_detection(args.postings)
+    elif args.cmd == "archive":
+        raise SystemExit(0 if bench_archive(args.transactions, args.keep_days)["rollups unchanged"] else 1)
+    elif args.cmd == "hashing":
+        bench_hashing(args.logins, args.threads)
+
+
+if __name__ == "__main__":
+    main()
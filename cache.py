@@ -0,0 +1,60 @@
+# backend/cache.py
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Bounded, thread-safe LRU map with hit/miss counters.
+
+    Read-through callers take ``token()`` before reading the source and pass
+    it to ``put()``; if anything was invalidated in between, the put is
+    dropped, so a slow reader cannot re-cache a value a writer just replaced.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self.hits = self.misses = self.stale_puts = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = 0
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def token(self) -> int:
+        return self._version
+
+    def put(self, key, value, token: int):
+        with self._lock:
+            if token != self._version:
+                self.stale_puts += 1
+                return
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, *keys):
+        with self._lock:
+            self._version += 1
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._version += 1
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses,
+                    "stale_puts": self.stale_puts, "hit_rate": self.hits / lookups if lookups else 0.0}
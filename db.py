@@ -1,85 +1,636 @@
 import sqlite3
 import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
 
+from .money import Money
+
+# Money binds as integer centavos; MONEY columns (and "name [MONEY]" aliases)
+# read back as Money
+sqlite3.register_adapter(Money, lambda m: m.cents)
+sqlite3.register_converter("MONEY", lambda b: Money(int(b)))
+DETECT_TYPES = sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 DB_PATH = BASE_DIR / "bank_system.db"
 
+# applied once to every pooled connection when it is opened
+PRAGMAS = (
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA foreign_keys=ON",
+)
+# added by enable_shared_mode(): under WAL, NORMAL only syncs at checkpoints;
+# a power cut can lose the last commits but never corrupts the file
+SHARED_PRAGMAS = ("PRAGMA synchronous=NORMAL",)
+
+# how long a statement waits on another connection's lock before SQLITE_BUSY
+BUSY_TIMEOUT = 5.0
+# BEGIN IMMEDIATE is retried this many times more after SQLITE_BUSY, sleeping
+# BUSY_BACKOFF * 2**attempt seconds (with jitter, so stations fall out of step)
+BUSY_RETRIES = 4
+BUSY_BACKOFF = 0.02
+
+def _busy(e: sqlite3.OperationalError) -> bool:
+    msg = str(e)
+    return "locked" in msg or "busy" in msg
+
 def connect():
-    conn = sqlite3.connect(str(DB_PATH))
+    conn = sqlite3.connect(str(DB_PATH), timeout=BUSY_TIMEOUT, detect_types=DETECT_TYPES)
     conn.row_factory = sqlite3.Row
     return conn
 
+class ConnectionManager:
+    """Hands out one long-lived connection per thread.
+
+    ``get()`` returns the calling thread's connection for reads. Using the
+    manager as a context manager wraps the block in a transaction; nested
+    blocks join the outermost one, which commits (or rolls back) on exit.
+    ``savepoint()`` nests a block that can fail on its own.
+    """
+
+    def __init__(self, path=None, pragmas=PRAGMAS):
+        self.path = path
+        self.pragmas = pragmas
+        self.factory = sqlite3.Connection  # swapped by instrument.enable()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conns = []
+        self._generation = 0
+        self.shared = False  # set by enable_shared_mode()
+        self.busy_retries = 0
+
+    def _open(self):
+        conn = sqlite3.connect(str(self.path or DB_PATH), timeout=BUSY_TIMEOUT, isolation_level=None,
+                               factory=self.factory, detect_types=DETECT_TYPES)
+        conn.row_factory = sqlite3.Row
+        for pragma in self.pragmas:
+            conn.execute(pragma)
+        return conn
+
+    def get(self):
+        local = self._local
+        if getattr(local, "generation", None) != self._generation:
+            local.conn = self._open()
+            local.depth = 0
+            local.on_commit = []
+            local.on_rollback = []
+            local.data_version = None
+            local.generation = self._generation
+            with self._lock:
+                self._conns.append(local.conn)
+        return local.conn
+
+    def in_transaction(self) -> bool:
+        return getattr(self._local, "depth", 0) > 0 and self._local.generation == self._generation
+
+    def _begin(self, mode: str = ""):
+        conn = self.get()
+        if self._local.depth == 0:
+            for attempt in range(BUSY_RETRIES + 1):
+                try:
+                    conn.execute(f"BEGIN {mode}")
+                    break
+                except sqlite3.OperationalError as e:
+                    # the busy timeout already waited; back off before queueing again
+                    if not _busy(e) or attempt == BUSY_RETRIES:
+                        raise
+                    with self._lock:
+                        self.busy_retries += 1
+                    time.sleep(BUSY_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5))
+        self._local.depth += 1
+        return conn
+
+    def _end(self, ok: bool):
+        local = self._local
+        local.depth -= 1
+        if local.depth == 0:
+            callbacks, local.on_commit = local.on_commit, []
+            undo, local.on_rollback = local.on_rollback, []
+            committed = False
+            try:
+                local.conn.execute("COMMIT" if ok else "ROLLBACK")
+                committed = ok
+            except sqlite3.OperationalError:
+                # a COMMIT that fails (e.g. SQLITE_BUSY) leaves the transaction
+                # open; roll it back so the connection is usable again
+                if local.conn.in_transaction:
+                    local.conn.execute("ROLLBACK")
+                raise
+            finally:
+                for fn in callbacks if committed else callbacks + undo:
+                    fn()
+
+    def after_commit(self, fn):
+        # run fn once the outermost transaction ends (now if there is none);
+        # used for cache invalidation, so it also runs after a rollback
+        if self.in_transaction():
+            self._local.on_commit.append(fn)
+        else:
+            fn()
+
+    def after_rollback(self, fn):
+        # run fn only if the open transaction rolls back; no-op outside one
+        if self.in_transaction():
+            self._local.on_rollback.append(fn)
+
+    def __enter__(self):
+        return self._begin()
+
+    def __exit__(self, exc_type, exc, tb):
+        self._end(exc_type is None)
+        return False
+
+    @contextmanager
+    def transaction(self, immediate: bool = False):
+        # IMMEDIATE takes the write lock up front so read-then-write units
+        # cannot interleave with another writer; ignored when nested
+        conn = self._begin("IMMEDIATE" if immediate else "")
+        try:
+            yield conn
+        except BaseException:
+            self._end(False)
+            raise
+        self._end(True)
+
+    @contextmanager
+    def savepoint(self):
+        """A nested unit inside the open transaction: on an exception only its
+        own writes are rolled back (and its after_rollback callbacks run)
+        before the exception propagates; the outer transaction carries on."""
+        local = self._local
+        conn = self._begin()
+        name = f"sp{local.depth}"
+        undo_mark = len(local.on_rollback)
+        conn.execute(f"SAVEPOINT {name}")
+        try:
+            yield conn
+        except BaseException:
+            if not conn.in_transaction:
+                # SQLite already rolled the whole transaction back (e.g. disk full)
+                self._end(False)
+                raise
+            conn.execute(f"ROLLBACK TO {name}")
+            conn.execute(f"RELEASE {name}")
+            undo, local.on_rollback[undo_mark:] = local.on_rollback[undo_mark:], []
+            self._end(True)
+            for fn in undo:
+                fn()
+            raise
+        conn.execute(f"RELEASE {name}")
+        self._end(True)
+
+    def changed_elsewhere(self) -> bool:
+        """True if another connection (thread or process) has committed since
+        the calling thread last asked; the first call only takes a baseline."""
+        local = self._local
+        conn = self.get()
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        last, local.data_version = local.data_version, version
+        return last is not None and last != version
+
+    def close_all(self, path=None):
+        # every thread reopens lazily on its next get()
+        with self._lock:
+            conns, self._conns = self._conns, []
+            self._generation += 1
+            if path is not None:
+                self.path = path
+        for conn in conns:
+            try:
+                conn.close()
+            except sqlite3.ProgrammingError:
+                pass
+
+pool = ConnectionManager()
+
+def enable_shared_mode(path=None):
+    """Set up for several stations writing one database file.
+
+    Switches the file to WAL (persistent: every later connection, from any
+    process, uses it), so readers no longer block the writer or each other,
+    and reopens the pool with SHARED_PRAGMAS.  Caches that must notice
+    other stations' writes check ``pool.shared`` and changed_elsewhere().
+    WAL needs the stations on one host; it does not work over network shares.
+    """
+    pool.close_all(path)
+    pool.pragmas = PRAGMAS + SHARED_PRAGMAS
+    pool.shared = True
+    mode = pool.get().execute("PRAGMA journal_mode=WAL").fetchone()[0]
+    if mode.lower() != "wal":
+        raise sqlite3.OperationalError(f"Could not switch {pool.path or DB_PATH} to WAL (journal_mode={mode})")
+
+# postings at or above this many pesos raise a large_amount alert (see
+# detection.py); migrations 3 and 8 compare it with the pre-centavo REAL amounts
+LARGE_TX_THRESHOLD = 500_000
+
+# recompute the trigger-maintained aggregates from scratch
+SEED_SUMMARY = """INSERT OR REPLACE INTO summary (key, value) VALUES
+            ('customers', (SELECT COUNT(*) FROM accounts)),
+            ('total_balance', (SELECT COALESCE(SUM(balance), 0) FROM accounts)),
+            ('loans_outstanding', (SELECT COALESCE(SUM(amount), 0) FROM loans WHERE status = 'disbursed'))"""
+SEED_SUSPICIOUS = f"""INSERT INTO suspicious_hourly (hour, n)
+            SELECT substr(timestamp, 1, 13), COUNT(*) FROM transactions WHERE amount >= {LARGE_TX_THRESHOLD}
+            GROUP BY substr(timestamp, 1, 13)"""
+# since migration 8 the hourly counts are of flagged transactions in alerts
+SEED_SUSPICIOUS_ALERTS = """INSERT INTO suspicious_hourly (hour, n)
+            SELECT substr(timestamp, 1, 13), COUNT(DISTINCT tx_id) FROM alerts GROUP BY substr(timestamp, 1, 13)"""
+
+# Schema migrations, applied in order on top of the base tables created by
+# initialize().  MIGRATIONS[n] upgrades a database at user_version n to n + 1;
+# an entry is a tuple of steps, each an SQL statement or a callable taking the
+# connection.  Append new entries, never edit shipped ones.
+MIGRATIONS = [
+    # 1: indexes for the listing / filter paths in services.py
+    (
+        "CREATE INDEX IF NOT EXISTS idx_tx_ts ON transactions (timestamp, id)",
+        "CREATE INDEX IF NOT EXISTS idx_tx_from ON transactions (from_acc, timestamp, id)",
+        "CREATE INDEX IF NOT EXISTS idx_tx_to ON transactions (to_acc, timestamp, id)",
+        "CREATE INDEX IF NOT EXISTS idx_audit_ts ON audit (timestamp, id)",
+        "CREATE INDEX IF NOT EXISTS idx_loans_status ON loans (status, created_at, id)",
+        "CREATE INDEX IF NOT EXISTS idx_loans_created ON loans (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS idx_accounts_created ON accounts (created_at, account_no)",
+    ),
+    # 2: updated_at on mutable tables so views can fetch only what changed
+    (
+        "ALTER TABLE accounts ADD COLUMN updated_at TEXT",
+        "UPDATE accounts SET updated_at = created_at",
+        "CREATE INDEX IF NOT EXISTS idx_accounts_updated ON accounts (updated_at)",
+        """CREATE TRIGGER IF NOT EXISTS trg_accounts_inserted AFTER INSERT ON accounts BEGIN
+            UPDATE accounts SET updated_at = strftime('%Y-%m-%dT%H:%M:%f', 'now') WHERE rowid = NEW.rowid;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_accounts_updated AFTER UPDATE OF name, balance, status, kyc ON accounts BEGIN
+            UPDATE accounts SET updated_at = strftime('%Y-%m-%dT%H:%M:%f', 'now') WHERE rowid = NEW.rowid;
+        END""",
+        "ALTER TABLE loans ADD COLUMN updated_at TEXT",
+        "UPDATE loans SET updated_at = created_at",
+        "CREATE INDEX IF NOT EXISTS idx_loans_updated ON loans (updated_at)",
+        """CREATE TRIGGER IF NOT EXISTS trg_loans_inserted AFTER INSERT ON loans BEGIN
+            UPDATE loans SET updated_at = strftime('%Y-%m-%dT%H:%M:%f', 'now') WHERE id = NEW.id;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_loans_updated AFTER UPDATE OF amount, term_months, status ON loans BEGIN
+            UPDATE loans SET updated_at = strftime('%Y-%m-%dT%H:%M:%f', 'now') WHERE id = NEW.id;
+        END""",
+    ),
+    # 3: dashboard aggregates kept current by triggers instead of SUM/COUNT scans
+    (
+        "CREATE TABLE IF NOT EXISTS summary (key TEXT PRIMARY KEY, value REAL NOT NULL DEFAULT 0)",
+        SEED_SUMMARY,
+        """CREATE TRIGGER IF NOT EXISTS trg_summary_account_ins AFTER INSERT ON accounts BEGIN
+            UPDATE summary SET value = value + 1 WHERE key = 'customers';
+            UPDATE summary SET value = value + NEW.balance WHERE key = 'total_balance';
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_summary_account_del AFTER DELETE ON accounts BEGIN
+            UPDATE summary SET value = value - 1 WHERE key = 'customers';
+            UPDATE summary SET value = value - OLD.balance WHERE key = 'total_balance';
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_summary_account_bal AFTER UPDATE OF balance ON accounts BEGIN
+            UPDATE summary SET value = value + NEW.balance - OLD.balance WHERE key = 'total_balance';
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_summary_loan_ins AFTER INSERT ON loans WHEN NEW.status = 'disbursed' BEGIN
+            UPDATE summary SET value = value + NEW.amount WHERE key = 'loans_outstanding';
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_summary_loan_del AFTER DELETE ON loans WHEN OLD.status = 'disbursed' BEGIN
+            UPDATE summary SET value = value - OLD.amount WHERE key = 'loans_outstanding';
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_summary_loan_upd AFTER UPDATE OF amount, status ON loans BEGIN
+            UPDATE summary SET value = value
+                + (CASE WHEN NEW.status = 'disbursed' THEN NEW.amount ELSE 0 END)
+                - (CASE WHEN OLD.status = 'disbursed' THEN OLD.amount ELSE 0 END)
+            WHERE key = 'loans_outstanding';
+        END""",
+        # flagged postings bucketed per hour, so "last 24h" reads at most 25 rows
+        "CREATE TABLE IF NOT EXISTS suspicious_hourly (hour TEXT PRIMARY KEY, n INTEGER NOT NULL DEFAULT 0)",
+        SEED_SUSPICIOUS,
+        f"""CREATE TRIGGER IF NOT EXISTS trg_suspicious_large AFTER INSERT ON transactions
+            WHEN NEW.amount >= {LARGE_TX_THRESHOLD} BEGIN
+            INSERT INTO suspicious_hourly (hour, n) VALUES (substr(NEW.timestamp, 1, 13), 1)
+                ON CONFLICT (hour) DO UPDATE SET n = n + 1;
+        END""",
+    ),
+    # 4: reporting rollups, updated as transactions are recorded (see reports.py)
+    (
+        """CREATE TABLE IF NOT EXISTS rollup_daily (
+            day TEXT, tx_type TEXT, tx_count INTEGER NOT NULL DEFAULT 0, volume REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, tx_type)) WITHOUT ROWID""",
+        """CREATE TABLE IF NOT EXISTS rollup_account_monthly (
+            account_no TEXT, month TEXT, tx_type TEXT,
+            inflow REAL NOT NULL DEFAULT 0, outflow REAL NOT NULL DEFAULT 0, tx_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (account_no, month, tx_type)) WITHOUT ROWID""",
+        """CREATE TRIGGER IF NOT EXISTS trg_rollup_tx AFTER INSERT ON transactions BEGIN
+            INSERT INTO rollup_daily (day, tx_type, tx_count, volume)
+                VALUES (substr(NEW.timestamp, 1, 10), NEW.tx_type, 1, NEW.amount)
+                ON CONFLICT (day, tx_type) DO UPDATE SET tx_count = tx_count + 1, volume = volume + excluded.volume;
+            INSERT INTO rollup_account_monthly (account_no, month, tx_type, inflow, tx_count)
+                SELECT NEW.to_acc, substr(NEW.timestamp, 1, 7), NEW.tx_type, NEW.amount, 1 WHERE NEW.to_acc IS NOT NULL
+                ON CONFLICT (account_no, month, tx_type) DO UPDATE SET inflow = inflow + excluded.inflow, tx_count = tx_count + 1;
+            INSERT INTO rollup_account_monthly (account_no, month, tx_type, outflow, tx_count)
+                SELECT NEW.from_acc, substr(NEW.timestamp, 1, 7), NEW.tx_type, NEW.amount, 1 WHERE NEW.from_acc IS NOT NULL
+                ON CONFLICT (account_no, month, tx_type) DO UPDATE SET outflow = outflow + excluded.outflow, tx_count = tx_count + 1;
+        END""",
+        lambda conn: rollup_transactions(conn),
+    ),
+    # 5: trigram full-text index behind services.search_accounts
+    (
+        lambda conn: create_search_index(conn),
+    ),
+    # 6: loan interest and the per-loan amortization snapshot written by
+    # services.recompute_loan_balances (schedules themselves are derived on demand)
+    (
+        "ALTER TABLE loans ADD COLUMN annual_rate REAL NOT NULL DEFAULT 0",
+        """CREATE TABLE IF NOT EXISTS loan_balances (
+            loan_id INTEGER PRIMARY KEY, as_of TEXT NOT NULL, payment REAL NOT NULL, outstanding REAL NOT NULL,
+            principal_paid REAL NOT NULL, interest_paid REAL NOT NULL)""",
+    ),
+    # 7: loan lifecycle; amortization starts at disbursement
+    (
+        "ALTER TABLE loans ADD COLUMN disbursed_at TEXT",
+        "UPDATE loans SET disbursed_at = created_at WHERE status = 'disbursed'",
+    ),
+    # 8: rule-engine alerts (detection.py); the dashboard's suspicious count
+    # now follows them instead of the amount-only trigger
+    (
+        """CREATE TABLE IF NOT EXISTS alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, tx_id INTEGER NOT NULL, account_no TEXT, rule TEXT NOT NULL,
+            details TEXT, timestamp TEXT NOT NULL)""",
+        "CREATE INDEX IF NOT EXISTS idx_alerts_ts ON alerts (timestamp, id)",
+        "CREATE INDEX IF NOT EXISTS idx_alerts_tx ON alerts (tx_id)",
+        "CREATE INDEX IF NOT EXISTS idx_alerts_account ON alerts (account_no, timestamp, id)",
+        f"""INSERT INTO alerts (tx_id, account_no, rule, details, timestamp)
+            SELECT id, COALESCE(from_acc, to_acc), 'large_amount', printf('%.2f >= {LARGE_TX_THRESHOLD}', amount), timestamp
+            FROM transactions WHERE amount >= {LARGE_TX_THRESHOLD} ORDER BY id""",
+        "DROP TRIGGER IF EXISTS trg_suspicious_large",
+        # count a transaction once however many rules it trips
+        """CREATE TRIGGER IF NOT EXISTS trg_suspicious_alert AFTER INSERT ON alerts
+            WHEN NOT EXISTS (SELECT 1 FROM alerts WHERE tx_id = NEW.tx_id AND id <> NEW.id) BEGIN
+            INSERT INTO suspicious_hourly (hour, n) VALUES (substr(NEW.timestamp, 1, 13), 1)
+                ON CONFLICT (hour) DO UPDATE SET n = n + 1;
+        END""",
+        "DELETE FROM suspicious_hourly",
+        SEED_SUSPICIOUS_ALERTS,
+    ),
+    # 9: amounts as integer centavos (money.Money) instead of REAL pesos; the
+    # derived tables are recreated with integer columns and recomputed
+    (
+        lambda conn: convert_money_columns(conn),
+        "DROP TABLE summary",
+        "CREATE TABLE summary (key TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0)",
+        "DROP TABLE rollup_daily",
+        """CREATE TABLE rollup_daily (
+            day TEXT, tx_type TEXT, tx_count INTEGER NOT NULL DEFAULT 0, volume MONEY NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, tx_type)) WITHOUT ROWID""",
+        "DROP TABLE rollup_account_monthly",
+        """CREATE TABLE rollup_account_monthly (
+            account_no TEXT, month TEXT, tx_type TEXT,
+            inflow MONEY NOT NULL DEFAULT 0, outflow MONEY NOT NULL DEFAULT 0, tx_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (account_no, month, tx_type)) WITHOUT ROWID""",
+        lambda conn: rebuild_derived(conn),
+    ),
+    # 10: where archived transactions/audit rows live (see archive.py)
+    (
+        """CREATE TABLE IF NOT EXISTS archive_catalog (
+            tbl TEXT NOT NULL, period TEXT NOT NULL, file TEXT NOT NULL, first_ts TEXT NOT NULL, last_ts TEXT NOT NULL,
+            row_count INTEGER NOT NULL, archived_at TEXT, PRIMARY KEY (tbl, period))""",
+    ),
+]
+
+# REAL peso columns rewritten as MONEY by migration 9
+MONEY_COLUMNS = {
+    "accounts": ("balance",),
+    "transactions": ("amount",),
+    "loans": ("amount",),
+    "loan_balances": ("payment", "outstanding", "principal_paid", "interest_paid"),
+}
+MONEY_MIGRATION_CHUNK = 50_000
+
+def convert_money_columns(conn, chunk: int = MONEY_MIGRATION_CHUNK):
+    for table, columns in MONEY_COLUMNS.items():
+        _retype_money(conn, table, columns, chunk)
+
+def _retype_money(conn, table: str, columns, chunk: int):
+    """Rebuild ``table`` with ``columns`` declared MONEY, pesos converted to centavos.
+
+    SQLite cannot change a column's type in place, and a REAL column would
+    turn stored integers back into floats, so this is the usual
+    create-copy-drop-rename.  Rows are copied in rowid order ``chunk`` at a
+    time: each statement's journal (kept in memory by temp_store=MEMORY)
+    stays bounded however large the table.  Rowids are kept, so the search
+    index and AUTOINCREMENT counters stay valid; indexes and triggers are
+    recreated from their saved DDL.
+    """
+    sql = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()[0]
+    for col in columns:
+        sql = re.sub(rf"\b({col}\s+)REAL\b", r"\1MONEY", sql, count=1, flags=re.I)
+    new = f"{table}__money"
+    conn.execute(re.sub(rf"^CREATE TABLE\s+\"?{table}\"?", f"CREATE TABLE {new}", sql, count=1, flags=re.I))
+    saved = conn.execute("SELECT sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') "
+                         "AND sql IS NOT NULL", (table,)).fetchall()
+    info = conn.execute(f"PRAGMA table_info({table})").fetchall()
+    # an INTEGER PRIMARY KEY already is the rowid
+    keep_rowid = not any(r["pk"] and r["type"].upper() == "INTEGER" for r in info)
+    names = (["rowid"] if keep_rowid else []) + [r["name"] for r in info]
+    exprs = [f"CAST(ROUND({n} * 100) AS INTEGER)" if n in columns else n for n in names]
+    seq = None
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_sequence'").fetchone():
+        seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)).fetchone()
+    copy = f"INSERT INTO {new} ({', '.join(names)}) SELECT {', '.join(exprs)} FROM {table}"
+    last = None
+    while True:
+        if last is None:
+            cur = conn.execute(f"{copy} ORDER BY rowid LIMIT ?", (chunk,))
+        else:
+            cur = conn.execute(f"{copy} WHERE rowid > ? ORDER BY rowid LIMIT ?", (last, chunk))
+        if cur.rowcount < chunk:
+            break
+        last = conn.execute(f"SELECT MAX(rowid) FROM {new}").fetchone()[0]
+    conn.execute(f"DROP TABLE {table}")
+    conn.execute(f"ALTER TABLE {new} RENAME TO {table}")
+    if seq:
+        conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?", (seq[0], table))
+    for (ddl,) in saved:
+        conn.execute(ddl)
+
+
+def rollup_transactions(conn, first_id: int = 0, last_id: int = None):
+    """Fold transactions with first_id <= id <= last_id into the rollup tables."""
+    bounds = "id >= ?" + ("" if last_id is None else " AND id <= ?")
+    params = (first_id,) if last_id is None else (first_id, last_id)
+    conn.execute(f"""INSERT INTO rollup_daily (day, tx_type, tx_count, volume)
+        SELECT substr(timestamp, 1, 10), tx_type, COUNT(*), SUM(amount) FROM transactions WHERE {bounds}
+        GROUP BY 1, 2
+        ON CONFLICT (day, tx_type) DO UPDATE SET tx_count = tx_count + excluded.tx_count, volume = volume + excluded.volume""", params)
+    for column, side in (("inflow", "to_acc"), ("outflow", "from_acc")):
+        conn.execute(f"""INSERT INTO rollup_account_monthly (account_no, month, tx_type, {column}, tx_count)
+            SELECT {side}, substr(timestamp, 1, 7), tx_type, SUM(amount), COUNT(*) FROM transactions
+            WHERE {bounds} AND {side} IS NOT NULL GROUP BY 1, 2, 3
+            ON CONFLICT (account_no, month, tx_type) DO UPDATE SET
+                {column} = {column} + excluded.{column}, tx_count = tx_count + excluded.tx_count""", params)
+
+def create_search_index(conn):
+    """External-content FTS5 trigram index over accounts(account_no, name).
+
+    Skipped when this SQLite lacks FTS5 or the trigram tokenizer (< 3.34);
+    search_accounts then falls back to LIKE scans.
+    """
+    try:
+        conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS accounts_fts USING fts5("
+                     "account_no, name, content='accounts', content_rowid='rowid', tokenize='trigram')")
+    except sqlite3.OperationalError:
+        return
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_accounts_fts_ins AFTER INSERT ON accounts BEGIN
+        INSERT INTO accounts_fts (rowid, account_no, name) VALUES (NEW.rowid, NEW.account_no, NEW.name);
+    END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_accounts_fts_del AFTER DELETE ON accounts BEGIN
+        INSERT INTO accounts_fts (accounts_fts, rowid, account_no, name) VALUES ('delete', OLD.rowid, OLD.account_no, OLD.name);
+    END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_accounts_fts_upd AFTER UPDATE OF account_no, name ON accounts BEGIN
+        INSERT INTO accounts_fts (accounts_fts, rowid, account_no, name) VALUES ('delete', OLD.rowid, OLD.account_no, OLD.name);
+        INSERT INTO accounts_fts (rowid, account_no, name) VALUES (NEW.rowid, NEW.account_no, NEW.name);
+    END""")
+    # serves the prefix lookups for queries shorter than a trigram
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_accounts_name ON accounts (name COLLATE NOCASE)")
+    rebuild_search_index(conn)
+
+
+def rebuild_search_index(conn=None):
+    """Re-derive accounts_fts from the accounts table.
+
+    accounts has no INTEGER PRIMARY KEY, so VACUUM may renumber its rowids
+    and leave the index pointing at the wrong rows: run this after VACUUM.
+    """
+    conn = conn or pool.get()
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'accounts_fts'").fetchone():
+        conn.execute("INSERT INTO accounts_fts (accounts_fts) VALUES ('rebuild')")
+
+
+def rebuild_derived(conn):
+    """Recompute every table the triggers maintain (summary, suspicious_hourly,
+    rollups, search index) from the base tables; the rollups also count the
+    transactions moved to archive files."""
+    from . import archive  # archive.py imports this module
+    conn.execute(SEED_SUMMARY)
+    conn.execute("DELETE FROM suspicious_hourly")
+    conn.execute(SEED_SUSPICIOUS_ALERTS)
+    conn.execute("DELETE FROM rollup_daily")
+    conn.execute("DELETE FROM rollup_account_monthly")
+    rollup_transactions(conn)
+    archive.fold_rollups(conn)
+    rebuild_search_index(conn)
+
+
+@contextmanager
+def bulk_load(conn, tables=("accounts", "transactions", "loans", "audit")):
+    """Drop the triggers on ``tables`` for the duration of a bulk insert.
+
+    Row-at-a-time trigger work dominates large loads; afterwards the triggers
+    are recreated and rebuild_derived() catches the aggregates up in a few
+    set-based statements.  Inserted rows must fill updated_at themselves.
+    Run inside a transaction so no other writer sees the triggers missing.
+    """
+    marks = ",".join("?" * len(tables))
+    saved = conn.execute(f"SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name IN ({marks})",
+                         tables).fetchall()
+    for name, _ in saved:
+        conn.execute(f"DROP TRIGGER {name}")
+    try:
+        yield conn
+    finally:
+        for _, sql in saved:
+            conn.execute(sql)
+    rebuild_derived(conn)
+
+
+def schema_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate():
+    conn = pool.get()
+    version = schema_version(conn)
+    for target in range(version + 1, len(MIGRATIONS) + 1):
+        step = MIGRATIONS[target - 1]
+        with pool.transaction(immediate=True):
+            # another station may have migrated while we waited for the lock
+            if schema_version(conn) >= target:
+                continue
+            for sql in step:
+                if callable(sql):
+                    sql(conn)
+                else:
+                    conn.execute(sql)
+            conn.execute(f"PRAGMA user_version = {target}")
+
 def initialize():
     # Create DB and tables if not exists
-    conn = connect()
-    cur = conn.cursor()
-
-    # admins
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS admins (
-        username TEXT PRIMARY KEY,
-        password_hash TEXT NOT NULL,
-        fullname TEXT,
-        role TEXT,
-        created_at TEXT
-    )""")
-
-    # users/accounts
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS accounts (
-        account_no TEXT PRIMARY KEY,
-        name TEXT NOT NULL,
-        password_hash TEXT NOT NULL,
-        balance REAL DEFAULT 0,
-        status TEXT DEFAULT 'active',
-        kyc INTEGER DEFAULT 0,
-        created_at TEXT
-    )""")
-
-    # transactions: deposit/withdraw/transfer/loan...
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS transactions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        tx_type TEXT,
-        from_acc TEXT,
-        to_acc TEXT,
-        amount REAL,
-        performed_by TEXT,
-        timestamp TEXT
-    )""")
-
-    # loans
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS loans (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        account_no TEXT,
-        amount REAL,
-        term_months INTEGER,
-        status TEXT,
-        created_at TEXT
-    )""")
-
-    # audit log
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS audit (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        actor TEXT,
-        action TEXT,
-        details TEXT,
-        timestamp TEXT
-    )""")
-
-    conn.commit()
-
-    # ensure default admin (charles / charles123) exists
-    cur.execute("SELECT username FROM admins WHERE username=?", ("Admin",))
-    if not cur.fetchone():
-        import hashlib, datetime
-        pw = "Admin123"
-        pw_hash = hashlib.sha256(pw.encode()).hexdigest()
-        cur.execute("INSERT INTO admins (username, password_hash, fullname, role, created_at) VALUES (?,?,?,?,?)",
-                    ("Admin", pw_hash, "Admin", "superadmin", datetime.datetime.utcnow().isoformat()))
-        conn.commit()
-
-    conn.close()
\ No newline at end of file
+    with pool as conn:
+        cur = conn.cursor()
+
+        # admins
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS admins (
+            username TEXT PRIMARY KEY,
+            password_hash TEXT NOT NULL,
+            fullname TEXT,
+            role TEXT,
+            created_at TEXT
+        )""")
+
+        # users/accounts
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS accounts (
+            account_no TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            password_hash TEXT NOT NULL,
+            balance REAL DEFAULT 0,
+            status TEXT DEFAULT 'active',
+            kyc INTEGER DEFAULT 0,
+            created_at TEXT
+        )""")
+
+        # transactions: deposit/withdraw/transfer/loan...
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tx_type TEXT,
+            from_acc TEXT,
+            to_acc TEXT,
+            amount REAL,
+            performed_by TEXT,
+            timestamp TEXT
+        )""")
+
+        # loans
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS loans (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            account_no TEXT,
+            amount REAL,
+            term_months INTEGER,
+            status TEXT,
+            created_at TEXT
+        )""")
+
+        # audit log
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS audit (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            actor TEXT,
+            action TEXT,
+            details TEXT,
+            timestamp TEXT
+        )""")
+
+        # ensure default admin (charles / charles123) exists
+        cur.execute("SELECT username FROM admins WHERE username=?", ("Admin",))
+        if not cur.fetchone():
+            import datetime
+            from .passwords import hash_password
+            pw = "Admin123"
+            pw_hash = hash_password(pw)
+            cur.execute("INSERT INTO admins (username, password_hash, fullname, role, created_at) VALUES (?,?,?,?,?)",
+                        ("Admin", pw_hash, "Admin", "superadmin", datetime.datetime.utcnow().isoformat()))
+
+    migrate()
@@ -0,0 +1,184 @@
+# backend/detection.py
+# Streaming rules over postings as they are recorded.  Each account keeps a
+# few deques of recent activity covering the longest rule window, so a rule
+# check is a handful of O(1) updates instead of a query against the ledger.
+# State is rebuilt from the last window of history on first use, and postings
+# recorded by other stations (ids we never saw) are replayed before our own.
+import datetime
+import threading
+from collections import defaultdict, deque
+
+from .db import LARGE_TX_THRESHOLD, pool
+from .money import Money
+
+VELOCITY_WINDOW = 600        # seconds
+VELOCITY_MAX = 20            # postings touching one account within the window
+RAPID_WINDOW = 1800
+RAPID_MIN_INFLOW = Money.of(50_000)  # only look at sizeable money passing through
+RAPID_OUT_RATIO = 0.8        # share of the recent inflow sent back out
+FANOUT_WINDOW = 3600
+FANOUT_MIN_DESTS = 5         # distinct transfer destinations within the window
+LARGE_AMOUNT = Money.of(LARGE_TX_THRESHOLD)
+MAX_WINDOW = max(VELOCITY_WINDOW, RAPID_WINDOW, FANOUT_WINDOW)
+SWEEP_EVERY = 100_000        # observations between sweeps of idle accounts
+
+INSERT_ALERT = "INSERT INTO alerts (tx_id, account_no, rule, details, timestamp) VALUES (?,?,?,?,?)"
+
+
+def _epoch(ts: str) -> float:
+    return datetime.datetime.fromisoformat(ts).replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+class AccountWindow:
+    __slots__ = ("events", "inflows", "inflow_sum", "dests", "dest_counts", "last_alert")
+
+    def __init__(self):
+        self.events = deque()        # times of postings touching the account
+        self.inflows = deque()       # (time, centavos) credited
+        self.inflow_sum = 0
+        self.dests = deque()         # (time, destination) of outgoing transfers
+        self.dest_counts = defaultdict(int)
+        self.last_alert = {}         # rule -> time, to raise each rule once per window
+
+    def expire(self, now: float):
+        events, inflows, dests = self.events, self.inflows, self.dests
+        while events and events[0] <= now - VELOCITY_WINDOW:
+            events.popleft()
+        while inflows and inflows[0][0] <= now - RAPID_WINDOW:
+            self.inflow_sum -= inflows.popleft()[1]
+        while dests and dests[0][0] <= now - FANOUT_WINDOW:
+            dst = dests.popleft()[1]
+            self.dest_counts[dst] -= 1
+            if not self.dest_counts[dst]:
+                del self.dest_counts[dst]
+
+    def idle(self) -> bool:
+        return not (self.events or self.inflows or self.dests)
+
+
+class Engine:
+    """Evaluates velocity, large-amount, rapid in-out and fan-out rules."""
+
+    def __init__(self):
+        self._accounts = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._seen = 0
+        self._last_id = 0  # highest posting id folded into the windows
+
+    def _window(self, account_no):
+        w = self._accounts.get(account_no)
+        if w is None:
+            w = self._accounts[account_no] = AccountWindow()
+        return w
+
+    def _raise(self, w, alerts, rule, now, tx_id, account_no, details, ts, window):
+        last = w.last_alert.get(rule)
+        if last is not None and now - last < window:
+            return
+        w.last_alert[rule] = now
+        alerts.append((tx_id, account_no, rule, details, ts))
+
+    def _observe(self, tx_id, tx_type, src, dst, amount, ts, alerts=None):
+        now = _epoch(ts)
+        cents = amount.cents  # windows keep plain ints
+        if tx_id > self._last_id:
+            self._last_id = tx_id
+        if alerts is not None and cents >= LARGE_AMOUNT.cents:
+            alerts.append((tx_id, src or dst, "large_amount", f"{amount} >= {LARGE_TX_THRESHOLD}", ts))
+        for acc in (src, dst):
+            if not acc:
+                continue
+            w = self._window(acc)
+            w.expire(now)
+            w.events.append(now)
+            if alerts is not None and len(w.events) >= VELOCITY_MAX:
+                self._raise(w, alerts, "velocity", now, tx_id, acc,
+                            f"{len(w.events)} postings in {VELOCITY_WINDOW}s", ts, VELOCITY_WINDOW)
+        if src:
+            w = self._accounts[src]
+            if (alerts is not None and w.inflow_sum >= RAPID_MIN_INFLOW.cents
+                    and cents >= RAPID_OUT_RATIO * w.inflow_sum):
+                self._raise(w, alerts, "rapid_in_out", now, tx_id, src,
+                            f"{amount} out after {Money(w.inflow_sum)} in within {RAPID_WINDOW}s", ts, RAPID_WINDOW)
+            if dst:
+                w.dests.append((now, dst))
+                w.dest_counts[dst] += 1
+                if alerts is not None and len(w.dest_counts) >= FANOUT_MIN_DESTS:
+                    self._raise(w, alerts, "fan_out", now, tx_id, src,
+                                f"{len(w.dest_counts)} destinations in {FANOUT_WINDOW}s", ts, FANOUT_WINDOW)
+        if dst:
+            w = self._accounts[dst]
+            w.inflows.append((now, cents))
+            w.inflow_sum += cents
+        self._seen += 1
+        if self._seen % SWEEP_EVERY == 0:
+            self._sweep(now)
+
+    def _sweep(self, now: float):
+        for acc in list(self._accounts):
+            w = self._accounts[acc]
+            w.expire(now)
+            if w.idle():
+                del self._accounts[acc]
+
+    def rebuild(self, conn=None, before_id: int = None):
+        """Reload window state from the last MAX_WINDOW seconds of the ledger
+        (postings with id < ``before_id`` when given).
+
+        Replayed postings update state but raise no alerts; they were
+        evaluated when first recorded.
+        """
+        conn = conn or pool.get()
+        bound, params = ("", ()) if before_id is None else (" AND id < ?", (before_id,))
+        with self._lock:
+            self._accounts.clear()
+            self._last_id = (conn.execute("SELECT COALESCE(MAX(id), 0) FROM transactions").fetchone()[0]
+                             if before_id is None else before_id - 1)
+            last = conn.execute(f"SELECT MAX(timestamp) FROM transactions WHERE 1{bound}", params).fetchone()[0]
+            if last:
+                since = (datetime.datetime.fromisoformat(last) - datetime.timedelta(seconds=MAX_WINDOW)).isoformat()
+                for r in conn.execute("SELECT id, tx_type, from_acc, to_acc, amount, timestamp FROM transactions "
+                                      f"WHERE timestamp > ?{bound} ORDER BY timestamp, id", (since,) + params):
+                    self._observe(*r)
+            self._loaded = True
+
+    def evaluate(self, conn, postings):
+        """Run the rules over ``postings`` (tx_id, tx_type, from_acc, to_acc,
+        amount, timestamp) in order and insert any alerts through ``conn``,
+        inside the caller's transaction.  Returns the alerts raised.
+        """
+        if not postings:
+            return []
+        if not self._loaded:
+            self.rebuild(conn, before_id=postings[0][0])
+        alerts = []
+        with self._lock:
+            if postings[0][0] > self._last_id + 1:
+                # another station posted since we last looked; fold its postings in without alerting
+                for r in conn.execute("SELECT id, tx_type, from_acc, to_acc, amount, timestamp FROM transactions "
+                                      "WHERE id > ? AND id < ? ORDER BY id", (self._last_id, postings[0][0])):
+                    self._observe(*r)
+            for p in postings:
+                self._observe(*p, alerts=alerts)
+        if alerts:
+            conn.executemany(INSERT_ALERT, alerts)
+        return alerts
+
+    def reset(self):
+        # state no longer matches the ledger (e.g. a rolled-back posting): reload lazily
+        with self._lock:
+            self._accounts.clear()
+            self._loaded = False
+            self._last_id = 0
+
+
+engine = Engine()
+
+
+def observe(conn, postings):
+    """Evaluate postings within the current pool transaction; if it rolls
+    back, the in-memory state is reloaded from the ledger on next use."""
+    alerts = engine.evaluate(conn, postings)
+    pool.after_rollback(engine.reset)
+    return alerts
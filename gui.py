@@ -1,9 +1,14 @@
 # frontend/gui.py
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog, filedialog
-from backend import services
+from backend import instrument, services
+from backend.money import Money
 from PIL import Image
 import uuid
+import time
+import functools
+from .widgets import VirtualTable, ProgressDialog
+from .workers import Worker
 
 
 PRIMARY = "#4C6EF5"
@@ -30,9 +35,26 @@ def setup_styles():
 
 
 
+PAGE_SIZE = 200
+
 def gen_account_no():
     return "AC" + uuid.uuid4().hex[:8].upper()
 
+def ask_money(title, prompt):
+    # exact centavos from what was typed; None if cancelled
+    while True:
+        text = simpledialog.askstring(title, prompt)
+        if text is None:
+            return None
+        try:
+            amt = Money.of(text)
+        except ValueError:
+            messagebox.showerror("Error", "Invalid amount")
+            continue
+        if amt.cents > 0:
+            return amt
+        messagebox.showerror("Error", "Amount must be positive")
+
 class App(tk.Tk):
     def __init__(self):
         super().__init__()
@@ -42,9 +64,19 @@ class App(tk.Tk):
         self.style.theme_use("clam")
         self.logged_admin = None
         self.logged_user = None
+        # every services call from a handler goes through here, never on the Tk thread
+        self.worker = Worker(self)
         self.create_login_view()
-        
-    
+
+    def destroy(self):
+        # let queued jobs (a logout audit, say) run before the final flush;
+        # exports in progress are cancelled rather than waited out
+        self.worker.shutdown(drain=True)
+        services.flush_audit()
+        super().destroy()
+
+    def show_error(self, e):
+        messagebox.showerror("Error", str(e))
 
     def create_login_view(self):
         for w in self.winfo_children(): w.destroy()
@@ -76,23 +108,27 @@ class App(tk.Tk):
         if not u or not p:
             messagebox.showerror("Error","Enter credentials")
             return
-        if services.validate_admin(u, p):
-            self.logged_admin = u
-            services.audit(u, "login", "admin login")
-            self.open_admin_dashboard()
-        else:
-            messagebox.showerror("Error","Invalid admin")
+        def done(ok):
+            if ok:
+                self.logged_admin = u
+                self.worker.submit(services.audit, u, "login", "admin login")
+                self.open_admin_dashboard()
+            else:
+                messagebox.showerror("Error","Invalid admin")
+        self.worker.submit(services.validate_admin, u, p, on_done=done, on_error=self.show_error)
 
     # ---- user login
     def handle_user_login(self):
         acc = self.user_acc.get().strip()
         pw = self.user_pw.get().strip()
-        if services.authenticate_user(acc, pw):
-            self.logged_user = acc
-            services.audit(acc, "user_login", "")
-            self.open_user_dashboard(acc)
-        else:
-            messagebox.showerror("Error","Invalid account or password")
+        def done(ok):
+            if ok:
+                self.logged_user = acc
+                self.worker.submit(services.audit, acc, "user_login", "")
+                self.open_user_dashboard(acc)
+            else:
+                messagebox.showerror("Error","Invalid account or password")
+        self.worker.submit(services.authenticate_user, acc, pw, on_done=done, on_error=self.show_error)
 
     # ---- create account dialog
     def open_create_account(self):
@@ -107,17 +143,15 @@ class App(tk.Tk):
         def submit():
             name = name_e.get().strip(); pw = pw_e.get().strip()
             try:
-                dep = float(dep_e.get().strip() or 0.0)
-            except:
+                dep = Money.of(dep_e.get().strip() or 0)
+            except ValueError:
                 messagebox.showerror("Error","Invalid deposit")
                 return
             acc_no = gen_account_no()
-            try:
-                services.create_account(acc_no, name, pw, dep)
+            def done(_):
                 messagebox.showinfo("Created", f"Account created: {acc_no}")
                 dlg.destroy()
-            except Exception as e:
-                messagebox.showerror("Error", str(e))
+            self.worker.submit(services.create_account, acc_no, name, pw, dep, on_done=done, on_error=self.show_error)
         ttk.Button(dlg, text="Create", command=submit).pack(pady=10)
 
     # ---- admin dashboard
@@ -127,175 +161,226 @@ class App(tk.Tk):
         main = ttk.Frame(self); main.pack(side="left", fill="both", expand=True, padx=8, pady=8)
         ttk.Label(sidebar, text=f"Admin: {self.logged_admin}", font=("Segoe UI", 12)).pack(pady=8)
         ttk.Button(sidebar, text="Accounts", command=lambda: self.show_accounts(main)).pack(fill="x", padx=8, pady=6)
-        ttk.Button(sidebar, text="Transactions", command=lambda: self.show_transactions(main)).pack(fill="x", padx=8, pady=6)
+        ttk.Button(sidebar, text="Transactions", command=lambda: self.show_admin_transactions(main)).pack(fill="x", padx=8, pady=6)
         ttk.Button(sidebar, text="Loans", command=lambda: self.show_loans(main)).pack(fill="x", padx=8, pady=6)
         ttk.Button(sidebar, text="Export CSV", command=self.export_csv).pack(fill="x", padx=8, pady=6)
+        ttk.Button(sidebar, text="Export TX (CSV)", command=self.export_tx_csv).pack(fill="x", padx=8, pady=6)
         ttk.Button(sidebar, text="Export TX (PDF)", command=self.export_tx_pdf).pack(fill="x", padx=8, pady=6)
         ttk.Button(sidebar, text="Audit", command=lambda: self.show_audit(main)).pack(fill="x", padx=8, pady=6)
+        ttk.Button(sidebar, text="Metrics", command=lambda: self.show_metrics(main)).pack(fill="x", padx=8, pady=6)
         ttk.Button(sidebar, text="Logout", command=self.logout).pack(side="bottom", padx=8, pady=12)
         self.show_accounts(main)
 
     def logout(self):
+        # admin and user sessions both end with a durable audit row, which
+        # flushes everything queued before it
         if self.logged_admin:
-            services.audit(self.logged_admin, "logout", "")
+            self.worker.submit(services.audit, self.logged_admin, "logout", "", durable=True)
             self.logged_admin = None
+        if self.logged_user:
+            self.worker.submit(services.audit, self.logged_user, "user_logout", "", durable=True)
+            self.logged_user = None
         self.create_login_view()
 
+    # ---- tables: only the visible window is materialized, pages load on scroll,
+    # and Refresh pulls just the rows past the view's high-water mark; both on the worker
+    def make_table(self, container, cols, fetch, values, key=services.LEDGER_KEY, row_id=lambda r: r["id"], changes=None):
+        table = VirtualTable(container, cols, fetch, values, key, chunk=PAGE_SIZE, row_id=row_id, changes=changes,
+                             worker=self.worker, on_error=self.show_error)
+        table.pack(fill="both", expand=True, pady=6)
+        return table
+
+    def selected(self, table, what):
+        row = table.selected_row()
+        if row is None:
+            messagebox.showwarning("Select", f"Select {what} first")
+        return row
+
     # ---- admin views
     def show_accounts(self, container):
         for w in container.winfo_children(): w.destroy()
         ttk.Label(container, text="Accounts", font=("Segoe UI", 14, "bold")).pack(anchor="w")
         cols = ("account_no", "name", "balance", "status", "kyc", "created_at")
-        tree = ttk.Treeview(container, columns=cols, show="headings")
-        for c in cols:
-            tree.heading(c, text=c.title().replace("_"," "))
-        tree.pack(fill="both", expand=True, pady=6)
-        for a in services.list_accounts():
-            tree.insert("", "end", values=(a["account_no"], a["name"], f"₱{a['balance']:.2f}", a["status"], a.get("kyc",0), a.get("created_at","")))
+        table = self.make_table(container, cols, lambda n, before: services.list_accounts(n, before),
+                                lambda a: (a["account_no"], a["name"], f"₱{a['balance']:.2f}", a["status"], a.get("kyc",0), a.get("created_at","")),
+                                services.ACCOUNT_KEY, lambda a: a["account_no"], services.accounts_changed_since)
         # actions
         btns = ttk.Frame(container); btns.pack(fill="x")
-        ttk.Button(btns, text="Refresh", command=lambda: self.show_accounts(container)).pack(side="left", padx=4)
-        ttk.Button(btns, text="Deposit", command=lambda: self.admin_deposit(tree, container)).pack(side="left", padx=4)
-        ttk.Button(btns, text="Withdraw", command=lambda: self.admin_withdraw(tree, container)).pack(side="left", padx=4)
+        ttk.Button(btns, text="Refresh", command=table.refresh).pack(side="left", padx=4)
+        ttk.Button(btns, text="Deposit", command=lambda: self.admin_deposit(table)).pack(side="left", padx=4)
+        ttk.Button(btns, text="Withdraw", command=lambda: self.admin_withdraw(table)).pack(side="left", padx=4)
         ttk.Button(btns, text="Transfer", command=lambda: self.admin_transfer()).pack(side="left", padx=4)
-        ttk.Button(btns, text="Delete", command=lambda: self.admin_delete(tree, container)).pack(side="left", padx=4)
-        ttk.Button(btns, text="KYC Verify", command=lambda: self.admin_kyc(tree, container)).pack(side="left", padx=4)
-
-    def admin_deposit(self, tree, container):
-        sel = tree.selection()
-        if not sel:
-            messagebox.showwarning("Select", "Select an account first")
-            return
-        acc = tree.item(sel[0])["values"][0]
-        amt = simpledialog.askfloat("Amount", "Amount to deposit:")
+        ttk.Button(btns, text="Delete", command=lambda: self.admin_delete(table)).pack(side="left", padx=4)
+        ttk.Button(btns, text="KYC Verify", command=lambda: self.admin_kyc(table)).pack(side="left", padx=4)
+
+    def admin_deposit(self, table):
+        row = self.selected(table, "an account")
+        if row is None: return
+        acc = row["account_no"]
+        amt = ask_money("Amount", "Amount to deposit:")
         if amt is None: return
-        try:
-            services.deposit(acc, amt, performed_by=self.logged_admin)
+        def done(_):
             messagebox.showinfo("Success", f"Deposited ₱{amt:.2f}")
-            self.show_accounts(container)
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
-
-    def admin_withdraw(self, tree, container):
-        sel = tree.selection()
-        if not sel:
-            messagebox.showwarning("Select", "Select an account first")
-            return
-        acc = tree.item(sel[0])["values"][0]
-        amt = simpledialog.askfloat("Amount", "Amount to withdraw:")
+            table.refresh()
+        self.worker.submit(services.deposit, acc, amt, performed_by=self.logged_admin, on_done=done, on_error=self.show_error)
+
+    def admin_withdraw(self, table):
+        row = self.selected(table, "an account")
+        if row is None: return
+        acc = row["account_no"]
+        amt = ask_money("Amount", "Amount to withdraw:")
         if amt is None: return
-        try:
-            services.withdraw(acc, amt, performed_by=self.logged_admin)
+        def done(_):
             messagebox.showinfo("Success", f"Withdrew ₱{amt:.2f}")
-            self.show_accounts(container)
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+            table.refresh()
+        self.worker.submit(services.withdraw, acc, amt, performed_by=self.logged_admin, on_done=done, on_error=self.show_error)
 
     def admin_transfer(self):
         src = simpledialog.askstring("From", "Source account no:")
         dst = simpledialog.askstring("To", "Destination account no:")
-        amt = simpledialog.askfloat("Amount", "Amount to transfer:")
+        amt = ask_money("Amount", "Amount to transfer:")
         if not src or not dst or amt is None:
             return
-        try:
-            services.transfer(src, dst, amt, performed_by=self.logged_admin)
-            messagebox.showinfo("Success", f"Transferred ₱{amt:.2f}")
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
-
-    def admin_delete(self, tree, container):
-        sel = tree.selection()
-        if not sel:
-            messagebox.showwarning("Select", "Select an account first")
-            return
-        acc = tree.item(sel[0])["values"][0]
+        self.worker.submit(services.transfer, src, dst, amt, performed_by=self.logged_admin,
+                           on_done=lambda _: messagebox.showinfo("Success", f"Transferred ₱{amt:.2f}"),
+                           on_error=self.show_error)
+
+    def admin_delete(self, table):
+        row = self.selected(table, "an account")
+        if row is None: return
+        acc = row["account_no"]
         if messagebox.askyesno("Confirm", f"Delete account {acc}?"):
-            conn = services.connect()
-            cur = conn.cursor()
-            cur.execute("DELETE FROM accounts WHERE account_no=?", (acc,))
-            conn.commit(); conn.close()
-            services.audit(self.logged_admin, "delete_account", acc)
-            self.show_accounts(container)
-
-    def admin_kyc(self, tree, container):
-        sel = tree.selection()
-        if not sel:
-            messagebox.showwarning("Select", "Select an account first")
-            return
-        acc = tree.item(sel[0])["values"][0]
-        conn = services.connect()
-        cur = conn.cursor()
-        cur.execute("UPDATE accounts SET kyc=1 WHERE account_no=?", (acc,))
-        conn.commit(); conn.close()
-        services.audit(self.logged_admin, "kyc_verify", acc)
-        self.show_accounts(container)
-
-    def show_transactions(self, container):
+            self.worker.submit(services.delete_account, acc, self.logged_admin,
+                               on_done=lambda _: table.reload(), on_error=self.show_error)
+
+    def admin_kyc(self, table):
+        row = self.selected(table, "an account")
+        if row is None: return
+        acc = row["account_no"]
+        self.worker.submit(services.verify_kyc, acc, self.logged_admin,
+                           on_done=lambda _: table.refresh(), on_error=self.show_error)
+
+    def show_admin_transactions(self, container):
         for w in container.winfo_children(): w.destroy()
         ttk.Label(container, text="Transactions", font=("Segoe UI", 14)).pack(anchor="w")
         cols = ("id","tx_type","from_acc","to_acc","amount","performed_by","timestamp")
-        tree = ttk.Treeview(container, columns=cols, show="headings")
-        for c in cols: tree.heading(c, text=c.title().replace("_"," "))
-        tree.pack(fill="both", expand=True)
-        for t in services.get_transactions():
-            tree.insert("", "end", values=(t["id"], t["tx_type"], t.get("from_acc"), t.get("to_acc"), f"₱{t['amount']}", t.get("performed_by"), t["timestamp"]))
-        ttk.Button(container, text="Refresh", command=lambda: self.show_transactions(container)).pack(pady=6)
+        table = self.make_table(container, cols, lambda n, before: services.get_transactions(None, n, before),
+                                lambda t: (t["id"], t["tx_type"], t.get("from_acc"), t.get("to_acc"), f"₱{t['amount']}", t.get("performed_by"), t["timestamp"]),
+                                changes=services.transactions_since)
+        ttk.Button(container, text="Refresh", command=table.refresh).pack(pady=6)
 
     def show_loans(self, container):
         for w in container.winfo_children(): w.destroy()
         ttk.Label(container, text="Loans", font=("Segoe UI", 14)).pack(anchor="w")
-        tree = ttk.Treeview(container, columns=("id","account_no","amount","term_months","status","created_at"), show="headings")
-        for c in ("id","account_no","amount","term_months","status","created_at"):
-            tree.heading(c, text=c.title())
-        tree.pack(fill="both", expand=True)
-        for l in services.list_loans():
-            tree.insert("", "end", values=(l["id"],l["account_no"],f"₱{l['amount']:.2f}", l["term_months"], l["status"], l["created_at"]))
-        ttk.Button(container, text="Refresh", command=lambda: self.show_loans(container)).pack(pady=6)
+        cols = ("id","account_no","amount","term_months","status","created_at")
+        table = self.make_table(container, cols, lambda n, before: services.list_loans(None, n, before),
+                                lambda l: (l["id"],l["account_no"],f"₱{l['amount']:.2f}", l["term_months"], l["status"], l["created_at"]),
+                                services.LOAN_KEY, changes=services.loans_changed_since)
+        ttk.Button(container, text="Refresh", command=table.refresh).pack(pady=6)
         # actions: approve/reject/disburse
         btnf = ttk.Frame(container); btnf.pack(pady=6)
-        ttk.Button(btnf, text="Approve", command=lambda: self.loan_action(tree,"approved")).pack(side="left", padx=4)
-        ttk.Button(btnf, text="Reject", command=lambda: self.loan_action(tree,"rejected")).pack(side="left", padx=4)
-        ttk.Button(btnf, text="Disburse", command=lambda: self.loan_action(tree,"disbursed")).pack(side="left", padx=4)
-
-    def loan_action(self, tree, action):
-        sel = tree.selection()
-        if not sel:
-            messagebox.showwarning("Select", "Select a loan")
-            return
-        loan_id = tree.item(sel[0])["values"][0]
-        services.update_loan_status(loan_id, action)
-        messagebox.showinfo("Loan", f"Loan {action}")
-        self.show_loans(tree.master)
+        ttk.Button(btnf, text="Approve", command=lambda: self.loan_action(table,"approved")).pack(side="left", padx=4)
+        ttk.Button(btnf, text="Reject", command=lambda: self.loan_action(table,"rejected")).pack(side="left", padx=4)
+        ttk.Button(btnf, text="Disburse", command=lambda: self.loan_action(table,"disbursed")).pack(side="left", padx=4)
+        ttk.Button(btnf, text="Mark Repaid", command=lambda: self.loan_action(table,"repaid")).pack(side="left", padx=4)
+        ttk.Button(btnf, text="Disburse All Approved", command=lambda: self.disburse_approved(table)).pack(side="left", padx=4)
+
+    def loan_action(self, table, action):
+        row = self.selected(table, "a loan")
+        if row is None: return
+        def done(_):
+            messagebox.showinfo("Loan", f"Loan {action}")
+            table.refresh()
+        self.worker.submit(services.update_loan_status, row["id"], action, performed_by=self.logged_admin,
+                           on_done=done, on_error=self.show_error)
+
+    def disburse_approved(self, table):
+        if not messagebox.askyesno("Confirm", "Disburse every approved loan?"): return
+        def run():
+            ids = [l["id"] for l in services.list_loans("approved")]
+            return services.transition_loans(ids, "disbursed", self.logged_admin)
+        def done(results):
+            ok = sum(r["ok"] for r in results)
+            messagebox.showinfo("Loans", f"Disbursed {ok} of {len(results)} approved loans")
+            table.refresh()
+        self.worker.submit(run, on_done=done, on_error=self.show_error)
 
     def show_audit(self, container):
         for w in container.winfo_children(): w.destroy()
         ttk.Label(container, text="Audit Log", font=("Segoe UI", 14)).pack(anchor="w")
         cols = ("id","actor","action","details","timestamp")
-        tree = ttk.Treeview(container, columns=cols, show="headings")
-        for c in cols: tree.heading(c, text=c.title())
-        tree.pack(fill="both", expand=True)
-        for a in services.list_audit():
-            tree.insert("", "end", values=(a["id"], a["actor"], a["action"], a["details"], a["timestamp"]))
-        ttk.Button(container, text="Refresh", command=lambda: self.show_audit(container)).pack(pady=6)
+        table = self.make_table(container, cols, lambda n, before: services.list_audit(n, before),
+                                lambda a: (a["id"], a["actor"], a["action"], a["details"], a["timestamp"]),
+                                changes=services.audit_since)
+        ttk.Button(container, text="Refresh", command=table.refresh).pack(pady=6)
+
+    # ---- instrumentation snapshot (see backend/instrument.py); in-memory, so read on the Tk thread
+    def show_metrics(self, container):
+        for w in container.winfo_children(): w.destroy()
+        ttk.Label(container, text="Metrics", font=("Segoe UI", 14)).pack(anchor="w")
+        if not instrument.enabled:
+            ttk.Label(container, text="Instrumentation is off. Start the app with BANK_INSTRUMENT=1 "
+                                      "(optionally BANK_SLOW_MS=<ms> for the slow-query log).").pack(anchor="w", pady=8)
+            return
+        cols = ("name", "count", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms", "rows")
+        trees = {}
+        for section, height in (("functions", 10), ("statements", 14)):
+            ttk.Label(container, text=section.title(), font=("Segoe UI", 11)).pack(anchor="w", pady=(8, 0))
+            tree = ttk.Treeview(container, columns=cols, show="headings", height=height)
+            for c in cols:
+                tree.heading(c, text=c.replace("_", " "))
+                tree.column(c, width=420 if c == "name" else 80, anchor="w" if c == "name" else "e")
+            tree.pack(fill="both", expand=True)
+            trees[section] = tree
+        def refresh():
+            snap = instrument.snapshot()
+            for section, tree in trees.items():
+                tree.delete(*tree.get_children())
+                for s in snap[section]:
+                    tree.insert("", "end", values=(s["name"], s["count"], *(f"{s[c]:.2f}" for c in cols[2:7]), s["rows"]))
+        def reset():
+            instrument.reset()
+            refresh()
+        btnf = ttk.Frame(container); btnf.pack(pady=6)
+        ttk.Button(btnf, text="Refresh", command=refresh).pack(side="left", padx=4)
+        ttk.Button(btnf, text="Reset", command=reset).pack(side="left", padx=4)
+        ttk.Label(btnf, text=f"slow-query log threshold: {instrument.slow_ms:g} ms").pack(side="left", padx=12)
+        refresh()
+
+    # ---- exports run in the background with a progress dialog
+    def run_export(self, title, fn, path):
+        dlg = ProgressDialog(self, title)
+        started = time.perf_counter()
+        rows = [0]
+        def progress(done, total=None):
+            rows[0] = done
+            dlg.update_progress(done, total)
+        def done(_):
+            dlg.destroy()
+            rate = rows[0] / max(time.perf_counter() - started, 1e-9)
+            messagebox.showinfo("Exported", f"Saved to {path}\n{rows[0]:,} rows at {rate:,.0f} rows/sec")
+        def failed(e):
+            dlg.destroy()
+            if not isinstance(e, services.Cancelled):
+                messagebox.showerror("Error", str(e))
+        task = self.worker.submit(fn, path, on_done=done, on_error=failed,
+                                  on_progress=progress, cancellable=True)
+        dlg.on_cancel = task.cancel
 
     def export_csv(self):
         path = filedialog.asksaveasfilename(defaultextension=".csv")
         if not path: return
-        try:
-            services.export_accounts_csv(path)
-            messagebox.showinfo("Exported", f"Saved to {path}")
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        self.run_export("Export CSV", services.export_accounts_csv, path)
+
+    def export_tx_csv(self):
+        path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV", "*.csv"), ("Gzipped CSV", "*.csv.gz")])
+        if not path: return
+        self.run_export("Export TX (CSV)", functools.partial(services.export_transactions_csv, compress=path.endswith(".gz")), path)
 
     def export_tx_pdf(self):
-        # may raise if reportlab not installed
-        try:
-            path = filedialog.asksaveasfilename(defaultextension=".pdf")
-            if not path: return
-            services.export_transactions_pdf(path)
-            messagebox.showinfo("Exported", f"Saved to {path}")
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        path = filedialog.asksaveasfilename(defaultextension=".pdf")
+        if not path: return
+        self.run_export("Export TX (PDF)", services.export_transactions_pdf, path)
 
     # ---- user dashboard
     def open_user_dashboard(self, acc_no):
@@ -303,42 +388,40 @@ class App(tk.Tk):
         self.logged_user = acc_no
         topbar = ttk.Frame(self); topbar.pack(fill="x")
         ttk.Label(topbar, text=f"User: {acc_no}", font=("Segoe UI", 12)).pack(side="left", padx=8)
-        ttk.Button(topbar, text="Logout", command=self.create_login_view).pack(side="right", padx=8)
+        ttk.Button(topbar, text="Logout", command=self.logout).pack(side="right", padx=8)
         main = ttk.Frame(self); main.pack(fill="both", expand=True, padx=8, pady=8)
-        ttk.Label(main, text=f"Balance: ₱{services.get_account(acc_no)['balance']:.2f}", font=("Segoe UI", 14)).pack(anchor="w")
+        balance = ttk.Label(main, text="Balance: ...", font=("Segoe UI", 14)); balance.pack(anchor="w")
+        def show_balance(acc):
+            if balance.winfo_exists():
+                balance.configure(text=f"Balance: ₱{acc['balance']:.2f}")
+        self.worker.submit(services.get_account, acc_no, on_done=show_balance, on_error=self.show_error)
         frame = ttk.Frame(main); frame.pack(anchor="w", pady=6)
         ttk.Button(frame, text="Deposit", command=lambda: self.user_deposit(acc_no)).pack(side="left", padx=6)
         ttk.Button(frame, text="Withdraw", command=lambda: self.user_withdraw(acc_no)).pack(side="left", padx=6)
         ttk.Button(frame, text="History", command=lambda: self.show_transactions(main, acc_no)).pack(side="left", padx=6)
 
     def user_deposit(self, acc_no):
-        amt = simpledialog.askfloat("Deposit","Amount:")
+        amt = ask_money("Deposit","Amount:")
         if amt is None: return
-        try:
-            services.deposit(acc_no, amt, performed_by=acc_no)
+        def done(_):
             messagebox.showinfo("Success", "Deposit complete")
             self.open_user_dashboard(acc_no)
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        self.worker.submit(services.deposit, acc_no, amt, performed_by=acc_no, on_done=done, on_error=self.show_error)
 
     def user_withdraw(self, acc_no):
-        amt = simpledialog.askfloat("Withdraw","Amount:")
+        amt = ask_money("Withdraw","Amount:")
         if amt is None: return
-        try:
-            services.withdraw(acc_no, amt, performed_by=acc_no)
+        def done(_):
             messagebox.showinfo("Success", "Withdraw complete")
             self.open_user_dashboard(acc_no)
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        self.worker.submit(services.withdraw, acc_no, amt, performed_by=acc_no, on_done=done, on_error=self.show_error)
 
-    def show_transactions(self, container, acc_no=None):
+    def show_transactions(self, container, acc_no):
         for w in container.winfo_children(): w.destroy()
         ttk.Label(container, text="Transactions", font=("Segoe UI", 14)).pack(anchor="w")
         cols = ("id","tx_type","from_acc","to_acc","amount","performed_by","timestamp")
-        tree = ttk.Treeview(container, columns=cols, show="headings")
-        for c in cols: tree.heading(c, text=c.title().replace("_"," "))
-        tree.pack(fill="both", expand=True)
-        for t in services.get_transactions(acc_no):
-            tree.insert("", "end", values=(t["id"], t["tx_type"], t.get("from_acc"), t.get("to_acc"), f"₱{t['amount']:.2f}", t.get("performed_by"), t["timestamp"]))
+        self.make_table(container, cols, lambda n, before: services.get_transactions(acc_no, n, before),
+                        lambda t: (t["id"], t["tx_type"], t.get("from_acc"), t.get("to_acc"), f"₱{t['amount']:.2f}", t.get("performed_by"), t["timestamp"]),
+                        changes=lambda mark: services.transactions_since(mark, acc_no))
         ttk.Button(container, text="Back", command=lambda: self.open_user_dashboard(acc_no)).pack(pady=6)
 
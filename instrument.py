@@ -0,0 +1,242 @@
+# backend/instrument.py
+# Opt-in instrumentation of the database access path.  enable() swaps the
+# pool's connections for ones whose cursors time every statement, and wraps
+# the public services functions; snapshot() reports counts, latency
+# percentiles and rows per SQL statement and per function.  Statements slower
+# than the threshold are written to the "backend.slowquery" logger.
+import functools
+import inspect
+import logging
+import re
+import sqlite3
+import threading
+import time
+
+from . import services
+from .db import pool
+
+slow_log = logging.getLogger("backend.slowquery")
+
+# latency histogram buckets: upper bounds in ms, doubling from 10 microseconds
+BUCKETS_MS = tuple(0.01 * 2 ** i for i in range(24))  # up to ~84 s
+
+_lock = threading.Lock()
+_statements = {}
+_functions = {}
+_wrapped = {}
+enabled = False
+slow_ms = 100.0
+
+
+class Stat:
+    __slots__ = ("count", "total_ms", "max_ms", "rows", "hist")
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.hist = [0] * (len(BUCKETS_MS) + 1)
+
+    def add(self, ms: float, rows: int = 0):
+        self.count += 1
+        self.total_ms += ms
+        self.rows += rows
+        if ms > self.max_ms:
+            self.max_ms = ms
+        i = 0
+        while i < len(BUCKETS_MS) and ms > BUCKETS_MS[i]:
+            i += 1
+        self.hist[i] += 1
+
+    def percentile(self, q: float) -> float:
+        # upper bound of the bucket holding the q-th sample (max for the overflow bucket)
+        target, seen = q * self.count, 0
+        for i, n in enumerate(self.hist):
+            seen += n
+            if n and seen >= target:
+                return min(BUCKETS_MS[i], self.max_ms) if i < len(BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def as_dict(self) -> dict:
+        return {"count": self.count, "total_ms": self.total_ms, "mean_ms": self.total_ms / self.count if self.count else 0.0,
+                "p50_ms": self.percentile(0.5), "p95_ms": self.percentile(0.95), "p99_ms": self.percentile(0.99),
+                "max_ms": self.max_ms, "rows": self.rows}
+
+
+def _record(table: dict, key: str, ms: float, rows: int = 0):
+    with _lock:
+        stat = table.get(key)
+        if stat is None:
+            stat = table[key] = Stat()
+        stat.add(ms, rows)
+
+
+_SPACES = re.compile(r"\s+")
+_IN_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+
+
+@functools.lru_cache(maxsize=1024)
+def normalize(sql: str) -> str:
+    # one key per statement shape: collapse whitespace and variable-length IN lists
+    return _IN_LIST.sub("?, ...", _SPACES.sub(" ", sql).strip())
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that attributes execute and fetch time, and rows read, to its statement.
+
+    A statement is recorded once it is finished with: when its rows run out,
+    the cursor is re-executed, closed or garbage collected.
+    """
+    _key = None
+
+    def _start(self, sql):
+        self._finish()
+        self._key, self._ns, self._rows = normalize(sql), 0, 0
+
+    def _finish(self):
+        key = self._key
+        if key is None:
+            return
+        self._key = None
+        ms = self._ns / 1e6
+        _record(_statements, key, ms, self._rows)
+        if ms >= slow_ms:
+            slow_log.warning("slow query %.1f ms, %d rows: %s", ms, self._rows, key)
+
+    def _timed(self, call, *args):
+        t0 = time.perf_counter_ns()
+        try:
+            return call(*args)
+        finally:
+            self._ns += time.perf_counter_ns() - t0
+
+    def execute(self, sql, params=()):
+        self._start(sql)
+        self._timed(super().execute, sql, params)
+        if self.description is None:  # no result set: done now
+            self._rows = max(self.rowcount, 0)
+            self._finish()
+        return self
+
+    def executemany(self, sql, seq):
+        self._start(sql)
+        self._timed(super().executemany, sql, seq)
+        self._rows = max(self.rowcount, 0)
+        self._finish()
+        return self
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if row is None:
+            self._finish()
+        elif self._key is not None:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(super().fetchmany, self.arraysize if size is None else size)
+        if self._key is not None:
+            self._rows += len(rows)
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        if self._key is not None:
+            self._rows += len(rows)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        try:
+            row = self._timed(super().__next__)
+        except StopIteration:
+            self._finish()
+            raise
+        if self._key is not None:
+            self._rows += 1
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        self._finish()
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    # Connection.execute would run the statement in C without going through
+    # the cursor's execute(), so route the shortcuts explicitly
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq):
+        return self.cursor().executemany(sql, seq)
+
+
+def timed(fn):
+    """Record the wall time of each call to ``fn`` under its qualified name."""
+    name = fn.__qualname__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        t0 = time.perf_counter_ns()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _record(_functions, name, (time.perf_counter_ns() - t0) / 1e6)
+    return wrapper
+
+
+def _public_functions(module):
+    return [(name, fn) for name, fn in inspect.getmembers(module, inspect.isfunction)
+            if fn.__module__ == module.__name__ and not name.startswith("_")]
+
+
+def enable(threshold_ms: float = None, modules=None):
+    """Start collecting.  Call at startup, before the first query: open pool
+    connections are closed so every thread reopens an instrumented one."""
+    global enabled, slow_ms
+    if threshold_ms is not None:
+        slow_ms = threshold_ms
+    if enabled:
+        return
+    for module in modules or (services,):
+        for name, fn in _public_functions(module):
+            _wrapped[(module, name)] = fn
+            setattr(module, name, timed(fn))
+    pool.factory = InstrumentedConnection
+    pool.close_all()
+    enabled = True
+
+
+def disable():
+    global enabled
+    if not enabled:
+        return
+    for (module, name), fn in _wrapped.items():
+        setattr(module, name, fn)
+    _wrapped.clear()
+    pool.factory = sqlite3.Connection
+    pool.close_all()
+    enabled = False
+
+
+def reset():
+    with _lock:
+        _statements.clear()
+        _functions.clear()
+
+
+def snapshot() -> dict:
+    """Per-function and per-statement stats, each sorted by total time spent."""
+    with _lock:
+        order = lambda table: sorted(({"name": k, **s.as_dict()} for k, s in table.items()),
+                                     key=lambda d: d["total_ms"], reverse=True)
+        return {"enabled": enabled, "slow_ms": slow_ms, "functions": order(_functions), "statements": order(_statements)}
@@ -0,0 +1,150 @@
+# loadgen.py
+# Load generator for server.py: keeps --connections keep-alive connections
+# busy for --seconds, each with up to --depth pipelined requests in flight,
+# and reports requests/sec and latency percentiles.  The mix is account
+# reads, statement pages and (--write-ratio of them) deposits and transfers.
+#   python loadgen.py --connections 16 --depth 4 --seconds 10
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+
+ACCOUNT_PREFIX = "LOAD"
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = []
+        self.statuses = Counter()
+
+    def percentile(self, q: float) -> float:
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000 if ordered else 0.0
+
+
+def _request(method: str, path: str, payload=None, token: str = None) -> bytes:
+    body = json.dumps(payload).encode() if payload is not None else b""
+    head = f"{method} {path} HTTP/1.1\r\nHost: loadgen\r\nContent-Length: {len(body)}\r\n"
+    if token:
+        head += f"Authorization: Bearer {token}\r\n"
+    return (head + "\r\n").encode() + body
+
+
+async def _read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head[9:12])
+    length = 0
+    for line in head.split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            length = int(value)
+    body = await reader.readexactly(length) if length else b""
+    return status, body
+
+
+async def call(host: str, port: int, method: str, path: str, payload=None, token: str = None):
+    # one request on its own connection (setup and checks, not the timed load)
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(_request(method, path, payload, token))
+        status, body = await _read_response(reader)
+        return status, json.loads(body) if body else None
+    finally:
+        writer.close()
+
+
+async def ensure_accounts(host: str, port: int, n: int, token: str = None):
+    # funded LOAD* accounts, reused across runs
+    accounts = [f"{ACCOUNT_PREFIX}{i:06d}" for i in range(n)]
+    for account_no in accounts:
+        status, body = await call(host, port, "GET", f"/accounts/{account_no}", token=token)
+        if status == 404:
+            status, body = await call(host, port, "POST", "/accounts", {"account_no": account_no, "name": "Load Test",
+                                                                        "password": "pw", "initial_deposit": 1_000_000},
+                                      token)
+        if status not in (200, 201):
+            raise SystemExit(f"setting up {account_no}: {status} {body}")
+    return accounts
+
+
+def request_mix(accounts, write_ratio: float, rnd: random.Random, token: str = None):
+    def next_request() -> bytes:
+        account = rnd.choice(accounts)
+        if rnd.random() < write_ratio:
+            if rnd.random() < 0.5:
+                return _request("POST", "/postings", {"tx_type": "deposit", "to_acc": account, "amount": "1.00",
+                                                      "performed_by": "loadgen"}, token)
+            return _request("POST", "/postings", {"tx_type": "transfer", "from_acc": account,
+                                                  "to_acc": rnd.choice(accounts), "amount": "0.01",
+                                                  "performed_by": "loadgen"}, token)
+        if rnd.random() < 0.5:
+            return _request("GET", f"/accounts/{account}", token=token)
+        return _request("GET", f"/accounts/{account}/transactions?limit=20", token=token)
+    return next_request
+
+
+async def connection(host: str, port: int, deadline: float, depth: int, next_request, stats: Stats):
+    reader, writer = await asyncio.open_connection(host, port)
+    slots = asyncio.Semaphore(depth)
+    sent = asyncio.Queue()
+
+    async def send():
+        while time.perf_counter() < deadline:
+            await slots.acquire()
+            sent.put_nowait(time.perf_counter())
+            writer.write(next_request())
+            await writer.drain()
+        sent.put_nowait(None)
+
+    async def receive():
+        while (started := await sent.get()) is not None:
+            status, _ = await _read_response(reader)
+            stats.latencies.append(time.perf_counter() - started)
+            stats.statuses[status] += 1
+            slots.release()
+
+    try:
+        await asyncio.gather(send(), receive())
+    finally:
+        writer.close()
+
+
+async def run(host: str, port: int, connections: int, depth: int, seconds: float, accounts: int,
+              write_ratio: float, token: str = None, seed: int = 7):
+    names = await ensure_accounts(host, port, accounts, token)
+    stats = Stats()
+    rnd = random.Random(seed)
+    start = time.perf_counter()
+    await asyncio.gather(*(connection(host, port, start + seconds, depth,
+                                      request_mix(names, write_ratio, random.Random(rnd.random()), token), stats)
+                           for _ in range(connections)))
+    elapsed = time.perf_counter() - start
+    total = len(stats.latencies)
+    errors = sum(n for status, n in stats.statuses.items() if status >= 400)
+    print(f"{total:,} requests in {elapsed:.1f}s: {total / elapsed:,.0f} req/s, {errors:,} errors "
+          f"({connections} connections x depth {depth}, {write_ratio:.0%} writes)")
+    print("latency ms  " + "  ".join(f"p{int(q * 100)} {stats.percentile(q):.2f}" for q in (0.5, 0.9, 0.99))
+          + f"  max {max(stats.latencies, default=0) * 1000:.2f}")
+    print("statuses    " + ", ".join(f"{s}: {n:,}" for s, n in sorted(stats.statuses.items())))
+    return {"rps": total / elapsed, "p50_ms": stats.percentile(0.5), "p99_ms": stats.percentile(0.99), "errors": errors}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="load generator for server.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--connections", type=int, default=16)
+    parser.add_argument("--depth", type=int, default=1, help="pipelined requests in flight per connection")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--accounts", type=int, default=100, help="accounts to spread the load over")
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--token")
+    args = parser.parse_args(argv)
+    asyncio.run(run(args.host, args.port, args.connections, args.depth, args.seconds, args.accounts,
+                    args.write_ratio, args.token))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# backend/money.py
+# Amounts as whole centavos.  Sums and comparisons are exact integer
+# arithmetic, in Python and in SQLite alike: columns declared MONEY (see
+# db.py) have integer storage and are read back as Money through the
+# converter registered on every pooled connection.
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+_CENT = Decimal("0.01")
+
+
+class Money:
+    """An exact amount of pesos, held as an int number of centavos.
+
+    Build one from a user-facing amount with ``Money.of`` (exact; more than
+    two decimal places is an error) or from a computed figure with
+    ``Money.round``.  Money adds, subtracts and compares only with Money;
+    ``format(m, ",.2f")`` formats the peso value.
+    """
+    __slots__ = ("cents",)
+
+    def __init__(self, cents: int = 0):
+        if not isinstance(cents, int):
+            raise TypeError(f"Money takes integer centavos, not {type(cents).__name__}")
+        self.cents = cents
+
+    @classmethod
+    def of(cls, value) -> "Money":
+        """Money for ``value`` pesos (Money, int, float, Decimal or numeric string)."""
+        if isinstance(value, Money):
+            return value
+        if isinstance(value, int) and not isinstance(value, bool):
+            return cls(value * 100)
+        try:
+            d = Decimal(repr(value) if isinstance(value, float) else str(value).replace(",", "").strip())
+        except InvalidOperation:
+            raise ValueError("Invalid amount") from None
+        if not d.is_finite() or d != d.quantize(_CENT, rounding=ROUND_HALF_UP):
+            raise ValueError("Invalid amount")
+        return cls(int(d.scaleb(2)))
+
+    @classmethod
+    def round(cls, value) -> "Money":
+        """Money for ``value`` pesos rounded half-up to the centavo."""
+        d = value if isinstance(value, Decimal) else Decimal(repr(float(value)))
+        return cls(int(d.quantize(_CENT, rounding=ROUND_HALF_UP).scaleb(2)))
+
+    def to_decimal(self) -> Decimal:
+        return Decimal(self.cents).scaleb(-2)
+
+    def __float__(self):
+        return self.cents / 100
+
+    def __add__(self, other):
+        if isinstance(other, Money):
+            return Money(self.cents + other.cents)
+        return NotImplemented
+
+    def __radd__(self, other):
+        # lets sum() start from 0
+        if other == 0 and isinstance(other, int):
+            return self
+        return NotImplemented
+
+    def __sub__(self, other):
+        if isinstance(other, Money):
+            return Money(self.cents - other.cents)
+        return NotImplemented
+
+    def __mul__(self, n):
+        if isinstance(n, int):
+            return Money(self.cents * n)
+        return NotImplemented
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return Money(-self.cents)
+
+    def __abs__(self):
+        return Money(abs(self.cents))
+
+    def __bool__(self):
+        return self.cents != 0
+
+    def __eq__(self, other):
+        return isinstance(other, Money) and self.cents == other.cents
+
+    def __hash__(self):
+        return hash(self.cents)
+
+    def __lt__(self, other):
+        if isinstance(other, Money):
+            return self.cents < other.cents
+        return NotImplemented
+
+    def __le__(self, other):
+        if isinstance(other, Money):
+            return self.cents <= other.cents
+        return NotImplemented
+
+    def __gt__(self, other):
+        if isinstance(other, Money):
+            return self.cents > other.cents
+        return NotImplemented
+
+    def __ge__(self, other):
+        if isinstance(other, Money):
+            return self.cents >= other.cents
+        return NotImplemented
+
+    def __str__(self):
+        c = self.cents
+        return f"{c // 100}.{c % 100:02d}" if c >= 0 else f"-{-c // 100}.{-c % 100:02d}"
+
+    def __repr__(self):
+        return f"Money('{self}')"
+
+    def __format__(self, spec):
+        return format(self.to_decimal(), spec) if spec else str(self)
+
+    def __reduce__(self):
+        return Money, (self.cents,)
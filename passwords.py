@@ -0,0 +1,177 @@
+# backend/passwords.py
+# Salted, tunable password hashing.  Hashes are stored self-describing
+# ("scheme$params$salt$hash") so cost settings can be raised later and old
+# hashes upgraded on the next successful login.
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode().rstrip("=")
+
+
+def _unb64(text: str) -> bytes:
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+class ScryptHasher:
+    """scrypt (memory-hard); memory per hash is about 128 * n * r bytes."""
+    scheme = "scrypt"
+
+    def __init__(self, n: int = 2 ** 14, r: int = 8, p: int = 1, salt_len: int = 16):
+        self.n, self.r, self.p, self.salt_len = n, r, p, salt_len
+
+    def _derive(self, password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, dklen=32,
+                              maxmem=128 * n * r * (p + 1) + (1 << 20))
+
+    def hash(self, password: str) -> str:
+        salt = secrets.token_bytes(self.salt_len)
+        dk = self._derive(password, salt, self.n, self.r, self.p)
+        return f"scrypt${self.n}${self.r}${self.p}${_b64(salt)}${_b64(dk)}"
+
+    def verify(self, password: str, encoded: str) -> bool:
+        _, n, r, p, salt, dk = encoded.split("$")
+        return hmac.compare_digest(self._derive(password, _unb64(salt), int(n), int(r), int(p)), _unb64(dk))
+
+    def needs_rehash(self, encoded: str) -> bool:
+        return encoded.split("$")[1:4] != [str(self.n), str(self.r), str(self.p)]
+
+
+class Pbkdf2Hasher:
+    """PBKDF2-HMAC-SHA256, for Python builds whose OpenSSL lacks scrypt."""
+    scheme = "pbkdf2_sha256"
+
+    def __init__(self, iterations: int = 600_000, salt_len: int = 16):
+        self.iterations, self.salt_len = iterations, salt_len
+
+    def hash(self, password: str) -> str:
+        salt = secrets.token_bytes(self.salt_len)
+        dk = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, self.iterations)
+        return f"pbkdf2_sha256${self.iterations}${_b64(salt)}${_b64(dk)}"
+
+    def verify(self, password: str, encoded: str) -> bool:
+        _, iterations, salt, dk = encoded.split("$")
+        return hmac.compare_digest(hashlib.pbkdf2_hmac("sha256", password.encode(), _unb64(salt), int(iterations)), _unb64(dk))
+
+    def needs_rehash(self, encoded: str) -> bool:
+        return encoded.split("$")[1] != str(self.iterations)
+
+
+class LegacySha256:
+    """Verifier for the unsalted hex SHA-256 hashes written by older releases."""
+    scheme = "sha256"
+
+    def verify(self, password: str, encoded: str) -> bool:
+        return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), encoded)
+
+    def needs_rehash(self, encoded: str) -> bool:
+        return True
+
+
+_VERIFIERS = {"scrypt": ScryptHasher(), "pbkdf2_sha256": Pbkdf2Hasher(), "sha256": LegacySha256()}
+_hasher = _VERIFIERS["scrypt"] if hasattr(hashlib, "scrypt") else _VERIFIERS["pbkdf2_sha256"]
+
+
+def set_hasher(hasher):
+    """Use ``hasher`` for new hashes; stored hashes with other settings get rehashed on login."""
+    global _hasher
+    _hasher = hasher
+    _VERIFIERS[hasher.scheme] = hasher
+    cache.clear()
+
+
+def get_hasher():
+    return _hasher
+
+
+def _scheme(encoded: str) -> str:
+    return encoded.split("$", 1)[0] if "$" in encoded else "sha256"
+
+
+def hash_password(password: str) -> str:
+    return _hasher.hash(password)
+
+
+def needs_rehash(encoded: str) -> bool:
+    return _scheme(encoded) != _hasher.scheme or _hasher.needs_rehash(encoded)
+
+
+class VerifiedCache:
+    """Short-lived memo of successful verifications.
+
+    Keyed by the stored hash, it holds an HMAC of the password under a key
+    that only lives in this process, so a repeat login within ``ttl`` costs
+    one HMAC instead of a full KDF run.  Changing a password changes the
+    stored hash and so misses the cache.
+    """
+
+    def __init__(self, ttl: float = 300.0, maxsize: int = 1024):
+        self.ttl, self.maxsize = ttl, maxsize
+        self._key = secrets.token_bytes(32)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _tag(self, password: str, encoded: str) -> bytes:
+        return hmac.new(self._key, encoded.encode() + b"\0" + password.encode(), "sha256").digest()
+
+    def check(self, password: str, encoded: str) -> bool:
+        with self._lock:
+            hit = self._entries.get(encoded)
+            if hit is None:
+                return False
+            tag, expires = hit
+            if expires < time.monotonic():
+                del self._entries[encoded]
+                return False
+        return hmac.compare_digest(tag, self._tag(password, encoded))
+
+    def add(self, password: str, encoded: str):
+        tag = self._tag(password, encoded)
+        with self._lock:
+            self._entries[encoded] = (tag, time.monotonic() + self.ttl)
+            self._entries.move_to_end(encoded)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+cache = VerifiedCache()
+
+# KDFs release the GIL, so a few threads verify in parallel; bounding the pool
+# also bounds scrypt's per-hash memory during a login burst
+_executor = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1), thread_name_prefix="pwhash")
+
+
+def _verify(password: str, encoded: str) -> bool:
+    if not encoded:
+        return False
+    if cache.check(password, encoded):
+        return True
+    verifier = _VERIFIERS.get(_scheme(encoded))
+    try:
+        ok = verifier is not None and verifier.verify(password, encoded)
+    except (ValueError, TypeError):  # malformed stored hash
+        return False
+    if ok:
+        cache.add(password, encoded)
+    return ok
+
+
+def verify_async(password: str, encoded: str):
+    """Future resolving to whether ``password`` matches ``encoded``."""
+    return _executor.submit(_verify, password, encoded)
+
+
+def verify_password(password: str, encoded: str) -> bool:
+    return verify_async(password, encoded).result()
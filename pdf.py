@@ -0,0 +1,133 @@
+# backend/pdf.py
+# Paginated table rendering for PDF exports.  A small built-in writer streams
+# each page to disk as soon as it is full; reportlab, when installed, is used
+# only for documents known to be small, since its canvas keeps every finished
+# page in memory until save().
+import zlib
+
+try:
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.pdfgen import canvas as rl_canvas
+except ImportError:  # optional dependency
+    rl_canvas = None
+
+PAGE_W, PAGE_H = 842, 595  # A4 landscape, in points
+MARGIN = 36
+FONT_SIZE = 8
+LEADING = 10
+LINES_PER_PAGE = (PAGE_H - 2 * MARGIN) // LEADING
+ROWS_PER_PAGE = LINES_PER_PAGE - 4  # below the title, blank line, header and rule
+REPORTLAB_MAX_PAGES = 200
+
+
+def _escape(text: str) -> bytes:
+    # core fonts only cover Latin-1; anything else becomes "?"
+    data = text.encode("latin-1", errors="replace")
+    return data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+class MinimalPdfWriter:
+    """Dependency-free PDF writer that writes pages out as they are added.
+
+    Only byte offsets and page object numbers are kept in memory; the page
+    tree and cross-reference table are written by ``close()``.
+    """
+
+    def __init__(self, path: str):
+        self._f = open(path, "wb")
+        self._offsets = {}
+        self._pages = []
+        self._next_id = 4  # 1 catalog, 2 page tree, 3 font
+        self._f.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._obj(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        self._obj(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>")
+
+    def _obj(self, num: int, body: bytes):
+        self._offsets[num] = self._f.tell()
+        self._f.write(b"%d 0 obj\n" % num + body + b"\nendobj\n")
+
+    def add_page(self, lines):
+        ops = [b"BT /F1 %d Tf %d TL %d %d Td" % (FONT_SIZE, LEADING, MARGIN, PAGE_H - MARGIN)]
+        ops.extend(b"(" + _escape(line) + b") '" for line in lines)
+        ops.append(b"ET")
+        data = zlib.compress(b"\n".join(ops))
+        content, page = self._next_id, self._next_id + 1
+        self._next_id += 2
+        self._obj(content, b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(data) + data + b"\nendstream")
+        self._obj(page, b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] "
+                        b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (PAGE_W, PAGE_H, content))
+        self._pages.append(page)
+
+    def close(self):
+        kids = b" ".join(b"%d 0 R" % p for p in self._pages)
+        self._obj(2, b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(self._pages))
+        xref = self._f.tell()
+        size = self._next_id
+        self._f.write(b"xref\n0 %d\n0000000000 65535 f \n" % size)
+        for num in range(1, size):
+            self._f.write(b"%010d 00000 n \n" % self._offsets[num])
+        self._f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, xref))
+        self._f.close()
+
+    def abort(self):
+        self._f.close()
+
+
+class ReportlabWriter:
+    """Same interface as MinimalPdfWriter, drawing with reportlab.
+
+    Not incremental: the canvas holds every page until ``close()``.
+    """
+
+    def __init__(self, path: str):
+        self._c = rl_canvas.Canvas(path, pagesize=landscape(A4), pageCompression=1)
+
+    def add_page(self, lines):
+        text = self._c.beginText(MARGIN, PAGE_H - MARGIN)
+        text.setFont("Courier", FONT_SIZE, LEADING)
+        for line in lines:
+            text.textLine(line)
+        self._c.drawText(text)
+        self._c.showPage()
+
+    def close(self):
+        self._c.save()
+
+    def abort(self):
+        pass
+
+
+def open_writer(path: str, rows: int = None):
+    """reportlab when ``rows`` is known to fit in REPORTLAB_MAX_PAGES pages,
+    otherwise (or without reportlab) the streaming MinimalPdfWriter."""
+    if rl_canvas is not None and rows is not None and rows <= REPORTLAB_MAX_PAGES * ROWS_PER_PAGE:
+        return ReportlabWriter(path)
+    return MinimalPdfWriter(path)
+
+
+def render_table(writer, title: str, columns, widths, rows, on_page=None):
+    """Lay ``rows`` out as fixed-width text, one PDF page per LINES_PER_PAGE.
+
+    ``rows`` may be any iterable of tuples (typically a cursor-backed
+    generator) and values are rendered with ``str()``; only one page of lines
+    is held at a time.  ``on_page(rows_done)`` is called after each page is
+    emitted.  Returns the number of rows rendered.
+    """
+    template = "  ".join(f"%-{w}.{w}s" for w in widths)
+    fmt = lambda values: template % tuple(values)
+    rule = "-" * (sum(widths) + 2 * (len(widths) - 1))
+    lines, n, page_no = [], 0, 0
+    for row in rows:
+        if not lines:
+            page_no += 1
+            lines = [f"{title}  (page {page_no})", "", fmt(columns), rule]
+        lines.append(fmt(row))
+        n += 1
+        if len(lines) >= LINES_PER_PAGE:
+            writer.add_page(lines)
+            lines = []
+            if on_page: on_page(n)
+    if lines or n == 0:
+        writer.add_page(lines or [title, "", fmt(columns), rule, "(no rows)"])
+        if on_page: on_page(n)
+    return n
@@ -0,0 +1,110 @@
+# backend/reports.py
+# Reporting API over the rollup tables that db.py keeps current as
+# transactions are recorded.  Queries here never touch the transactions table.
+# Summed amounts are aliased "name [MONEY]" so they come back as Money.
+#   python -m backend.reports backfill
+import argparse
+import time
+
+from . import archive
+from .db import initialize, pool, rollup_transactions
+from .services import recompute_loan_balances
+
+BACKFILL_CHUNK = 50_000
+
+
+def _between(column: str, start, end):
+    clauses, params = [], []
+    if start is not None:
+        clauses.append(f"{column} >= ?"); params.append(str(start))
+    if end is not None:
+        clauses.append(f"{column} < ?"); params.append(str(end))
+    return clauses, params
+
+
+def daily_volume(start: str = None, end: str = None, tx_type: str = None):
+    """Count and volume per day and tx_type for ``start <= day < end`` (YYYY-MM-DD)."""
+    clauses, params = _between("day", start, end)
+    if tx_type:
+        clauses.append("tx_type = ?"); params.append(tx_type)
+    where = " WHERE " + " AND ".join(clauses) if clauses else ""
+    cur = pool.get().execute(f"SELECT day, tx_type, tx_count, volume FROM rollup_daily{where} ORDER BY day, tx_type", params)
+    return [dict(r) for r in cur.fetchall()]
+
+
+def monthly_volume(start: str = None, end: str = None, tx_type: str = None):
+    """Count and volume per month (YYYY-MM) and tx_type, summed from the daily rollup."""
+    clauses, params = _between("day", start and f"{start}-01", end and f"{end}-01")
+    if tx_type:
+        clauses.append("tx_type = ?"); params.append(tx_type)
+    where = " WHERE " + " AND ".join(clauses) if clauses else ""
+    cur = pool.get().execute(f'SELECT substr(day, 1, 7) AS month, tx_type, SUM(tx_count) AS tx_count, SUM(volume) AS "volume [MONEY]" '
+                             f"FROM rollup_daily{where} GROUP BY 1, 2 ORDER BY 1, 2", params)
+    return [dict(r) for r in cur.fetchall()]
+
+
+def account_monthly(account_no: str, start: str = None, end: str = None):
+    """Inflow, outflow and net flow per month for one account (months as YYYY-MM)."""
+    clauses, params = _between("month", start, end)
+    where = "".join(f" AND {c}" for c in clauses)
+    cur = pool.get().execute(
+        'SELECT month, SUM(inflow) AS "inflow [MONEY]", SUM(outflow) AS "outflow [MONEY]", SUM(inflow) - SUM(outflow) AS "net [MONEY]", '
+        f"SUM(tx_count) AS tx_count FROM rollup_account_monthly WHERE account_no = ?{where} GROUP BY month ORDER BY month",
+        [account_no] + params)
+    return [dict(r) for r in cur.fetchall()]
+
+
+def top_accounts(month: str, limit: int = 20):
+    """Accounts with the largest absolute net flow in ``month``."""
+    cur = pool.get().execute(
+        'SELECT account_no, SUM(inflow) AS "inflow [MONEY]", SUM(outflow) AS "outflow [MONEY]", SUM(inflow) - SUM(outflow) AS "net [MONEY]" '
+        "FROM rollup_account_monthly WHERE month = ? GROUP BY account_no ORDER BY abs(SUM(inflow) - SUM(outflow)) DESC LIMIT ?",
+        (month, limit))
+    return [dict(r) for r in cur.fetchall()]
+
+
+def backfill(chunk: int = BACKFILL_CHUNK, progress=None):
+    """Rebuild the rollups from the existing ledger in chunked transactions.
+
+    The rollups are cleared, the archived transactions folded back in (see
+    archive.fold_rollups) and the current max id recorded in one
+    transaction; rows posted afterwards are counted by the insert trigger, so
+    only ids up to that boundary are replayed here.  Returns the id span
+    replayed.
+    """
+    conn = pool.get()
+    with pool.transaction(immediate=True):
+        conn.execute("DELETE FROM rollup_daily")
+        conn.execute("DELETE FROM rollup_account_monthly")
+        archive.fold_rollups(conn)
+        lo, hi = conn.execute("SELECT COALESCE(MIN(id), 1), COALESCE(MAX(id), 0) FROM transactions").fetchone()
+    done = 0
+    for first in range(lo, hi + 1, chunk):
+        last = min(first + chunk - 1, hi)
+        with pool.transaction(immediate=True):
+            rollup_transactions(conn, first, last)
+        done = last - lo + 1
+        if progress: progress(done, hi - lo + 1)
+    return done
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="reporting rollups")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("backfill", help="rebuild rollup tables from the transactions table and its archives")
+    p.add_argument("--chunk", type=int, default=BACKFILL_CHUNK)
+    p = sub.add_parser("loan-balances", help="recompute the amortization snapshot of every disbursed loan")
+    p.add_argument("--as-of", help="YYYY-MM-DD (default: today)")
+    args = parser.parse_args(argv)
+    initialize()
+    if args.cmd == "backfill":
+        n = backfill(args.chunk, progress=lambda done, total: print(f"\r{done:,}/{total:,} ids", end="", flush=True))
+        print(f"\nreplayed {n:,} ids")
+    elif args.cmd == "loan-balances":
+        started = time.perf_counter()
+        n = recompute_loan_balances(args.as_of)
+        print(f"{n:,} loans in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,410 @@
+# server.py
+# Local HTTP/1.1 JSON API over backend.services, for kiosks and batch jobs
+# that should not open the database themselves.  One asyncio loop parses
+# requests (keep-alive; pipelined requests are read ahead but run one at a
+# time in order, so each sees the writes sent before it on its connection);
+# blocking reads run on a bounded thread pool and writes go through the
+# single-writer queue (backend/writequeue.py), so concurrent postings from
+# different connections share group commits.
+#   python server.py --port 8080 [--shared] [--token SECRET]
+import argparse
+import asyncio
+import hmac
+import json
+import logging
+import math
+import os
+import re
+import signal
+import sqlite3
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from pathlib import Path
+
+from backend import db, services
+from backend.money import Money
+from backend.writequeue import writer
+
+log = logging.getLogger("server")
+
+MAX_HEADER = 16 * 1024
+MAX_BODY = 1 << 20
+PIPELINE_DEPTH = 32      # requests read ahead on one connection while earlier ones run
+KEEPALIVE_TIMEOUT = 15   # seconds an idle connection stays open
+PAGE_LIMIT = 200
+PAGE_LIMIT_MAX = 1000
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str = None):
+        super().__init__(message or HTTPStatus(status).phrase)
+        self.status = status
+
+
+class Request:
+    __slots__ = ("method", "path", "query", "headers", "body", "keep_alive")
+
+    def __init__(self, method, path, query, headers, body, keep_alive):
+        self.method, self.path, self.query = method, path, query
+        self.headers, self.body, self.keep_alive = headers, body, keep_alive
+
+
+# ---------------- Routes ----------------
+# (method, compiled path, handler, how it runs, success status).  Handlers are
+# plain blocking functions taking (path params, query, JSON body); "read" ones
+# run on the thread pool, "write" ones on the writer queue.  A pool handler may
+# queue its own writer units when one unit would be too big (see post).
+ROUTES = []
+
+
+def route(method: str, pattern: str, runs: str = "read", status: int = 200):
+    def register(fn):
+        ROUTES.append((method, re.compile(pattern + "$"), fn, runs, status))
+        return fn
+    return register
+
+
+def _limit(query) -> int:
+    try:
+        limit = int(query.get("limit", PAGE_LIMIT))
+    except ValueError:
+        raise HttpError(400, "limit must be an integer") from None
+    return max(1, min(limit, PAGE_LIMIT_MAX))
+
+
+def _before(query, int_id: bool = True):
+    # keyset cursors travel as "<timestamp>,<id>", the "next" of the previous page
+    raw = query.get("before")
+    if not raw:
+        return None
+    ts, sep, key = raw.rpartition(",")
+    if not sep:
+        raise HttpError(400, "before must be '<timestamp>,<id>'")
+    try:
+        return ts, int(key) if int_id else key
+    except ValueError:
+        raise HttpError(400, "before must be '<timestamp>,<id>'") from None
+
+
+def _page(rows, key=services.LEDGER_KEY):
+    cursor = services.page_cursor(rows, key)
+    return {"items": rows, "next": None if cursor is None else ",".join(map(str, cursor))}
+
+
+def _actor(body) -> str:
+    return str(body.get("performed_by") or "api")
+
+
+def _public(account):
+    if account is None:
+        raise HttpError(404, "Account not found")
+    account.pop("password_hash", None)
+    return account
+
+
+@route("GET", r"/health")
+def health(params, query, body):
+    return {"ok": True, "schema": db.schema_version(db.pool.get())}
+
+
+@route("GET", r"/stats")
+def stats(params, query, body):
+    return services.dashboard_stats()
+
+
+@route("GET", r"/accounts")
+def list_accounts(params, query, body):
+    rows = services.list_accounts(_limit(query), _before(query, int_id=False))
+    return _page(rows, services.ACCOUNT_KEY)
+
+
+@route("POST", r"/accounts", status=201)
+def create_account(params, query, body):
+    # not on the writer queue: create_account hashes the password first
+    for field in ("account_no", "name", "password"):
+        if not body.get(field):
+            raise HttpError(400, f"{field} is required")
+    services.create_account(body["account_no"], body["name"], body["password"], body.get("initial_deposit") or 0)
+    return _public(services.get_account(body["account_no"]))
+
+
+@route("GET", r"/accounts/(?P<account_no>[^/]+)")
+def get_account(params, query, body):
+    return _public(services.get_account(params["account_no"]))
+
+
+@route("GET", r"/accounts/(?P<account_no>[^/]+)/transactions")
+def account_transactions(params, query, body):
+    return _page(services.get_transactions(params["account_no"], _limit(query), _before(query),
+                                           query.get("start"), query.get("end")))
+
+
+@route("GET", r"/accounts/(?P<account_no>[^/]+)/alerts")
+def account_alerts(params, query, body):
+    return _page(services.list_alerts(params["account_no"], _limit(query), _before(query)))
+
+
+@route("GET", r"/transactions")
+def transactions(params, query, body):
+    return _page(services.get_transactions(None, _limit(query), _before(query), query.get("start"), query.get("end")))
+
+
+@route("POST", r"/postings", status=201)
+def post(params, query, body):
+    """One posting ({tx_type, from_acc, to_acc, amount}) or {"postings": [...]}
+    through post_batch, which reports each row's outcome.
+
+    Runs on the thread pool and queues its own writer units: one per posting,
+    or one per post_batch chunk, so a large batch never holds the write lock
+    for longer than a chunk."""
+    if "postings" in body:
+        if not isinstance(body["postings"], list):
+            raise HttpError(400, "postings must be a list")
+        return {"results": services.post_batch(body["postings"], _actor(body), run=writer.call)}
+    tx_type, amount = body.get("tx_type"), body.get("amount")
+    if tx_type == "deposit":
+        tx_id = writer.call(services.deposit, body.get("to_acc"), amount, _actor(body))
+    elif tx_type == "withdraw":
+        tx_id = writer.call(services.withdraw, body.get("from_acc"), amount, _actor(body))
+    elif tx_type == "transfer":
+        tx_id = writer.call(services.transfer, body.get("from_acc"), body.get("to_acc"), amount, _actor(body))
+    else:
+        raise HttpError(400, f"Unknown tx_type: {tx_type}")
+    return {"tx_id": tx_id}
+
+
+@route("GET", r"/alerts")
+def alerts(params, query, body):
+    return _page(services.list_alerts(None, _limit(query), _before(query)))
+
+
+@route("GET", r"/loans")
+def list_loans(params, query, body):
+    rows = services.list_loans(query.get("status"), _limit(query), _before(query))
+    return _page(rows, services.LOAN_KEY)
+
+
+@route("POST", r"/loans", runs="write", status=201)
+def request_loan(params, query, body):
+    try:
+        term = int(body["term_months"])
+        rate = float(body.get("annual_rate", services.DEFAULT_LOAN_RATE))
+        account_no, amount = body["account_no"], body["amount"]
+    except KeyError as e:
+        raise HttpError(400, f"{e.args[0]} is required") from None
+    except (TypeError, ValueError):
+        raise HttpError(400, "term_months and annual_rate must be numbers") from None
+    if not math.isfinite(rate) or rate < 0:
+        raise HttpError(400, "annual_rate must be a finite, non-negative number")
+    if not services.get_account(account_no):
+        raise HttpError(404, "Account not found")
+    return services.get_loan(services.request_loan(account_no, amount, term, rate))
+
+
+@route("GET", r"/loans/(?P<loan_id>\d+)")
+def get_loan(params, query, body):
+    loan = services.get_loan(int(params["loan_id"]))
+    if loan is None:
+        raise HttpError(404, "Loan not found")
+    loan["balance"] = services.loan_balance(loan["id"])
+    return loan
+
+
+@route("GET", r"/loans/(?P<loan_id>\d+)/schedule")
+def loan_schedule(params, query, body):
+    return services.loan_schedule(int(params["loan_id"]))
+
+
+@route("POST", r"/loans/(?P<loan_id>\d+)/status", runs="write")
+def loan_status(params, query, body):
+    if not body.get("status"):
+        raise HttpError(400, "status is required")
+    return services.update_loan_status(int(params["loan_id"]), body["status"], _actor(body))
+
+
+@route("GET", r"/audit")
+def audit(params, query, body):
+    return _page(services.list_audit(_limit(query), _before(query), query.get("start"), query.get("end")))
+
+
+# ---------------- HTTP ----------------
+def _json_default(o):
+    if isinstance(o, Money):
+        return str(o)  # exact; clients parse it as a decimal
+    raise TypeError(f"{type(o).__name__} is not JSON serializable")
+
+
+def _response(status: int, payload, keep_alive: bool) -> bytes:
+    body = json.dumps(payload, default=_json_default, separators=(",", ":")).encode()
+    head = (f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode("latin-1") + body
+
+
+class Server:
+    """Serves ROUTES.  At most ``max_pending`` blocking calls are queued or
+    running at once; beyond that, request handling waits (and, through the
+    pipeline bound, so does reading from the socket)."""
+
+    def __init__(self, workers: int = 8, max_pending: int = None, token: str = None):
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="api")
+        self.slots = asyncio.Semaphore(max_pending or workers * 4)
+        self.token = token
+
+    async def _read_request(self, reader):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError as e:
+            if e.partial.strip():
+                raise HttpError(400, "Incomplete request") from None
+            return None  # client closed between requests
+        except asyncio.LimitOverrunError:
+            raise HttpError(431) from None
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ")
+            headers = {k.strip().lower(): v.strip() for k, v in (line.split(":", 1) for line in lines[1:] if line)}
+        except ValueError:
+            raise HttpError(400, "Malformed request") from None
+        if "transfer-encoding" in headers:
+            raise HttpError(501, "Chunked request bodies are not supported")
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise HttpError(400, "Bad Content-Length") from None
+        if length > MAX_BODY:
+            raise HttpError(413)
+        body = await reader.readexactly(length) if length else b""
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+        url = urllib.parse.urlsplit(target)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        return Request(method, urllib.parse.unquote(url.path).rstrip("/") or "/", query, headers, body, keep_alive)
+
+    def _match(self, method: str, path: str):
+        allowed = False
+        for m, pattern, fn, runs, status in ROUTES:
+            match = pattern.match(path)
+            if match:
+                if m == method:
+                    return fn, runs, status, match.groupdict()
+                allowed = True
+        raise HttpError(405 if allowed else 404)
+
+    async def _call(self, fn, runs: str, args):
+        async with self.slots:
+            if runs == "write":
+                return await asyncio.wrap_future(writer.submit(fn, *args))
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def _respond(self, request: Request) -> bytes:
+        # never raises: every outcome becomes a response
+        try:
+            if self.token and not hmac.compare_digest(request.headers.get("authorization", ""), f"Bearer {self.token}"):
+                raise HttpError(401)
+            fn, runs, status, params = self._match(request.method, request.path)
+            try:
+                body = json.loads(request.body) if request.body else {}
+            except (UnicodeDecodeError, json.JSONDecodeError):
+                raise HttpError(400, "Body is not valid JSON") from None
+            if not isinstance(body, dict):
+                raise HttpError(400, "Body must be a JSON object")
+            payload = await self._call(fn, runs, (params, request.query, body))
+        except HttpError as e:
+            status, payload = e.status, {"error": str(e)}
+        except ValueError as e:
+            # services validation errors
+            status, payload = (404 if str(e).endswith("not found") else 400), {"error": str(e)}
+        except sqlite3.OperationalError as e:
+            if not db._busy(e):
+                log.exception("%s %s failed", request.method, request.path)
+            status, payload = (503, {"error": "Database busy, retry"}) if db._busy(e) else (500, {"error": "Internal error"})
+        except Exception:
+            log.exception("%s %s failed", request.method, request.path)
+            status, payload = 500, {"error": "Internal error"}
+        return _response(status, payload, request.keep_alive)
+
+    async def _send(self, responses: asyncio.Queue, stream):
+        # runs the connection's requests one at a time in arrival order and
+        # writes their responses; keeps draining the queue after the client
+        # goes away so the reader never blocks on a full pipeline
+        broken = False
+        while (answer := await responses.get()) is not None:
+            data = await answer
+            if broken:
+                continue
+            try:
+                stream.write(data)
+                await stream.drain()
+            except ConnectionError:
+                broken = True
+
+    async def handle(self, reader, stream):
+        responses = asyncio.Queue(PIPELINE_DEPTH)
+        sender = asyncio.create_task(self._send(responses, stream))
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), KEEPALIVE_TIMEOUT)
+                except HttpError as e:
+                    # malformed input: answer and hang up, the stream is out of sync
+                    answer = asyncio.get_running_loop().create_future()
+                    answer.set_result(_response(e.status, {"error": str(e)}, False))
+                    await responses.put(answer)
+                    break
+                if request is None:
+                    break
+                # queued unstarted: _send awaits it once the previous request is done
+                await responses.put(self._respond(request))
+                if not request.keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            await responses.put(None)
+            await sender
+            stream.close()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        writer.close()
+
+
+async def serve(host: str, port: int, workers: int, token: str = None):
+    server = Server(workers, token=token)
+    listener = await asyncio.start_server(server.handle, host, port, limit=MAX_HEADER)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    log.warning("serving on %s", ", ".join(str(s.getsockname()) for s in listener.sockets))
+    async with listener:
+        await stop.wait()
+    server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="JSON API over the bank services")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=8, help="threads for blocking reads")
+    parser.add_argument("--db", help="database file (default: bank_system.db)")
+    parser.add_argument("--shared", action="store_true", help="WAL mode for other stations on the same file")
+    parser.add_argument("--token", default=os.environ.get("BANK_API_TOKEN"),
+                        help="require 'Authorization: Bearer <token>' (default: $BANK_API_TOKEN)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    if args.db:
+        db.DB_PATH = Path(args.db).resolve()
+        db.pool.close_all(db.DB_PATH)
+    if args.shared or os.environ.get("BANK_SHARED"):
+        db.enable_shared_mode()
+    db.initialize()
+    services.rebuild_detection()
+    asyncio.run(serve(args.host, args.port, args.workers, args.token))
+
+
+if __name__ == "__main__":
+    main()
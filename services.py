@@ -1,197 +1,757 @@
 # backend/services.py
-import hashlib
 import datetime
-from .db import connect
+from .db import connect, pool
+from . import amortization, archive, detection, passwords, pdf
+from .auditlog import INSERT_AUDIT, sink as audit_sink
+from .cache import LRUCache
+from .money import Money
 import csv
+import functools
+import gzip
+import math
+import time
+from collections import defaultdict
+from itertools import repeat
 from pathlib import Path
 
 ROOT = Path(__file__).resolve().parent.parent
 
 def hash_pw(password: str) -> str:
-    return hashlib.sha256(password.encode()).hexdigest()
+    return passwords.hash_password(password)
 
 def now_ts() -> str:
     return datetime.datetime.utcnow().isoformat()
 
 # ---------------- Admin ----------------
-def validate_admin(username: str, password: str) -> bool:
-    conn = connect()
-    cur = conn.cursor()
-    cur.execute("SELECT password_hash FROM admins WHERE username=?", (username,))
-    row = cur.fetchone()
-    conn.close()
-    if not row:
+def _check_password(table: str, key_col: str, key: str, password: str) -> bool:
+    row = pool.get().execute(f"SELECT password_hash FROM {table} WHERE {key_col}=?", (key,)).fetchone()
+    if not row or not passwords.verify_password(password, row["password_hash"]):
         return False
-    return hash_pw(password) == row["password_hash"]
+    if passwords.needs_rehash(row["password_hash"]):
+        # upgrade legacy/weaker hashes now that we have the plaintext; the KDF
+        # runs before the write lock is taken, and the WHERE guards against a
+        # password change made while we were hashing
+        new_hash = hash_pw(password)
+        with pool.transaction(immediate=True) as conn:
+            conn.execute(f"UPDATE {table} SET password_hash=? WHERE {key_col}=? AND password_hash=?",
+                         (new_hash, key, row["password_hash"]))
+            if table == "accounts":
+                _account_changed(key)
+    return True
+
+def validate_admin(username: str, password: str) -> bool:
+    return _check_password("admins", "username", username, password)
 
 # ---------------- Accounts / Users ----------------
-def create_account(account_no: str, name: str, password: str, initial_deposit: float = 0.0):
-    conn = connect()
-    cur = conn.cursor()
-    cur.execute("SELECT account_no FROM accounts WHERE account_no=?", (account_no,))
-    if cur.fetchone():
-        conn.close()
-        raise ValueError("Account number already exists")
-    cur.execute(
-        "INSERT INTO accounts (account_no, name, password_hash, balance, created_at) VALUES (?, ?, ?, ?, ?)",
-        (account_no, name, hash_pw(password), float(initial_deposit), now_ts())
-    )
-    conn.commit()
-    conn.close()
-    audit("system", "create_account", account_no)
+# get_account() rows, read through; every write to an account row must call
+# _account_changed() so the entry is dropped once the write commits; in shared
+# mode (db.enable_shared_mode) other stations' commits clear it wholesale
+account_cache = LRUCache(4096)
+
+def _account_changed(*account_nos):
+    pool.after_commit(lambda: account_cache.invalidate(*account_nos))
+
+def account_cache_stats():
+    return account_cache.stats()
+
+def create_account(account_no: str, name: str, password: str, initial_deposit=0):
+    initial_deposit = Money.of(initial_deposit)
+    pw_hash = hash_pw(password)  # the KDF is slow; keep it outside the write transaction
+    with pool.transaction(immediate=True) as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT account_no FROM accounts WHERE account_no=?", (account_no,))
+        if cur.fetchone():
+            raise ValueError("Account number already exists")
+        cur.execute(
+            "INSERT INTO accounts (account_no, name, password_hash, balance, created_at) VALUES (?, ?, ?, ?, ?)",
+            (account_no, name, pw_hash, initial_deposit, now_ts())
+        )
+        _account_changed(account_no)
+        audit("system", "create_account", account_no)
 
 def authenticate_user(account_no: str, password: str) -> bool:
-    conn = connect()
-    cur = conn.cursor()
-    cur.execute("SELECT password_hash FROM accounts WHERE account_no=?", (account_no,))
-    row = cur.fetchone()
-    conn.close()
-    if not row:
-        return False
-    return row["password_hash"] == hash_pw(password)
+    return _check_password("accounts", "account_no", account_no, password)
 
 def get_account(account_no: str):
-    conn = connect()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM accounts WHERE account_no=?", (account_no,))
-    row = cur.fetchone()
-    conn.close()
-    return dict(row) if row else None
+    if pool.in_transaction():
+        # may see this thread's uncommitted writes; never cache those
+        row = pool.get().execute("SELECT * FROM accounts WHERE account_no=?", (account_no,)).fetchone()
+        return dict(row) if row else None
+    if pool.shared and pool.changed_elsewhere():
+        # another station (or thread) committed; its writes never reached our cache
+        account_cache.clear()
+    row = account_cache.get(account_no)
+    if row is None:
+        token = account_cache.token()
+        row = pool.get().execute("SELECT * FROM accounts WHERE account_no=?", (account_no,)).fetchone()
+        if not row:
+            return None
+        row = dict(row)
+        account_cache.put(account_no, row, token)
+    return dict(row)
+
+# ---------------- Keyset pagination ----------------
+# Listings are ordered newest first and paged by the sort key of the last row
+# seen, so page N costs the same index seek as page 1 (no OFFSET scans).
+LEDGER_KEY = ("timestamp", "id")
+ACCOUNT_KEY = ("created_at", "account_no")
+LOAN_KEY = ("created_at", "id")
+
+def page_cursor(rows, key=LEDGER_KEY):
+    """Cursor for the page after ``rows``; pass it back as ``before=``."""
+    return tuple(rows[-1][c] for c in key) if rows else None
 
-def list_accounts():
-    conn = connect()
-    cur = conn.cursor()
-    cur.execute("SELECT account_no, name, balance, status, kyc, created_at FROM accounts ORDER BY created_at DESC")
+def _before(key, before, prefix="WHERE"):
+    if before is None:
+        return "", ()
+    return f" {prefix} ({', '.join(key)}) < ({', '.join('?' * len(key))})", tuple(before)
+
+def list_accounts(limit: int = None, before=None):
+    where, params = _before(ACCOUNT_KEY, before)
+    cur = pool.get().execute("SELECT account_no, name, balance, status, kyc, created_at FROM accounts"
+                             f"{where} ORDER BY created_at DESC, account_no DESC LIMIT ?",
+                             params + (-1 if limit is None else limit,))
     rows = [dict(r) for r in cur.fetchall()]
-    conn.close()
     return rows
 
-def search_accounts(query: str):
-    q = f"%{query.lower()}%"
-    conn = connect()
-    cur = conn.cursor()
-    cur.execute("SELECT account_no, name, balance FROM accounts WHERE lower(account_no) LIKE ? OR lower(name) LIKE ?", (q, q))
+def accounts_changed_since(mark: str = None):
+    """Accounts inserted or updated at/after ``mark``; returns (rows, new_mark).
+
+    Call with ``mark=None`` first to get the current high-water mark.
+    """
+    conn = pool.get()
+    if mark is None:
+        return [], conn.execute("SELECT COALESCE(MAX(updated_at), '') FROM accounts").fetchone()[0]
+    cur = conn.execute("SELECT account_no, name, balance, status, kyc, created_at, updated_at FROM accounts "
+                       "WHERE updated_at >= ? ORDER BY updated_at", (mark,))
     rows = [dict(r) for r in cur.fetchall()]
-    conn.close()
-    return rows
+    return rows, (rows[-1]["updated_at"] if rows else mark)
+
+# trigram matches considered per search; a query matching more accounts than
+# this is ranked within the first SEARCH_WINDOW hits rather than across all
+SEARCH_WINDOW = 2000
+
+def _search_key(query: str):
+    q = query.lower()
+    def key(r):
+        acc, name = r["account_no"].lower(), r["name"].lower()
+        # exact number, number prefix, name prefix, word start in name, then shorter names
+        return (acc != q, not acc.startswith(q), not name.startswith(q), f" {q}" not in f" {name}", len(name), acc)
+    return key
+
+def search_accounts(query: str, limit: int = 50):
+    """Accounts whose number or name contains ``query``, best matches first.
+
+    Served by the trigram index (see db.create_search_index).  Queries shorter
+    than a trigram match number/name prefixes through indexes instead; without
+    the index (old SQLite) it falls back to a LIKE scan.
+    """
+    query = query.strip()
+    if not query:
+        return []
+    conn = pool.get()
+    cols = "account_no, name, balance"
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'accounts_fts'").fetchone():
+        q = f"%{query.lower()}%"
+        rows = conn.execute(f"SELECT {cols} FROM accounts WHERE lower(account_no) LIKE ? OR lower(name) LIKE ? LIMIT ?",
+                            (q, q, SEARCH_WINDOW)).fetchall()
+    elif len(query) < 3:
+        # bounded range scans per prefix; a UNION would read every hit before limiting.
+        # account_no is case-sensitive, so also try the upper-cased form people type it in
+        found = {}
+        scans = [("account_no >= ? AND account_no < ?", q) for q in dict.fromkeys((query, query.upper()))]
+        scans.append(("name >= ? COLLATE NOCASE AND name < ? COLLATE NOCASE", query))
+        for where, q in scans:
+            for r in conn.execute(f"SELECT {cols} FROM accounts WHERE {where} LIMIT ?", (q, q + "\U0010ffff", SEARCH_WINDOW)):
+                found.setdefault(r["account_no"], r)
+        rows = found.values()
+    else:
+        # no ORDER BY rank: bm25 would score every match, which is what makes
+        # common fragments slow; the window is ranked below instead
+        rows = conn.execute(f"SELECT {cols} FROM accounts WHERE rowid IN "
+                            "(SELECT rowid FROM accounts_fts WHERE accounts_fts MATCH ? LIMIT ?) "
+                            f"UNION SELECT {cols} FROM accounts WHERE account_no = ?",
+                            ('"' + query.replace('"', '""') + '"', SEARCH_WINDOW, query)).fetchall()
+    return sorted((dict(r) for r in rows), key=_search_key(query))[:limit]
+
+def delete_account(account_no: str, performed_by: str):
+    with pool.transaction(immediate=True) as conn:
+        conn.execute("DELETE FROM accounts WHERE account_no=?", (account_no,))
+        _account_changed(account_no)
+        audit(performed_by, "delete_account", account_no)
+
+def verify_kyc(account_no: str, performed_by: str):
+    with pool.transaction(immediate=True) as conn:
+        conn.execute("UPDATE accounts SET kyc=1 WHERE account_no=?", (account_no,))
+        _account_changed(account_no)
+        audit(performed_by, "kyc_verify", account_no)
 
 # ---------------- Transactions ----------------
-def record_tx(tx_type: str, from_acc: str, to_acc: str, amount: float, performed_by: str):
-    conn = connect()
-    cur = conn.cursor()
-    cur.execute("INSERT INTO transactions (tx_type, from_acc, to_acc, amount, performed_by, timestamp) VALUES (?,?,?,?,?,?)",
-                (tx_type, from_acc, to_acc, float(amount), performed_by, now_ts()))
-    conn.commit()
-    conn.close()
-    audit(performed_by, f"tx_{tx_type}", f"{from_acc}->{to_acc}|{amount}")
-
-def deposit(account_no: str, amount: float, performed_by: str):
-    if amount <= 0:
+def record_tx(tx_type: str, from_acc: str, to_acc: str, amount, performed_by: str):
+    amount = Money.of(amount)
+    with pool.transaction(immediate=True) as conn:
+        ts = now_ts()
+        cur = conn.execute("INSERT INTO transactions (tx_type, from_acc, to_acc, amount, performed_by, timestamp) VALUES (?,?,?,?,?,?)",
+                           (tx_type, from_acc, to_acc, amount, performed_by, ts))
+        detection.observe(conn, [(cur.lastrowid, tx_type, from_acc, to_acc, amount, ts)])
+        audit(performed_by, f"tx_{tx_type}", f"{from_acc}->{to_acc}|{amount}")
+    return cur.lastrowid
+
+def _debit(conn, account_no: str, amount: Money, missing: str, insufficient: str):
+    # the balance check lives in the WHERE clause so concurrent writers cannot overdraw
+    cur = conn.execute("UPDATE accounts SET balance = balance - ? WHERE account_no=? AND balance >= ?",
+                       (amount, account_no, amount))
+    _account_changed(account_no)
+    if cur.rowcount == 0:
+        if not conn.execute("SELECT 1 FROM accounts WHERE account_no=?", (account_no,)).fetchone():
+            raise ValueError(missing)
+        raise ValueError(insufficient)
+
+def _credit(conn, account_no: str, amount: Money, missing: str):
+    cur = conn.execute("UPDATE accounts SET balance = balance + ? WHERE account_no=?", (amount, account_no))
+    _account_changed(account_no)
+    if cur.rowcount == 0:
+        raise ValueError(missing)
+
+def deposit(account_no: str, amount, performed_by: str):
+    amount = Money.of(amount)
+    if amount.cents <= 0:
         raise ValueError("Amount must be positive")
-    conn = connect()
-    cur = conn.cursor()
-    cur.execute("UPDATE accounts SET balance = balance + ? WHERE account_no=?", (amount, account_no))
-    conn.commit()
-    conn.close()
-    record_tx("deposit", None, account_no, amount, performed_by)
-
-def withdraw(account_no: str, amount: float, performed_by: str):
-    if amount <= 0:
+    with pool.transaction(immediate=True) as conn:
+        _credit(conn, account_no, amount, "Account not found")
+        return record_tx("deposit", None, account_no, amount, performed_by)
+
+def withdraw(account_no: str, amount, performed_by: str):
+    amount = Money.of(amount)
+    if amount.cents <= 0:
         raise ValueError("Amount must be positive")
-    acct = get_account(account_no)
-    if not acct:
-        raise ValueError("Account not found")
-    if acct["balance"] < amount:
-        raise ValueError("Insufficient funds")
-    conn = connect()
-    cur = conn.cursor()
-    cur.execute("UPDATE accounts SET balance = balance - ? WHERE account_no=?", (amount, account_no))
-    conn.commit()
-    conn.close()
-    record_tx("withdraw", account_no, None, amount, performed_by)
-
-def transfer(src: str, dst: str, amount: float, performed_by: str):
-    if amount <= 0:
+    with pool.transaction(immediate=True) as conn:
+        _debit(conn, account_no, amount, "Account not found", "Insufficient funds")
+        return record_tx("withdraw", account_no, None, amount, performed_by)
+
+def transfer(src: str, dst: str, amount, performed_by: str):
+    amount = Money.of(amount)
+    if amount.cents <= 0:
         raise ValueError("Amount must be positive")
-    src_acct = get_account(src)
-    dst_acct = get_account(dst)
-    if not src_acct or not dst_acct:
-        raise ValueError("Source or destination account not found")
-    if src_acct["balance"] < amount:
-        raise ValueError("Insufficient funds in source")
-    conn = connect()
-    cur = conn.cursor()
-    cur.execute("UPDATE accounts SET balance = balance - ? WHERE account_no=?", (amount, src))
-    cur.execute("UPDATE accounts SET balance = balance + ? WHERE account_no=?", (amount, dst))
-    conn.commit()
-    conn.close()
-    record_tx("transfer", src, dst, amount, performed_by)
-
-def get_transactions(account_no: str = None, limit: int = 200):
-    conn = connect()
-    cur = conn.cursor()
+    missing = "Source or destination account not found"
+    with pool.transaction(immediate=True) as conn:
+        _debit(conn, src, amount, missing, "Insufficient funds in source")
+        _credit(conn, dst, amount, missing)
+        return record_tx("transfer", src, dst, amount, performed_by)
+
+# ---------------- Batch posting ----------------
+BATCH_CHUNK = 1000
+_BATCH_LEGS = {"deposit": (False, True), "withdraw": (True, False), "transfer": (True, True)}
+
+def _normalize_posting(p):
+    if not isinstance(p, dict):
+        raise ValueError("Posting must be an object")
+    tx_type = p.get("tx_type")
+    if tx_type not in _BATCH_LEGS:
+        raise ValueError(f"Unknown tx_type: {tx_type}")
+    amount = Money.of(p.get("amount"))
+    if amount.cents <= 0:
+        raise ValueError("Amount must be positive")
+    needs_src, needs_dst = _BATCH_LEGS[tx_type]
+    src = p.get("from_acc") if needs_src else None
+    dst = p.get("to_acc") if needs_dst else None
+    if (needs_src and not src) or (needs_dst and not dst):
+        raise ValueError("Missing account")
+    return tx_type, src, dst, amount
+
+def _load_balances(conn, accounts):
+    accounts = list(accounts)
+    balances = {}
+    for i in range(0, len(accounts), 500):
+        part = accounts[i:i + 500]
+        marks = ",".join("?" * len(part))
+        for r in conn.execute(f"SELECT account_no, balance FROM accounts WHERE account_no IN ({marks})", part):
+            balances[r["account_no"]] = r["balance"]
+    return balances
+
+def _post_chunk(chunk, performed_by: str, results):
+    with pool.transaction(immediate=True) as conn:
+        balances = _load_balances(conn, {a for _, p in chunk for a in p[1:3] if a})
+        deltas = defaultdict(Money)
+        tx_rows, audit_rows, posted = [], [], []
+        ts = now_ts()
+        # postings apply in order, so a later row may spend an earlier row's credit
+        for i, (tx_type, src, dst, amount) in chunk:
+            if any(a and a not in balances for a in (src, dst)):
+                results[i].update(ok=False, error="Account not found")
+                continue
+            if src and balances[src] < amount:
+                results[i].update(ok=False, error="Insufficient funds")
+                continue
+            if src:
+                balances[src] -= amount
+                deltas[src] -= amount
+            if dst:
+                balances[dst] += amount
+                deltas[dst] += amount
+            tx_rows.append((tx_type, src, dst, amount, performed_by, ts))
+            audit_rows.append((performed_by, f"tx_{tx_type}", f"{src}->{dst}|{amount}", ts))
+            posted.append(i)
+        if not posted:
+            return
+        conn.executemany("UPDATE accounts SET balance = balance + ? WHERE account_no=?",
+                         [(d, a) for a, d in deltas.items() if d])
+        _account_changed(*deltas)
+        conn.executemany("INSERT INTO transactions (tx_type, from_acc, to_acc, amount, performed_by, timestamp) VALUES (?,?,?,?,?,?)",
+                         tx_rows)
+        # ids are contiguous because the chunk holds the write lock
+        first_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0] - len(tx_rows) + 1
+        detection.observe(conn, [(first_id + n, *row[:4], ts) for n, row in enumerate(tx_rows)])
+        conn.executemany(INSERT_AUDIT, audit_rows)
+        for n, i in enumerate(posted):
+            results[i]["tx_id"] = first_id + n
+
+def post_batch(postings, performed_by: str, chunk_size: int = BATCH_CHUNK, run=None):
+    """Post many deposits/withdrawals/transfers in chunked transactions.
+
+    Each posting is a mapping shaped like a transactions row (tx_type,
+    from_acc, to_acc, amount).  Returns one result dict per posting, in input
+    order, with ``ok``, ``error`` and, for posted rows, ``tx_id``.  ``run``
+    executes each chunk, e.g. ``writer.call`` to queue every chunk as its own
+    unit on the write queue; by default chunks run here.
+    """
+    results, valid = [], []
+    for i, p in enumerate(postings):
+        results.append({"index": i, "ok": True, "error": None, "tx_id": None})
+        try:
+            valid.append((i, _normalize_posting(p)))
+        except ValueError as e:
+            results[i].update(ok=False, error=str(e))
+    run = run or (lambda fn, *args: fn(*args))
+    for start in range(0, len(valid), chunk_size):
+        run(_post_chunk, valid[start:start + chunk_size], performed_by, results)
+    return results
+
+def _ledger_where(before, start, end, prefix="WHERE"):
+    # keyset cursor plus an optional start <= timestamp < end range
+    clauses, params = [], []
+    if start is not None:
+        clauses.append("timestamp >= ?"); params.append(start)
+    if end is not None:
+        clauses.append("timestamp < ?"); params.append(end)
+    if before is not None:
+        clauses.append(f"({', '.join(LEDGER_KEY)}) < (?, ?)"); params.extend(before)
+    return (f" {prefix} " + " AND ".join(clauses) if clauses else ""), tuple(params)
+
+def _transactions_page(schema: str, account_no, limit: int, before, start, end):
+    cur = pool.get().cursor()
     if account_no:
-        cur.execute("SELECT * FROM transactions WHERE from_acc=? OR to_acc=? ORDER BY timestamp DESC LIMIT ?", (account_no, account_no, limit))
+        where, params = _ledger_where(before, start, end, "AND")
+        # a UNION of two index searches instead of an OR that forces a table scan
+        cur.execute(f"SELECT * FROM {schema}.transactions WHERE from_acc=?{where} "
+                    f"UNION SELECT * FROM {schema}.transactions WHERE to_acc=?{where} "
+                    "ORDER BY timestamp DESC, id DESC LIMIT ?", (account_no,) + params + (account_no,) + params + (limit,))
     else:
-        cur.execute("SELECT * FROM transactions ORDER BY timestamp DESC LIMIT ?", (limit,))
-    rows = [dict(r) for r in cur.fetchall()]
-    conn.close()
+        where, params = _ledger_where(before, start, end)
+        cur.execute(f"SELECT * FROM {schema}.transactions{where} ORDER BY timestamp DESC, id DESC LIMIT ?", params + (limit,))
+    return [dict(r) for r in cur.fetchall()]
+
+def get_transactions(account_no: str = None, limit: int = 200, before=None, start=None, end=None):
+    """Newest-first page of the ledger, optionally for one account and
+    ``start <= timestamp < end``.  Archived rows (see archive.py) are read
+    only once the page runs past the hot table."""
+    start, end = _ts_param(start), _ts_param(end)
+    rows = []
+    for schema in archive.sources("transactions", start, end, before):
+        rows += _transactions_page(schema, account_no, limit - len(rows), before, start, end)
+        if len(rows) >= limit:
+            break
     return rows
 
+def transactions_since(mark: int = None, account_no: str = None):
+    """Ledger rows posted after ``mark`` (a transaction id); returns (rows, new_mark)."""
+    conn = pool.get()
+    if mark is None:
+        return [], conn.execute("SELECT COALESCE(MAX(id), 0) FROM transactions").fetchone()[0]
+    if account_no:
+        # the UNION of two index searches _transactions_page uses; ordered the
+        # way those indexes are, so the new mark is the largest id, not the last
+        cur = conn.execute("SELECT * FROM transactions WHERE from_acc=? AND id > ? "
+                           "UNION SELECT * FROM transactions WHERE to_acc=? AND id > ? "
+                           "ORDER BY timestamp, id", (account_no, mark, account_no, mark))
+    else:
+        cur = conn.execute("SELECT * FROM transactions WHERE id > ? ORDER BY id", (mark,))
+    rows = [dict(r) for r in cur.fetchall()]
+    return rows, max((r["id"] for r in rows), default=mark)
+
 # ---------------- Loans (simple) ----------------
-def request_loan(account_no: str, amount: float, term_months: int):
-    conn = connect()
-    cur = conn.cursor()
-    cur.execute("INSERT INTO loans (account_no, amount, term_months, status, created_at) VALUES (?,?,?,?,?)",
-                (account_no, amount, term_months, "pending", now_ts()))
-    conn.commit()
-    conn.close()
-    audit("system", "loan_requested", f"{account_no}|{amount}")
-
-def list_loans(status: str = None):
-    conn = connect()
-    cur = conn.cursor()
+DEFAULT_LOAN_RATE = 0.12  # nominal annual rate, compounded monthly
+MAX_LOAN_RATE = 1.0  # 100% a year; anything above is a data-entry error
+LOAN_RECOMPUTE_CHUNK = 50_000
+
+def request_loan(account_no: str, amount, term_months: int, annual_rate: float = DEFAULT_LOAN_RATE):
+    amount = Money.of(amount)
+    if amount.cents <= 0:
+        raise ValueError("Amount must be positive")
+    if not math.isfinite(annual_rate) or not 0 <= annual_rate <= MAX_LOAN_RATE:
+        raise ValueError(f"Interest rate must be between 0 and {MAX_LOAN_RATE:g}")
+    if isinstance(term_months, bool) or not isinstance(term_months, int) or term_months < 1:
+        raise ValueError("Term must be a positive whole number of months")
+    with pool.transaction(immediate=True) as conn:
+        cur = conn.execute("INSERT INTO loans (account_no, amount, term_months, status, created_at, annual_rate) VALUES (?,?,?,?,?,?)",
+                           (account_no, amount, term_months, "pending", now_ts(), annual_rate))
+        audit("system", "loan_requested", f"{account_no}|{amount}")
+    return cur.lastrowid
+
+def list_loans(status: str = None, limit: int = None, before=None):
+    cur = pool.get().cursor()
+    limit = -1 if limit is None else limit
     if status:
-        cur.execute("SELECT * FROM loans WHERE status=? ORDER BY created_at DESC", (status,))
+        where, params = _before(LOAN_KEY, before, "AND")
+        cur.execute(f"SELECT * FROM loans WHERE status=?{where} ORDER BY created_at DESC, id DESC LIMIT ?",
+                    (status,) + params + (limit,))
     else:
-        cur.execute("SELECT * FROM loans ORDER BY created_at DESC")
+        where, params = _before(LOAN_KEY, before)
+        cur.execute(f"SELECT * FROM loans{where} ORDER BY created_at DESC, id DESC LIMIT ?", params + (limit,))
     rows = [dict(r) for r in cur.fetchall()]
-    conn.close()
     return rows
 
-def update_loan_status(loan_id: int, new_status: str):
-    conn = connect()
-    cur = conn.cursor()
-    cur.execute("UPDATE loans SET status=? WHERE id=?", (new_status, loan_id))
-    conn.commit()
-    conn.close()
-    audit("system", "loan_status_change", f"{loan_id}|{new_status}")
+def get_loan(loan_id: int):
+    row = pool.get().execute("SELECT * FROM loans WHERE id=?", (loan_id,)).fetchone()
+    return dict(row) if row else None
 
-# ---------------- Audit / Export ----------------
-def audit(actor: str, action: str, details: str = ""):
-    conn = connect()
-    cur = conn.cursor()
-    cur.execute("INSERT INTO audit (actor, action, details, timestamp) VALUES (?,?,?,?)", (actor, action, details, now_ts()))
-    conn.commit()
-    conn.close()
-
-def list_audit(limit: int = 200):
-    conn = connect()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM audit ORDER BY timestamp DESC LIMIT ?", (limit,))
+def loans_changed_since(mark: str = None):
+    """Loans inserted or updated at/after ``mark``; returns (rows, new_mark)."""
+    conn = pool.get()
+    if mark is None:
+        return [], conn.execute("SELECT COALESCE(MAX(updated_at), '') FROM loans").fetchone()[0]
+    cur = conn.execute("SELECT * FROM loans WHERE updated_at >= ? ORDER BY updated_at", (mark,))
     rows = [dict(r) for r in cur.fetchall()]
-    conn.close()
+    return rows, (rows[-1]["updated_at"] if rows else mark)
+
+def loan_schedule(loan_id: int):
+    row = pool.get().execute("SELECT amount, annual_rate, term_months FROM loans WHERE id=?", (loan_id,)).fetchone()
+    if not row:
+        raise ValueError("Loan not found")
+    # balances are rounded to the centavo and every other figure derived from
+    # them, so each period's principal and the totals add up exactly
+    rows, prev = [], row["amount"]
+    for r in amortization.schedule(float(row["amount"]), row["annual_rate"], row["term_months"]):
+        balance = Money.round(r["balance"])
+        interest = Money.round(r["interest"])
+        principal = prev - balance
+        rows.append({"period": r["period"], "payment": principal + interest, "interest": interest,
+                     "principal": principal, "balance": balance})
+        prev = balance
+    return rows
+
+# payments due between a loan's start and ``as_of``: whole months elapsed
+_MONTHS_ELAPSED = ("(CAST(substr(:as_of, 1, 4) AS INTEGER) - CAST(substr({col}, 1, 4) AS INTEGER)) * 12"
+                   " + CAST(substr(:as_of, 6, 2) AS INTEGER) - CAST(substr({col}, 6, 2) AS INTEGER)"
+                   " - (substr(:as_of, 9, 2) < substr({col}, 9, 2))")
+
+def _to_cents(pesos):
+    # amortization works in float pesos; loan_balances stores centavos
+    if hasattr(pesos, "tolist"):
+        return (pesos * 100).round().astype("int64").tolist()
+    return [round(p * 100) for p in pesos]
+
+def recompute_loan_balances(as_of: str = None, chunk: int = LOAN_RECOMPUTE_CHUNK, progress=None):
+    """Rewrite loan_balances for every disbursed loan as of ``as_of`` (YYYY-MM-DD).
+
+    Loans are read in chunks and each chunk is amortized as arrays (see
+    amortization.portfolio); the whole snapshot is replaced in one
+    transaction.  Returns the number of loans written.
+    """
+    as_of = (as_of or now_ts())[:10]
+    conn = pool.get()
+    done = 0
+    with pool.transaction(immediate=True):
+        conn.execute("DELETE FROM loan_balances")
+        cur = conn.execute(f"SELECT id, amount / 100.0, annual_rate, term_months, {_MONTHS_ELAPSED.format(col='disbursed_at')} "
+                           "FROM loans WHERE status = 'disbursed'", {"as_of": as_of})
+        while True:
+            rows = cur.fetchmany(chunk)
+            if not rows:
+                break
+            ids, principal, rate, term, elapsed = zip(*rows)
+            res = amortization.portfolio(principal, rate, term, elapsed)
+            cols = [_to_cents(res[k]) for k in ("payment", "outstanding", "principal_paid", "interest_paid")]
+            conn.executemany("INSERT INTO loan_balances (loan_id, as_of, payment, outstanding, principal_paid, interest_paid) "
+                             "VALUES (?,?,?,?,?,?)", zip(ids, repeat(as_of), *cols))
+            done += len(rows)
+            if progress: progress(done, None)
+    return done
+
+def loan_balance(loan_id: int):
+    row = pool.get().execute("SELECT * FROM loan_balances WHERE loan_id=?", (loan_id,)).fetchone()
+    return dict(row) if row else None
+
+# allowed moves; disbursing credits the borrower and posts a ledger row
+LOAN_TRANSITIONS = {
+    "pending": ("approved", "rejected"),
+    "approved": ("disbursed", "rejected"),
+    "disbursed": ("repaid",),
+}
+
+def transition_loans(loan_ids, new_status: str, performed_by: str = "system"):
+    """Move many loans to ``new_status`` in one transaction.
+
+    Loans whose current status does not allow the move (or that do not
+    exist) are skipped, not fatal.  Disbursed loans credit their accounts and
+    write a 'loan_disbursement' ledger row in the same commit.  Returns one
+    result dict per id, in input order, with ``ok``, ``error`` and ``tx_id``.
+    """
+    sources = [s for s, targets in LOAN_TRANSITIONS.items() if new_status in targets]
+    if not sources:
+        raise ValueError(f"Unknown loan status: {new_status}")
+    loan_ids = list(loan_ids)
+    results = [{"loan_id": i, "ok": False, "error": None, "tx_id": None} for i in loan_ids]
+    disburse = new_status == "disbursed"
+    with pool.transaction(immediate=True) as conn:
+        loans = {}
+        for i in range(0, len(loan_ids), 500):
+            part = loan_ids[i:i + 500]
+            for r in conn.execute("SELECT l.id, l.status, l.account_no, l.amount, a.account_no IS NOT NULL AS has_account "
+                                  f"FROM loans l LEFT JOIN accounts a ON a.account_no = l.account_no "
+                                  f"WHERE l.id IN ({','.join('?' * len(part))})", part):
+                loans[r["id"]] = r
+        ts = now_ts()
+        moved, credits, tx_rows, seen = [], defaultdict(Money), [], set()
+        for res in results:
+            loan = loans.get(res["loan_id"])
+            if loan is None:
+                res["error"] = "Loan not found"
+            elif loan["id"] in seen:
+                res["error"] = "Duplicate loan id"
+            elif loan["status"] not in sources:
+                res["error"] = f"Loan is {loan['status']}; cannot mark it {new_status}"
+            elif disburse and not loan["has_account"]:
+                res["error"] = "Account not found"
+            else:
+                res["ok"] = True
+                seen.add(loan["id"])
+                moved.append(res)
+                if disburse:
+                    credits[loan["account_no"]] += loan["amount"]
+                    tx_rows.append(("loan_disbursement", None, loan["account_no"], loan["amount"], performed_by, ts))
+        if not moved:
+            return results
+        conn.executemany("UPDATE loans SET status=?, disbursed_at=COALESCE(?, disbursed_at) WHERE id=?",
+                         [(new_status, ts if disburse else None, r["loan_id"]) for r in moved])
+        if disburse:
+            conn.executemany("UPDATE accounts SET balance = balance + ? WHERE account_no=?",
+                             [(amt, acc) for acc, amt in credits.items()])
+            _account_changed(*credits)
+            conn.executemany("INSERT INTO transactions (tx_type, from_acc, to_acc, amount, performed_by, timestamp) VALUES (?,?,?,?,?,?)",
+                             tx_rows)
+            first_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0] - len(tx_rows) + 1
+            detection.observe(conn, [(first_id + n, *row[:4], ts) for n, row in enumerate(tx_rows)])
+            for n, r in enumerate(moved):
+                r["tx_id"] = first_id + n
+        conn.executemany(INSERT_AUDIT, [(performed_by, "loan_status_change", f"{r['loan_id']}|{new_status}", ts) for r in moved])
+    return results
+
+def update_loan_status(loan_id: int, new_status: str, performed_by: str = "system"):
+    result = transition_loans([loan_id], new_status, performed_by)[0]
+    if not result["ok"]:
+        raise ValueError(result["error"])
+    return result
+
+# ---------------- Audit / Export ----------------
+def audit(actor: str, action: str, details: str = "", durable: bool = None):
+    """Record an audit entry.
+
+    Inside an open transaction the row commits with the caller's work;
+    otherwise it is queued and written by the batched sink (see auditlog).
+    ``durable=True`` flushes the queue and commits before returning.
+    """
+    audit_sink.write((actor, action, details, now_ts()), durable)
+
+def flush_audit():
+    # write out every queued audit entry; called on logout and shutdown
+    audit_sink.flush()
+
+def list_audit(limit: int = 200, before=None, start=None, end=None):
+    """Newest-first page of the audit log; archived rows are read as in get_transactions."""
+    audit_sink.flush()
+    start, end = _ts_param(start), _ts_param(end)
+    where, params = _ledger_where(before, start, end)
+    rows = []
+    for schema in archive.sources("audit", start, end, before):
+        cur = pool.get().execute(f"SELECT * FROM {schema}.audit{where} ORDER BY timestamp DESC, id DESC LIMIT ?",
+                                 params + (limit - len(rows),))
+        rows += [dict(r) for r in cur.fetchall()]
+        if len(rows) >= limit:
+            break
     return rows
 
-def export_accounts_csv(path: str = None):
-    path = path or str(ROOT / f"accounts_export_{datetime.datetime.utcnow().strftime('%Y%m%d%H%M%S')}.csv")
-    rows = list_accounts()
-    with open(path, "w", newline='', encoding="utf-8") as f:
-        w = csv.writer(f)
-        w.writerow(["account_no", "name", "balance", "status", "kyc", "created_at"])
-        for r in rows:
-            w.writerow([r["account_no"], r["name"], r["balance"], r["status"], r.get("kyc", 0), r.get("created_at","")])
-    audit("system", "export_accounts_csv", path)
+def audit_since(mark: int = None):
+    """Audit rows written after ``mark`` (an audit id); returns (rows, new_mark)."""
+    audit_sink.flush()
+    conn = pool.get()
+    if mark is None:
+        return [], conn.execute("SELECT COALESCE(MAX(id), 0) FROM audit").fetchone()[0]
+    rows = [dict(r) for r in conn.execute("SELECT * FROM audit WHERE id > ? ORDER BY id", (mark,)).fetchall()]
+    return rows, (rows[-1]["id"] if rows else mark)
+
+# ---------------- Dashboard ----------------
+def dashboard_stats():
+    """Dashboard card figures, read from trigger-maintained aggregates in O(1)."""
+    conn = pool.get()
+    stats = {r["key"]: r["value"] for r in conn.execute("SELECT key, value FROM summary")}
+    for key in ("total_balance", "loans_outstanding"):
+        stats[key] = Money(stats.get(key, 0))
+    since = (datetime.datetime.utcnow() - datetime.timedelta(hours=24)).strftime("%Y-%m-%dT%H")
+    stats["suspicious_24h"] = conn.execute("SELECT COALESCE(SUM(n), 0) FROM suspicious_hourly WHERE hour >= ?",
+                                           (since,)).fetchone()[0]
+    stats["customers"] = int(stats.get("customers", 0))
+    return stats
+
+def list_alerts(account_no: str = None, limit: int = 200, before=None):
+    """Rule-engine alerts, newest first (see detection.py)."""
+    if account_no:
+        where, params = _before(LEDGER_KEY, before, "AND")
+        sql, params = f"SELECT * FROM alerts WHERE account_no=?{where}", (account_no,) + params
+    else:
+        where, params = _before(LEDGER_KEY, before)
+        sql = f"SELECT * FROM alerts{where}"
+    cur = pool.get().execute(sql + " ORDER BY timestamp DESC, id DESC LIMIT ?", params + (limit,))
+    return [dict(r) for r in cur.fetchall()]
+
+def rebuild_detection():
+    """Reload the rule engine's sliding windows from recent ledger history."""
+    detection.engine.rebuild()
+
+class Cancelled(Exception):
+    """Raised by a long-running job whose ``cancel`` event was set."""
+
+def _check_cancel(cancel):
+    if cancel is not None and cancel.is_set():
+        raise Cancelled("Cancelled")
+
+EXPORT_CHUNK = 5000
+
+def _export_path(name: str, suffix: str) -> str:
+    return str(ROOT / f"{name}_export_{datetime.datetime.utcnow().strftime('%Y%m%d%H%M%S')}{suffix}")
+
+def _ts_param(value):
+    # accept dates/datetimes as well as the ISO strings stored in the ledger
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+def _range(start, end, column: str = "timestamp"):
+    clauses, params = [], []
+    if start is not None:
+        clauses.append(f"{column} >= ?"); params.append(_ts_param(start))
+    if end is not None:
+        clauses.append(f"{column} < ?"); params.append(_ts_param(end))
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), tuple(params)
+
+def _ledger_queries(table: str, select: str, start, end):
+    # (sql, params) for each hot/archive source with rows in range, oldest first
+    start, end = _ts_param(start), _ts_param(end)
+    where, params = _range(start, end)
+    for schema in archive.sources(table, start, end, newest_first=False):
+        yield f"SELECT {select} FROM {schema}.{table}{where} ORDER BY timestamp, id", params
+
+def _stream_csv(path: str, queries, compress: bool = False, progress=None, cancel=None):
+    """Write the rows of each (sql, params) in ``queries`` to ``path``, in
+    turn, as they come off the cursor; the header comes from the first.
+
+    Memory stays at one ``fetchmany`` chunk whatever the table size.  Returns
+    (rows, seconds).
+    """
+    # level 6 is gzip's usual speed/size trade-off; 9 roughly halves throughput
+    opener = functools.partial(gzip.open, compresslevel=6) if compress else open
+    start = time.perf_counter()
+    n = 0
+    cur = None
+    try:
+        with opener(path, "wt", newline='', encoding="utf-8") as f:
+            w = csv.writer(f)
+            for sql, params in queries:
+                first = cur is None
+                cur = pool.get().execute(sql, params)
+                if first:
+                    w.writerow([d[0] for d in cur.description])
+                while True:
+                    _check_cancel(cancel)
+                    batch = cur.fetchmany(EXPORT_CHUNK)
+                    if not batch:
+                        break
+                    w.writerows(batch)
+                    n += len(batch)
+                    if progress: progress(n, None)
+    except BaseException:
+        if cur is not None:
+            cur.close()
+        Path(path).unlink(missing_ok=True)
+        raise
+    return n, time.perf_counter() - start
+
+def _money_text(col: str) -> str:
+    # format centavos as pesos in SQL rather than building a Money per row;
+    # exact, since n / 100.0 is within a rounding error of the true value
+    return f"printf('%.2f', {col} / 100.0) AS {col}"
+
+def _audit_export(action: str, path: str, rows: int, seconds: float):
+    audit("system", action, f"{path}|{rows} rows|{rows / max(seconds, 1e-9):.0f} rows/s")
+
+def export_accounts_csv(path: str = None, compress: bool = False, progress=None, cancel=None):
+    path = path or _export_path("accounts", ".csv.gz" if compress else ".csv")
+    rows, seconds = _stream_csv(path, [(f"SELECT account_no, name, {_money_text('balance')}, status, kyc, created_at FROM accounts", ())],
+                                compress, progress, cancel)
+    _audit_export("export_accounts_csv", path, rows, seconds)
+    return path
+
+def export_transactions_csv(path: str = None, start=None, end=None, compress: bool = False, progress=None, cancel=None):
+    """Stream the ledger, optionally limited to ``start <= timestamp < end``."""
+    path = path or _export_path("transactions", ".csv.gz" if compress else ".csv")
+    queries = _ledger_queries("transactions", f"id, tx_type, from_acc, to_acc, {_money_text('amount')}, performed_by, timestamp",
+                              start, end)
+    rows, seconds = _stream_csv(path, queries, compress, progress, cancel)
+    _audit_export("export_transactions_csv", path, rows, seconds)
     return path
 
-# optional PDF export (requires reportlab)
+def export_audit_csv(path: str = None, start=None, end=None, compress: bool = False, progress=None, cancel=None):
+    path = path or _export_path("audit", ".csv.gz" if compress else ".csv")
+    audit_sink.flush()
+    queries = _ledger_queries("audit", "id, actor, action, details, timestamp", start, end)
+    rows, seconds = _stream_csv(path, queries, compress, progress, cancel)
+    _audit_export("export_audit_csv", path, rows, seconds)
+    return path
+
+# PDF export: the built-in streaming writer, or reportlab for small documents (see pdf.open_writer)
+TX_PDF_COLUMNS = ("id", "type", "from", "to", "amount", "by", "timestamp")
+TX_PDF_WIDTHS = (9, 10, 12, 12, 16, 12, 26)
+
+def _iter_cursor(cur, cancel=None):
+    while True:
+        _check_cancel(cancel)
+        batch = cur.fetchmany(EXPORT_CHUNK)
+        if not batch:
+            return
+        yield from batch
+
+def export_transactions_pdf(path: str = None, start=None, end=None, progress=None, cancel=None):
+    path = path or _export_path("transactions", ".pdf")
+    queries = list(_ledger_queries("transactions", "id, tx_type, from_acc, to_acc, amount, performed_by, timestamp",
+                                   start, end))
+    # the count picks the writer and gives progress a total
+    total = sum(pool.get().execute(f"SELECT COUNT(*) FROM ({sql})", params).fetchone()[0] for sql, params in queries)
+    cursors = []
+    def ledger():
+        for sql, params in queries:
+            cursors.append(pool.get().execute(sql, params))
+            yield from _iter_cursor(cursors[-1], cancel)
+    rows = ((r["id"], r["tx_type"], r["from_acc"] or "", r["to_acc"] or "", f"{r['amount']:,.2f}", r["performed_by"], r["timestamp"])
+            for r in ledger())
+    started = time.perf_counter()
+    writer = pdf.open_writer(path, total)
+    try:
+        n = pdf.render_table(writer, "Transactions", TX_PDF_COLUMNS, TX_PDF_WIDTHS, rows,
+                             on_page=lambda done: progress and progress(done, max(total, done)))
+        writer.close()
+    except BaseException:
+        for cur in cursors:
+            cur.close()
+        writer.abort()
+        Path(path).unlink(missing_ok=True)
+        raise
+    _audit_export("export_transactions_pdf", path, n, time.perf_counter() - started)
+    return path
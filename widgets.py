@@ -0,0 +1,325 @@
+# frontend/widgets.py
+import tkinter as tk
+from tkinter import ttk
+from collections import OrderedDict
+
+
+class VirtualTable(ttk.Frame):
+    """A Treeview that only materializes the rows currently on screen.
+
+    Rows are pulled from the service layer in keyset pages through
+    ``fetch(limit, before)`` and kept in a small LRU of chunks; the tree itself
+    holds one item per visible line and those items are re-filled as the user
+    scrolls, so widget count and memory stay flat however large the table is.
+    Only the cursor at the start of each chunk is remembered, which lets us
+    re-fetch any chunk that has been evicted.
+
+    With ``changes(mark) -> (rows, mark)`` and ``row_id`` given, ``refresh()``
+    is incremental: only rows newer than the high-water mark are fetched, and
+    they are patched into the loaded rows or stacked on top of the table.
+
+    Given a ``worker`` (see workers.Worker), ``fetch`` and ``changes`` run on
+    it instead of the Tk thread: rows of a chunk still in flight render blank
+    and the table redraws when the chunk arrives.  Errors go to ``on_error``.
+    """
+
+    def __init__(self, master, columns, fetch, values, key, chunk=200, keep_chunks=4,
+                 row_id=None, changes=None, worker=None, on_error=None, **kw):
+        super().__init__(master, **kw)
+        self.fetch = fetch
+        self.values = values
+        self.key = key
+        self.row_id = row_id
+        self.changes = changes
+        self.worker = worker
+        self.on_error = on_error
+        self._mark = None
+        self._ready = changes is None  # no page is read until the mark is taken
+        self._refreshing = False
+        self._follow_end = False
+        self._gen = 0
+        self.chunk = chunk
+        self.keep_chunks = keep_chunks
+        self.tree = ttk.Treeview(self, columns=columns, show="headings", selectmode="browse")
+        for c in columns:
+            self.tree.heading(c, text=c.title().replace("_", " "))
+        self.scroll = ttk.Scrollbar(self, orient="vertical", command=self.yview)
+        self.scroll.pack(side="right", fill="y")
+        self.tree.pack(side="left", fill="both", expand=True)
+        self._row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        self._slots = []
+        self._top = 0
+        self._selected = None
+        self._reset()
+        self.tree.bind("<Configure>", self._on_resize)
+        self.tree.bind("<<TreeviewSelect>>", self._on_select)
+        self.tree.bind("<MouseWheel>", lambda e: self.scroll_by(-1 if e.delta > 0 else 1, "units", 3))
+        self.tree.bind("<Button-4>", lambda e: self.scroll_by(-1, "units", 3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll_by(1, "units", 3))
+        for seq, n, what in (("<Up>", -1, "units"), ("<Down>", 1, "units"),
+                             ("<Prior>", -1, "pages"), ("<Next>", 1, "pages")):
+            self.tree.bind(seq, lambda e, n=n, what=what: self._key_move(n, what))
+        self.tree.bind("<Home>", lambda e: self._jump(0))
+        self.tree.bind("<End>", lambda e: self._jump_end())
+        if changes:
+            # take the mark before the first page is read so nothing slips between them
+            self._call(changes, None, on_done=self._marked)
+
+    # ---- data
+    def _call(self, fn, *args, on_done):
+        if self.worker is None:
+            try:
+                result = fn(*args)
+            except Exception as e:
+                return self._failed(e)
+            return on_done(result)
+        def done(result):
+            if self.winfo_exists():  # the view may have been torn down meanwhile
+                on_done(result)
+        self.worker.submit(fn, *args, on_done=done, on_error=self._failed)
+
+    def _failed(self, e):
+        self._pending.clear()
+        self._refreshing = False
+        if self.on_error is None:
+            raise e
+        self.on_error(e)
+
+    def _marked(self, result):
+        self._mark = result[1]
+        self._ready = True
+        self.render()
+
+    def _reset(self):
+        self._gen += 1  # replies for chunks requested before this are dropped
+        self._pending = set()
+        self._starts = [None]  # keyset cursor at the start of chunk i
+        self._chunks = OrderedDict()
+        self._total = None  # known once a short chunk has been seen
+        self._head = []  # rows that arrived above chunk 0 since the last reset
+        self._first_key = None
+
+    def _row_key(self, row):
+        return tuple(row[c] for c in self.key)
+
+    @staticmethod
+    def _just_above(key):
+        # smallest cursor strictly greater than ``key``: "before" it includes key itself
+        last = key[-1]
+        return key[:-1] + ((last + 1,) if isinstance(last, int) else (str(last) + "\0",))
+
+    def _load(self, n):
+        """Rows of chunk ``n``, or None while they are still being fetched."""
+        if n in self._chunks:
+            self._chunks.move_to_end(n)
+            return self._chunks[n]
+        if not self._ready:
+            return None
+        # walk forward to discover the start cursor of a chunk we have not reached yet
+        while len(self._starts) <= n and self._total is None:
+            if self._load(len(self._starts) - 1) is None:
+                return None
+        if n >= len(self._starts):
+            return []
+        if n not in self._pending:
+            self._pending.add(n)
+            gen = self._gen
+            self._call(self.fetch, self.chunk, self._starts[n], on_done=lambda rows: self._loaded(gen, n, rows))
+        return self._chunks.get(n)
+
+    def _loaded(self, gen, n, rows):
+        if gen != self._gen:
+            return
+        self._pending.discard(n)
+        if n == 0 and self._first_key is None and rows:
+            # pin chunk 0 to its first row so later inserts cannot shift every chunk
+            self._first_key = self._row_key(rows[0])
+            self._starts[0] = self._just_above(self._first_key)
+        if len(rows) == self.chunk:
+            if len(self._starts) == n + 1:
+                self._starts.append(tuple(rows[-1][c] for c in self.key))
+        else:
+            self._total = n * self.chunk + len(rows)
+        self._chunks[n] = rows
+        while len(self._chunks) > self.keep_chunks:
+            self._chunks.popitem(last=False)
+        if self.worker is not None:
+            self.render()
+
+    def row(self, index):
+        if index < len(self._head):
+            return self._head[index] if index >= 0 else None
+        index -= len(self._head)
+        if self._total is not None and index >= self._total:
+            return None
+        rows = self._load(index // self.chunk)
+        offset = index % self.chunk
+        return rows[offset] if rows and offset < len(rows) else None
+
+    def _estimated_total(self):
+        if self._total is not None:
+            return len(self._head) + self._total
+        # unknown length: pretend there is one more chunk so the scrollbar invites scrolling on
+        return len(self._head) + len(self._starts) * self.chunk + self.chunk
+
+    # ---- rendering
+    def _on_resize(self, event):
+        visible = max(1, (event.height - self._row_height) // self._row_height)
+        if visible != len(self._slots):
+            self.tree.delete(*self.tree.get_children())
+            self._slots = [self.tree.insert("", "end", iid=str(i)) for i in range(visible)]
+            self.render()
+
+    def render(self):
+        if self._follow_end:
+            self._top = self._estimated_total()
+        self._top = max(0, min(self._top, self._estimated_total() - len(self._slots)))
+        # touching the last visible row may discover the real end of the table
+        self.row(self._top + len(self._slots) - 1)
+        self._top = max(0, min(self._top, self._estimated_total() - len(self._slots)))
+        shown = 0
+        for i, slot in enumerate(self._slots):
+            r = self.row(self._top + i)
+            if r is None:
+                self.tree.detach(slot)
+                continue
+            self.tree.item(slot, values=self.values(r))
+            self.tree.move(slot, "", shown)
+            shown += 1
+        total = max(self._estimated_total(), 1)
+        self.scroll.set(self._top / total, min(1.0, (self._top + len(self._slots)) / total))
+        slot = None if self._selected is None else self._selected - self._top
+        if slot is not None and 0 <= slot < shown:
+            self.tree.selection_set(self._slots[slot])
+        elif self.tree.selection():
+            self.tree.selection_remove(*self.tree.selection())
+
+    def _on_select(self, event):
+        sel = self.tree.selection()
+        if sel:
+            self._selected = self._top + int(sel[0])
+
+    # ---- scrolling
+    def yview(self, *args):
+        if args[0] == "moveto":
+            self._jump(int(float(args[1]) * self._estimated_total()))
+        elif args[0] == "scroll":
+            self.scroll_by(int(args[1]), args[2])
+
+    def scroll_by(self, n, what="units", step=1):
+        step = max(1, len(self._slots) - 1) if what == "pages" else step
+        self._jump(self._top + n * step)
+        return "break"
+
+    def _jump(self, top):
+        self._follow_end = False
+        self._top = max(0, top)
+        self.render()
+        return "break"
+
+    def _jump_end(self):
+        # the length may only be known once the last chunk arrives, so keep following it
+        self._follow_end = True
+        self.render()
+        return "break"
+
+    def _key_move(self, n, what):
+        self._follow_end = False
+        if self._selected is None:
+            return self.scroll_by(n, what)
+        step = max(1, len(self._slots) - 1) if what == "pages" else 1
+        self._selected = max(0, self._selected + n * step)
+        if self._total is not None:
+            self._selected = min(self._selected, self._total - 1)
+        if self._selected < self._top:
+            self._top = self._selected
+        elif self._selected >= self._top + len(self._slots):
+            self._top = self._selected - len(self._slots) + 1
+        self.render()
+        return "break"
+
+    # ---- public
+    def selected_row(self):
+        return None if self._selected is None else self.row(self._selected)
+
+    def reload(self):
+        # drop cached chunks and re-read only the rows that are on screen
+        self._reset()
+        self.render()
+
+    def refresh(self):
+        if self.changes is None:
+            return self.reload()
+        if not self._ready or self._refreshing:
+            return
+        self._refreshing = True
+        self._call(self.changes, self._mark, on_done=self._changed)
+
+    def _changed(self, result):
+        self._refreshing = False
+        rows, self._mark = result
+        if rows and self._pending:
+            # a chunk in flight may have been read before these changes
+            return self.reload()
+        self.apply(rows)
+
+    def apply(self, rows):
+        """Patch changed rows in place and stack newer ones above the loaded rows."""
+        if not rows:
+            return
+        if self._first_key is None or len(self._head) + len(rows) > self.chunk:
+            return self.reload()
+        loaded = {self.row_id(r): (rs, i) for rs in (self._head, *self._chunks.values()) for i, r in enumerate(rs)}
+        added = 0
+        for r in rows:
+            hit = loaded.get(self.row_id(r))
+            if hit is not None:
+                hit[0][hit[1]] = r
+            elif self._first_key is not None and self._row_key(r) > self._first_key:
+                self._head.append(r)
+                added += 1
+            # anything else is older than the pinned top and not cached: a later
+            # fetch of its chunk reads it fresh from the database
+        if added:
+            self._head.sort(key=self._row_key, reverse=True)
+            if self._top > 0:
+                # keep the rows the user is looking at in place
+                self._top += added
+            if self._selected is not None:
+                self._selected += added
+        self.render()
+
+
+class ProgressDialog(tk.Toplevel):
+    """Small modal showing progress of a background job with a Cancel button."""
+
+    def __init__(self, master, title, on_cancel=None):
+        super().__init__(master)
+        self.title(title)
+        self.resizable(False, False)
+        self.transient(master)
+        self.on_cancel = on_cancel
+        self.label = ttk.Label(self, text="Starting...")
+        self.label.pack(padx=16, pady=(14, 6))
+        self.bar = ttk.Progressbar(self, mode="indeterminate", length=280)
+        self.bar.pack(padx=16, pady=6)
+        self.bar.start(15)
+        self.cancel_btn = ttk.Button(self, text="Cancel", command=self.cancel)
+        self.cancel_btn.pack(pady=(6, 14))
+        self.protocol("WM_DELETE_WINDOW", self.cancel)
+
+    def update_progress(self, done, total=None):
+        if total:
+            if str(self.bar["mode"]) != "determinate":
+                self.bar.stop()
+                self.bar.configure(mode="determinate", maximum=total)
+            self.bar["value"] = done
+            self.label.configure(text=f"{done:,} of {total:,} rows")
+        else:
+            self.label.configure(text=f"{done:,} rows")
+
+    def cancel(self):
+        if self.on_cancel is not None:
+            self.on_cancel()
+        self.cancel_btn.state(["disabled"])
+        self.label.configure(text="Cancelling...")
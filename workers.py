@@ -0,0 +1,95 @@
+# frontend/workers.py
+import queue
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Task:
+    """Handle for a submitted job; ``cancel()`` asks a cooperative job to stop."""
+
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self.future = None
+
+    def cancel(self):
+        self.cancelled.set()
+        if self.future is not None:
+            self.future.cancel()
+
+
+class Worker:
+    """Runs blocking service calls off the Tk thread.
+
+    Jobs execute on a small thread pool.  Their results, errors and progress
+    reports are queued and delivered to the callbacks from the Tk mainloop via
+    ``after()``, so callbacks may touch widgets freely.
+    """
+
+    def __init__(self, root, max_workers: int = 4, poll_ms: int = 30):
+        self.root = root
+        self.poll_ms = poll_ms
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="worker")
+        self._inbox = queue.Queue()
+        self._cancellable = set()
+        self._after = None
+        self._poll()
+
+    def _poll(self):
+        while True:
+            try:
+                callback, args = self._inbox.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(*args)
+            except Exception:
+                traceback.print_exc()
+        self._after = self.root.after(self.poll_ms, self._poll)
+
+    def call_soon(self, callback, *args):
+        # safe from any thread; runs callback on the Tk thread
+        self._inbox.put((callback, args))
+
+    def submit(self, fn, *args, on_done=None, on_error=None, on_progress=None, cancellable=False, **kwargs):
+        """Run ``fn(*args, **kwargs)`` on the pool.
+
+        ``on_progress`` is passed to ``fn`` as its ``progress`` keyword and
+        ``cancellable`` passes the task's event as ``cancel``; both are the
+        conventions the long-running services (exports) accept.
+        """
+        task = Task()
+        if on_progress is not None:
+            kwargs["progress"] = lambda *a: self.call_soon(on_progress, *a)
+        if cancellable:
+            kwargs["cancel"] = task.cancelled
+            self._cancellable.add(task)
+
+        def run():
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if on_error is not None:
+                    self.call_soon(on_error, e)
+                else:
+                    traceback.print_exc()
+            else:
+                if on_done is not None:
+                    self.call_soon(on_done, result)
+            finally:
+                self._cancellable.discard(task)
+
+        task.future = self._executor.submit(run)
+        return task
+
+    def shutdown(self, wait: bool = True, drain: bool = False):
+        """Stop the pool.  Jobs not started yet are dropped, unless ``drain``:
+        then they all run (and are waited for) before this returns, except
+        cancellable ones, which are asked to stop."""
+        if self._after is not None:
+            self.root.after_cancel(self._after)
+            self._after = None
+        if drain:
+            for task in list(self._cancellable):
+                task.cancel()
+        self._executor.shutdown(wait=wait or drain, cancel_futures=not drain)